@@ -1,17 +1,34 @@
-from flask import Flask
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 from config import Config
-from routes.progress_routes import progress_bp
+from routes.progress_routes import progress_bp, warmup
+from services.metrics import finish_profile, observe_request, render_metrics, start_profile
 import logging
+import threading
+import time
 from flask import jsonify
 from werkzeug.exceptions import HTTPException
 
+def configure_logging():
+    """Log to stderr at Config.LOG_LEVEL unless the host (gunicorn, a test runner) already configured logging"""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=Config.LOG_LEVEL,
+            format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+        )
+
+def warmup_in_background(logger):
+    """Connect to MongoDB and storage on a thread so startup is not blocked"""
+    def run():
+        try:
+            logger.info('Warmed up in %s', warmup())
+        except Exception as e:
+            logger.warning(f'Warmup failed, connecting on first request: {str(e)}')
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+
 def create_app():
     """Application factory pattern"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s %(levelname)s %(name)s: %(message)s',
-    )
+    configure_logging()
     logger = logging.getLogger(__name__)
     logger.info('Starting Flask application')
     app = Flask(__name__)
@@ -20,9 +37,30 @@ def create_app():
          origins=Config.CORS_ORIGINS,
          methods=Config.CORS_METHODS,
          allow_headers=Config.CORS_HEADERS,
+         expose_headers=Config.CORS_EXPOSE_HEADERS,
          supports_credentials=Config.CORS_SUPPORTS_CREDENTIALS)
     
     app.register_blueprint(progress_bp, url_prefix='/api')
+    if Config.WARMUP_ON_START:
+        warmup_in_background(logger)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.profiler = start_profile(request.headers)
+
+    @app.after_request
+    def record_request_metrics(response):
+        if g.get("profiler"):
+            response.headers["X-Profile-File"] = finish_profile(g.profiler, request.endpoint)
+        rule = request.url_rule.rule if request.url_rule else None
+        observe_request(request.method, rule, response.status_code, time.perf_counter() - g.request_started)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
 
     @app.errorhandler(HTTPException)
     def handle_http_exception(e):
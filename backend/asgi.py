@@ -0,0 +1,69 @@
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors
+from config import Config
+from routes.async_progress_routes import async_progress_bp
+from services.metrics import observe_request, render_metrics
+import logging
+import time
+from werkzeug.exceptions import HTTPException
+
+def create_async_app():
+    """Application factory for the ASGI deployment, e.g. ``hypercorn 'asgi:create_async_app()'``"""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=Config.LOG_LEVEL,
+            format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+        )
+    logger = logging.getLogger(__name__)
+    logger.info('Starting Quart application')
+    app = Quart(__name__)
+
+    app = cors(app,
+               allow_origin=Config.CORS_ORIGINS,
+               allow_methods=Config.CORS_METHODS,
+               allow_headers=Config.CORS_HEADERS,
+               expose_headers=Config.CORS_EXPOSE_HEADERS,
+               allow_credentials=Config.CORS_SUPPORTS_CREDENTIALS)
+
+    app.register_blueprint(async_progress_bp, url_prefix='/api')
+
+    # Request profiling is only offered by the WSGI app: on the event loop a
+    # cProfile session would also sample every concurrently running request.
+    @app.before_request
+    async def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    async def record_request_metrics(response):
+        rule = request.url_rule.rule if request.url_rule else None
+        observe_request(request.method, rule, response.status_code, time.perf_counter() - g.request_started)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    async def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
+    @app.errorhandler(HTTPException)
+    async def handle_http_exception(e):
+        return jsonify({
+            "error": e.description,
+            "type": e.__class__.__name__,
+            "code": e.code
+        }), e.code
+
+    @app.errorhandler(Exception)
+    async def handle_exception(e):
+        logger.error(f"Unhandled Exception: {str(e)}", exc_info=True)
+        return jsonify({
+            "error": "An unexpected error occurred.",
+            "type": e.__class__.__name__,
+            "details": str(e)
+        }), 500
+
+    return app
+
+if __name__ == "__main__":
+    app = create_async_app()
+    logging.getLogger(__name__).info('Running Quart app')
+    app.run(debug=Config.DEBUG, port=Config.PORT)
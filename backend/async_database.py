@@ -0,0 +1,82 @@
+from pymongo import AsyncMongoClient
+from config import Config
+from database import Database
+from services.day_schema import to_external
+from services.metrics import mongo_command_metrics
+import inspect
+
+class AsyncDatabase(Database):
+    """Database API on the asyncio PyMongo driver, used by the ASGI app.
+
+    Methods take the same arguments and return the same documents as
+    Database but are coroutines (the streaming ones are async generators).
+    They are Database's planned methods driven by an event loop, so only the
+    driver calls and the cursor iteration live here.
+    """
+
+    # Index creation is awaited by the app when it starts serving
+    ENSURE_INDEXES_ON_CONNECT = False
+
+    def _create_client(self):
+        return AsyncMongoClient(Config.MONGO_URI, event_listeners=[mongo_command_metrics], **Config.MONGO_CLIENT_OPTIONS)
+
+    @staticmethod
+    async def _run(plan):
+        """Drive a planned method, awaiting every driver call and raising its errors inside the plan"""
+        result = error = None
+        while True:
+            try:
+                step = plan.send(result) if error is None else plan.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            result = error = None
+            try:
+                result = await step if inspect.isawaitable(step) else step
+            except Exception as e:
+                error = e
+
+    @staticmethod
+    async def _to_list(cursor):
+        # aggregate() and list_indexes() return their cursor from a coroutine
+        if inspect.isawaitable(cursor):
+            cursor = await cursor
+        return await cursor.to_list()
+
+    @staticmethod
+    def _next_batch(cursor, size):
+        return cursor.to_list(size)
+
+    @staticmethod
+    def _iterate(items):
+        return aiter(items)
+
+    @staticmethod
+    def _next_item(iterator):
+        return anext(iterator, Database._EXHAUSTED)
+
+    async def get_all_progress_by_user(self, batch_days=Config.BULK_STATS_BATCH_DAYS):
+        """Yield the date and tasks of every progress document grouped by user, in batches of whole users"""
+        self.logger.debug('Fetching all progress data grouped by user')
+        progress_by_user, size = {}, 0
+        async for item in self._all_progress_cursor():
+            user_id = item.pop("user_id", None) or Config.DEFAULT_USER_ID
+            if size >= batch_days and user_id not in progress_by_user:
+                yield progress_by_user
+                progress_by_user, size = {}, 0
+            progress_by_user.setdefault(user_id, []).append(to_external(item))
+            size += 1
+        if progress_by_user:
+            yield progress_by_user
+
+    async def find_progress(self, user_id, start_date=None, end_date=None, after=None, limit=None, fields=None, descending=False):
+        """Yield progress documents in date order straight from the cursor"""
+        self.logger.debug('Finding progress for user %s after=%s limit=%s fields=%s', user_id, after, limit, fields)
+        async for doc in self._progress_cursor(user_id, start_date, end_date, after, limit, fields, descending):
+            yield self._listed_day(doc, fields)
+
+    async def export_progress(self, user_id=None):
+        """Iterate the days of one user, or of every user, in (user_id, date) index order"""
+        async for day in self._export_cursor(user_id):
+            yield to_external(day)
+
+async_db = AsyncDatabase()
@@ -0,0 +1,171 @@
+"""Home screen load: the three separate requests against the combined dashboard.
+
+Times one load of the home screen through the Flask test client, first the way
+the frontend used to do it (GET /progress/<date>, /progress/history and
+/progress/stats) and then as one GET /progress/dashboard/<date>, with the
+response cache and compression off and on:
+
+    python -m benchmarks.dashboard --days 365
+    python -m benchmarks.dashboard --days 365 --stats-backend python --mongomock
+
+Each load reports the process CPU time (the test client runs in-process, so
+this includes the client side of every request), the MongoDB queries sent and
+the documents and BSON bytes they returned, and the response bytes. "after
+write" loads have the user's cache entries invalidated first, the way the
+first load after a change is served; "repeat" loads reuse them.
+"""
+from benchmarks.synthetic import seed_users
+from bson import encode
+from config import Config
+from datetime import datetime
+import argparse
+import json
+import logging
+import statistics
+import time
+
+class CountingCursor:
+    """Cursor proxy counting the documents and BSON bytes read through it"""
+
+    def __init__(self, cursor, counts):
+        self._cursor = cursor
+        self._counts = counts
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            # sort(), limit() and friends return the cursor itself
+            return self if result is self._cursor else result
+        return call
+
+    def __iter__(self):
+        for doc in self._cursor:
+            self._counts["documents"] += 1
+            self._counts["bytes"] += len(encode(doc))
+            yield doc
+
+class CountingCollection:
+    """Collection proxy counting the queries sent and what they return"""
+    CURSOR_METHODS = ("find", "aggregate")
+
+    def __init__(self, collection, counts):
+        self._collection = collection
+        self._counts = counts
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+        def call(*args, **kwargs):
+            self._counts["queries"] += 1
+            result = attribute(*args, **kwargs)
+            if name in self.CURSOR_METHODS:
+                return CountingCursor(result, self._counts)
+            if isinstance(result, dict):
+                self._counts["documents"] += 1
+                self._counts["bytes"] += len(encode(result))
+            return result
+        return call
+
+COLLECTIONS = ("collection", "stats_collection", "versions_collection")
+
+def count_queries(database):
+    """Route the collections a load reads through CountingCollection; returns the shared counters"""
+    counts = {"queries": 0, "documents": 0, "bytes": 0}
+    for name in COLLECTIONS:
+        setattr(database, name, CountingCollection(getattr(database, name), counts))
+    return counts
+
+def variants(date, history_days):
+    """name: (paths of one load, response cache on, Accept-Encoding)"""
+    history = f"/api/progress/history?limit={history_days}"
+    three_calls = [f"/api/progress/{date}", history, "/api/progress/stats"]
+    dashboard = [f"/api/progress/dashboard/{date}"]
+    return {
+        "three calls": (three_calls, False, "identity"),
+        "three calls, cache": (three_calls, True, "identity"),
+        "dashboard": (dashboard, False, "identity"),
+        "dashboard, gzip": (dashboard, False, "gzip"),
+        "dashboard, cache, gzip": (dashboard, True, "gzip"),
+    }
+
+def measure(client, routes, counts, paths, headers, cache, user_id, rounds, invalidate):
+    """Median CPU ms and the per-load query counts and response bytes of ``rounds`` loads"""
+    samples = []
+    for _ in range(rounds + 1):
+        if cache and invalidate:
+            routes.response_cache.invalidate(user_id, "progress")
+        for key in counts:
+            counts[key] = 0
+        start = time.process_time()
+        received = 0
+        for path in paths:
+            response = client.get(path, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} returned HTTP {response.status_code}")
+            received += len(response.get_data())
+        samples.append((time.process_time() - start) * 1000)
+    # The first load only warms up the cache and the connection
+    return {"cpu_ms": round(statistics.median(samples[1:]), 3), **counts, "response_bytes": received}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=Config.MONGO_URI)
+    parser.add_argument("--database", default=f"{Config.DATABASE_NAME}_bench")
+    parser.add_argument("--mongomock", action="store_true", help="Use the in-memory mongomock stand-in")
+    parser.add_argument("--days", type=int, default=365, help="Days of history of the benchmark user")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--stats-backend", default=Config.STATS_BACKEND, choices=["materialized", "pipeline", "python"])
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    Config.MONGO_URI = args.uri
+    Config.DATABASE_NAME = args.database
+    Config.STATS_BACKEND = args.stats_backend
+    Config.STORAGE_BACKEND = "local"
+    Config.RESPONSE_CACHE_BACKEND = "local"
+    from app import create_app
+    from routes import progress_routes
+    from services.response_cache import create_response_cache
+    app = create_app()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    database = progress_routes.db
+    database.client.drop_database(Config.DATABASE_NAME)
+    database.ensure_indexes()
+    user_id, = seed_users(database.collection, 1, args.days, user_prefix="bench")
+    database.rebuild_stats(user_id)
+    date = datetime.now().date().isoformat()
+    counts = count_queries(database)
+    response_cache = progress_routes.response_cache or create_response_cache()
+
+    client = app.test_client()
+    results = {}
+    try:
+        for name, (paths, cache, encoding) in variants(date, Config.HISTORY_DAYS).items():
+            progress_routes.response_cache = response_cache if cache else None
+            headers = {"X-User-Id": user_id, "Accept-Encoding": encoding}
+            loads = {"after write": True, "repeat": False} if cache else {"": True}
+            for load, invalidate in loads.items():
+                label = f"{name}, {load}" if load else name
+                results[label] = measure(client, progress_routes, counts, paths, headers, cache, user_id, args.rounds, invalidate)
+    finally:
+        database.client.drop_database(Config.DATABASE_NAME)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.days} days, {args.stats_backend} stats, {'mongomock' if args.mongomock else 'mongod'}")
+    print(f"{'load':<38} {'cpu ms':>8} {'queries':>8} {'docs':>6} {'db bytes':>9} {'resp bytes':>11}")
+    for label, row in results.items():
+        print(f"{label:<38} {row['cpu_ms']:>8.3f} {row['queries']:>8} {row['documents']:>6} {row['bytes']:>9} {row['response_bytes']:>11}")
+
+if __name__ == "__main__":
+    main()
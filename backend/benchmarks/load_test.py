@@ -0,0 +1,164 @@
+"""Load test comparing the sync (WSGI) and async (ASGI) deployments of the API.
+
+Start both servers against the same database and storage, seed them once and
+run the same mixed stats/history/picture workload against each:
+
+    gunicorn --bind 127.0.0.1:8001 --workers 1 'app:create_app()'
+    hypercorn --bind 127.0.0.1:8002 'asgi:create_async_app()'
+    python -m benchmarks.load_test --prepare \\
+        --target sync=http://127.0.0.1:8001 --target async=http://127.0.0.1:8002
+
+Slow picture downloads are what the async mode is for, so run it with
+STORAGE_BACKEND=gcs and BLOB_CACHE_MAX_BYTES=0 to measure the difference.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+from urllib.parse import urlsplit
+import argparse
+import http.client
+import json
+import random
+import sys
+import time
+import uuid
+
+WORKLOAD = {
+    # name: (path, weight)
+    "stats": ("/api/progress/stats", 4),
+    "history": ("/api/progress/history?fields=tasks", 4),
+    "picture": ("/api/progress/pic/{date}?size=medium", 2),
+}
+
+def connect(base_url):
+    parts = urlsplit(base_url)
+    return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+def request(connection, method, path, headers, body=None):
+    """Send one request on a keep-alive connection and return ``(status, body)``"""
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+def prepare(base_url, user_id, date, days):
+    """Create ``days`` of history and a picture for ``date`` through the API"""
+    from PIL import Image
+    connection = connect(base_url)
+    headers = {"X-User-Id": user_id, "Content-Type": "application/json"}
+    end = datetime.fromisoformat(date)
+    dates = [(end - timedelta(days=offset)).date().isoformat() for offset in range(days)]
+    for start in range(0, len(dates), 50):
+        operations = [{"date": day, "op": "set", "task": "workout_a", "value": True} for day in dates[start:start + 50]]
+        status, _ = request(connection, "PATCH", "/api/progress", headers, json.dumps({"operations": operations}))
+        if status != 200:
+            raise SystemExit(f"Seeding history failed with HTTP {status}")
+
+    image = BytesIO()
+    Image.new("RGB", (3000, 4000), (200, 80, 40)).save(image, "JPEG", quality=90)
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"progress.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image.getvalue() + f"\r\n--{boundary}--\r\n".encode()
+    upload_headers = {"X-User-Id": user_id, "Content-Type": f"multipart/form-data; boundary={boundary}"}
+    status, response = request(connection, "POST", f"/api/progress/pic/{date}", upload_headers, body)
+    if status == 202:
+        status_url = json.loads(response)["status_url"]
+        for _ in range(120):
+            _, job = request(connection, "GET", status_url, headers)
+            state = json.loads(job)["status"]
+            if state == "committed":
+                break
+            if state == "failed":
+                raise SystemExit("Picture upload failed")
+            time.sleep(0.5)
+    elif status != 200:
+        raise SystemExit(f"Picture upload failed with HTTP {status}")
+
+def worker(base_url, user_id, date, deadline, seed):
+    """Fire weighted random requests until ``deadline``; return ``[(name, ms, ok)]``"""
+    rng = random.Random(seed)
+    names = list(WORKLOAD)
+    weights = [WORKLOAD[name][1] for name in names]
+    headers = {"X-User-Id": user_id}
+    connection = connect(base_url)
+    samples = []
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        path = WORKLOAD[name][0].format(date=date)
+        start = time.perf_counter()
+        try:
+            status, _ = request(connection, "GET", path, headers)
+            ok = status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = connect(base_url)
+            ok = False
+        samples.append((name, (time.perf_counter() - start) * 1000, ok))
+    connection.close()
+    return samples
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def summarize(samples, duration):
+    """Per-endpoint and overall req/s, p50, p99 and error counts"""
+    groups = {"all": samples}
+    for name in WORKLOAD:
+        groups[name] = [sample for sample in samples if sample[0] == name]
+    summary = {}
+    for name, group in groups.items():
+        latencies = sorted(ms for _, ms, _ in group)
+        summary[name] = {
+            "requests": len(group),
+            "errors": sum(1 for _, _, ok in group if not ok),
+            "req_per_s": round(len(group) / duration, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+        }
+    return summary
+
+def run(base_url, args):
+    """Warm up, then run the workload against one target for ``args.duration`` seconds"""
+    worker(base_url, args.user_id, args.date, time.perf_counter() + args.warmup, seed=-1)
+    deadline = time.perf_counter() + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(worker, base_url, args.user_id, args.date, deadline, seed)
+            for seed in range(args.concurrency)
+        ]
+        samples = [sample for future in futures for sample in future.result()]
+    return summarize(samples, args.duration)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", action="append", required=True, help="name=base_url, may be repeated")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of measured load per target")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--user-id", default="load_test_user")
+    parser.add_argument("--date", default=datetime.now().date().isoformat(), help="Day whose picture is fetched")
+    parser.add_argument("--prepare", action="store_true", help="Seed history and a picture through the first target")
+    parser.add_argument("--days", type=int, default=75, help="Days of history created by --prepare")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    targets = dict(target.split("=", 1) for target in args.target)
+    if args.prepare:
+        prepare(next(iter(targets.values())), args.user_id, args.date, args.days)
+
+    results = {name: run(base_url, args) for name, base_url in targets.items()}
+    print(f"{'target':>8} {'endpoint':>9} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, summary in results.items():
+        for endpoint, row in summary.items():
+            print(f"{name:>8} {endpoint:>9} {row['req_per_s']:>9} {row['p50_ms']:>9} {row['p99_ms']:>9} {row['errors']:>7}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    return 1 if any(row["errors"] for summary in results.values() for row in summary.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Collection size and stats latency before and after the compact document schema.
+
+Seeds users with the ``tasks`` schema, measures, converts the collection with
+Database.migrate_schema and measures again:
+
+    python -m benchmarks.schema --users 100 --days 365
+    python -m benchmarks.schema --users 10 --days 365 --mongomock
+
+Sizes come from collStats on a real server. mongomock has no collStats, so
+there the data size is the sum of the encoded BSON documents, storage and
+index sizes are not reported, and the pipeline stats path (which needs
+``$allElementsTrue``) is skipped.
+"""
+from benchmarks.synthetic import seed_users
+from bson import encode
+from config import Config
+from services.stats_service import StatsService
+import argparse
+import json
+import sys
+import time
+
+def best_ms(function, repeat):
+    """Return the result of ``function`` and its best wall-clock time in ms"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def collection_size(database):
+    """Data, average document, storage and index sizes of the progress collection in bytes"""
+    try:
+        stats = database.db.command("collStats", database.collection.name)
+    except Exception:
+        sizes = [len(encode(doc)) for doc in database.collection.find()]
+        return {"size": sum(sizes), "avg_obj_size": round(sum(sizes) / len(sizes), 1) if sizes else 0}
+    return {
+        "size": stats["size"],
+        "avg_obj_size": stats.get("avgObjSize", 0),
+        "storage_size": stats.get("storageSize"),
+        "index_size": stats.get("totalIndexSize"),
+    }
+
+def stats_latency(database, user_ids, repeat, pipeline=True):
+    """Best ms per user of each stats path, checking that every path returns the same stats"""
+    paths = {
+        "python": lambda user_id: StatsService.get_comprehensive_stats(database._stats_days(user_id)),
+        "rebuild": database.rebuild_stats,
+    }
+    if pipeline:
+        paths["pipeline"] = database.get_stats_pipeline
+    timings = {}
+    results = {}
+    for name, path in paths.items():
+        total = 0
+        for user_id in user_ids:
+            result, elapsed = best_ms(lambda: path(user_id), repeat)
+            total += elapsed
+            if name != "rebuild":
+                results.setdefault(user_id, []).append(result)
+        timings[name] = round(total / len(user_ids), 3)
+    for user_id, stats in results.items():
+        if any(result != stats[0] for result in stats):
+            raise SystemExit(f"Stats paths disagree for {user_id}")
+    return timings, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365, help="Days per user")
+    parser.add_argument("--sample-users", type=int, default=10, help="Users whose stats are timed")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mongomock", action="store_true", help="Use the in-memory mongomock stand-in")
+    parser.add_argument("--uri", default=Config.MONGO_URI)
+    parser.add_argument("--database-name", default=f"{Config.DATABASE_NAME}_bench")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    Config.MONGO_URI = args.uri
+    Config.DOCUMENT_SCHEMA = "tasks"
+    from database import Database
+    database = Database(database_name=args.database_name)
+    database.client.drop_database(args.database_name)
+    database.ensure_indexes()
+
+    print(f"{args.users} users x {args.days} days = {args.users * args.days:,} days")
+    user_ids = seed_users(database.collection, args.users, args.days)
+    sample = user_ids[:args.sample_users]
+    results = {}
+    before_stats = None
+    for schema in ("tasks", "compact"):
+        if schema != "tasks":
+            Config.DOCUMENT_SCHEMA = schema
+            migration, elapsed = best_ms(lambda: database.migrate_schema(schema), 1)
+            print(f"migrated {migration['converted']:,} days to {schema} in {elapsed / 1000:.2f} s")
+        row = collection_size(database)
+        row["stats_ms"], stats = stats_latency(database, sample, args.repeat, pipeline=not args.mongomock)
+        if before_stats is not None and stats != before_stats:
+            raise SystemExit("Stats changed after the migration")
+        before_stats = stats
+        results[schema] = row
+        sizes = " ".join(f"{key}={value:,}" for key, value in row.items() if key != "stats_ms" and value is not None)
+        latency = " ".join(f"{name}={ms:.2f}ms" for name, ms in row["stats_ms"].items())
+        print(f"{schema:<8} {sizes}")
+        print(f"{'':<8} stats per user: {latency}")
+
+    before, after = results["tasks"], results["compact"]
+    print(f"data size {after['size'] / before['size']:.1%} of before, "
+          f"average document {before['avg_obj_size']:.0f} -> {after['avg_obj_size']:.0f} bytes")
+    database.client.drop_database(args.database_name)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"users": args.users, "days": args.days, "results": results}, output, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Cold start benchmark: import time and time to first response.
+
+Each run starts a fresh interpreter that imports the app, builds it and serves
+a first request through the test client, the way a scale-to-zero instance
+handles the request that woke it up:
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --mode async --path /api/progress/stats
+
+The health check needs neither MongoDB nor storage; /api/progress/stats pays
+for the first connection. Set WARMUP_ON_START=true to measure with warmup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = """
+import time
+start = time.perf_counter()
+{import_app}
+imported = time.perf_counter()
+app = {factory}()
+created = time.perf_counter()
+{first_request}
+responded = time.perf_counter()
+import json
+print(json.dumps({{
+    "status": status,
+    "import_ms": (imported - start) * 1000,
+    "create_ms": (created - imported) * 1000,
+    "first_request_ms": (responded - created) * 1000,
+    "in_process_ms": (responded - start) * 1000,
+}}))
+"""
+
+MODES = {
+    "sync": {
+        "import_app": "from app import create_app",
+        "factory": "create_app",
+        "first_request": "status = app.test_client().get({path!r}).status_code",
+    },
+    "async": {
+        "import_app": "from asgi import create_async_app",
+        "factory": "create_async_app",
+        "first_request": (
+            "import asyncio\n"
+            "async def first_request():\n"
+            "    async with app.test_app() as test_app:\n"
+            "        return (await test_app.test_client().get({path!r})).status_code\n"
+            "status = asyncio.run(first_request())"
+        ),
+    },
+}
+
+def run_once(mode, path):
+    """Start an interpreter, serve one request and return its timings in ms"""
+    parts = MODES[mode]
+    code = CHILD.format(
+        import_app=parts["import_app"],
+        factory=parts["factory"],
+        first_request=parts["first_request"].format(path=path),
+    )
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING")}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"Startup run failed:\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_ms"] = wall_ms
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES, default="sync")
+    parser.add_argument("--path", default="/api/health", help="First request to serve")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Also write the medians to this file")
+    args = parser.parse_args()
+
+    runs = [run_once(args.mode, args.path) for _ in range(args.runs)]
+    statuses = {run["status"] for run in runs}
+    medians = {
+        key: round(statistics.median(run[key] for run in runs), 1)
+        for key in ("import_ms", "create_ms", "first_request_ms", "in_process_ms", "process_ms")
+    }
+    print(f"mode={args.mode} path={args.path} runs={args.runs} status={sorted(statuses)}")
+    for key, value in medians.items():
+        print(f"{key:>17} {value:>10.1f}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"mode": args.mode, "path": args.path, "runs": args.runs, "median": medians}, output, indent=2)
+    return 0 if statuses == {200} else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
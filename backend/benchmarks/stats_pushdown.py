@@ -0,0 +1,73 @@
+"""Compare client-side and aggregation-pipeline stats against a local mongod.
+
+Run from the backend directory:
+
+    python -m benchmarks.stats_pushdown --uri mongodb://localhost:27017/ --sizes 1000 100000 1000000
+
+mongomock does not implement ``$allElementsTrue``, so a real server is needed.
+"""
+from benchmarks.synthetic import seed_collection
+from bson import encode
+from config import Config
+from database import Database
+from pymongo import MongoClient
+from services.stats_service import StatsService
+import argparse
+import time
+
+def measure(function, repeat):
+    """Return the result of ``function`` and its best wall-clock time in ms"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+USER_ID = Config.DEFAULT_USER_ID
+
+def python_path(database):
+    """Fetch every document and compute stats client-side"""
+    return StatsService.get_comprehensive_stats(database.get_all_progress(USER_ID))
+
+def python_bytes(database):
+    """Bytes the client-side path receives from the server"""
+    return sum(len(encode(doc)) for doc in database.collection.find({"user_id": USER_ID}))
+
+def pipeline_bytes(database):
+    """Bytes the pipeline path receives from the server"""
+    completion = StatsService.completion_expression()
+    group = {"_id": None, "total_days": {"$sum": 1}, "completed_days": {"$sum": {"$cond": [completion, 1, 0]}}}
+    for task_key, expression in StatsService.task_completion_expressions().items():
+        group[task_key] = {"$sum": expression}
+    match = {"$match": {"user_id": USER_ID}}
+    received = sum(len(encode(doc)) for doc in database.collection.aggregate([match, {"$group": group}]))
+    flags = database.collection.aggregate([match, {"$sort": {"date": 1}}, {"$project": {"_id": 0, "date": 1, "complete": completion}}])
+    return received + sum(len(encode(doc)) for doc in flags)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=Config.MONGO_URI)
+    parser.add_argument("--database", default=f"{Config.DATABASE_NAME}_bench")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    database = Database(client, database_name=args.database)
+
+    print(f"{'days':>10} {'path':>9} {'ms':>10} {'bytes':>14}")
+    for size in args.sizes:
+        seed_collection(database.collection, size, user_id=USER_ID)
+        python_stats, python_ms = measure(lambda: python_path(database), args.repeat)
+        pipeline_stats, pipeline_ms = measure(lambda: database.get_stats_pipeline(USER_ID), args.repeat)
+        if python_stats != pipeline_stats:
+            raise SystemExit(f"Stats mismatch for {size} days: {python_stats} != {pipeline_stats}")
+        print(f"{size:>10} {'python':>9} {python_ms:>10.1f} {python_bytes(database):>14}")
+        print(f"{size:>10} {'pipeline':>9} {pipeline_ms:>10.1f} {pipeline_bytes(database):>14}")
+    client.drop_database(args.database)
+
+if __name__ == "__main__":
+    main()
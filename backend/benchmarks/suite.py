@@ -0,0 +1,262 @@
+"""Benchmark suite for the API endpoints, stats computation and picture storage.
+
+Seeds synthetic histories, then times every blueprint endpoint through the
+Flask test client, the StatsService calculations in isolation and picture
+upload/download on local filesystem storage. A request answered with a
+status the case does not expect (2xx or 304 unless it names one) fails the
+run, so a baseline never records error pages. Results are written as a
+JSON baseline, and a later run can be compared against one:
+
+    python -m benchmarks.suite --save benchmarks/baselines/main.json
+    python -m benchmarks.suite --compare benchmarks/baselines/main.json
+
+Runs against a local mongod by default. --mongomock uses the in-memory
+mongomock stand-in instead (pip install mongomock); it cannot serve every
+endpoint, so such runs fail and are only a smoke test of the suite. Cases
+that raise are recorded as errors rather than timings. Only compare
+baselines recorded on the same machine and store.
+"""
+from benchmarks.synthetic import generate_days, seed_users
+from config import Config
+from datetime import datetime
+from io import BytesIO
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+SCENARIOS = {
+    # name: (days per user, users)
+    "75d-1u": (75, 1),
+    "1y-100u": (365, 100),
+    "10y-1u": (3650, 1),
+    "75d-10ku": (75, 10000),
+}
+
+def configure(args, storage_dir):
+    """Point Config at the benchmark database and local storage before the app is imported"""
+    if args.mongomock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    Config.MONGO_URI = args.uri
+    Config.DATABASE_NAME = args.database
+    Config.STATS_BACKEND = args.stats_backend
+    Config.STORAGE_BACKEND = "local"
+    Config.LOCAL_STORAGE_DIR = storage_dir
+    Config.ASYNC_UPLOADS = False
+    Config.BLOB_CACHE_MAX_BYTES = 0
+    Config.ADMIN_TOKEN = "benchmark"
+    if not args.response_cache:
+        Config.RESPONSE_CACHE_BACKEND = "none"
+
+def time_case(function, rounds):
+    """Run ``function`` once to warm up, then ``rounds`` times; return timings or the error"""
+    try:
+        function()
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            function()
+            samples.append((time.perf_counter() - start) * 1000)
+    except UnexpectedStatus as e:
+        return {"error": str(e), "status": e.status}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "rounds": rounds,
+    }
+
+class UnexpectedStatus(Exception):
+    """A request case was answered with a status it does not expect"""
+
+    def __init__(self, method, path, status):
+        super().__init__(f"{method} {path} returned HTTP {status}")
+        self.status = status
+
+def request_case(client, method, path, headers, expected_status=None, **kwargs):
+    """A case sending one request and reading the whole body; any 2xx or 304 passes unless ``expected_status`` is given"""
+    def run():
+        body = kwargs.get("data")
+        response = client.open(path, method=method, headers=headers, **{**kwargs, "data": body() if callable(body) else body})
+        response.get_data()
+        response.close()
+        status = response.status_code
+        expected = status == expected_status if expected_status else 200 <= status < 300 or status == 304
+        if not expected:
+            raise UnexpectedStatus(method, path, status)
+    return run
+
+def picture_bytes():
+    """A phone-sized JPEG, the input of the upload and derivative paths"""
+    from PIL import Image
+    image = BytesIO()
+    Image.new("RGB", (3000, 4000), (200, 80, 40)).save(image, "JPEG", quality=90)
+    return image.getvalue()
+
+def endpoint_cases(client, user_id, date, picture):
+    """One case per blueprint route, all acting on ``user_id``"""
+    headers = {"X-User-Id": user_id}
+    admin_headers = {**headers, "X-Admin-Token": Config.ADMIN_TOKEN}
+    upload = lambda: {"file": (BytesIO(picture), "progress.jpg", "image/jpeg")}
+    tasks = dict(Config.DEFAULT_TASKS, workout_a=True)
+    return {
+        "GET /health": request_case(client, "GET", "/api/health", headers),
+        "GET /progress": request_case(client, "GET", "/api/progress", headers),
+        "GET /progress?limit=100": request_case(client, "GET", "/api/progress?limit=100", headers),
+        "GET /progress/history": request_case(client, "GET", "/api/progress/history?fields=tasks", headers),
+        "PATCH /progress": request_case(client, "PATCH", "/api/progress", headers, json={
+            "operations": [{"date": date, "op": "toggle", "task": "read_ten_pages"}]
+        }),
+        "GET /progress/sync?since=0": request_case(client, "GET", "/api/progress/sync?since=0", headers),
+        "POST /progress/sync": request_case(client, "POST", "/api/progress/sync", headers, json={
+            "operations": [{"date": date, "op": "set", "task": "read_ten_pages", "value": True, "at": 0}]
+        }),
+        "GET /progress/stats": request_case(client, "GET", "/api/progress/stats", headers),
+        "GET /progress/stats/bulk": request_case(client, "GET", "/api/progress/stats/bulk", admin_headers),
+        "GET /progress/stats/verify": request_case(client, "GET", "/api/progress/stats/verify", headers),
+        "GET /progress/dashboard/<date>": request_case(client, "GET", f"/api/progress/dashboard/{date}", headers),
+        "GET /progress/<date>": request_case(client, "GET", f"/api/progress/{date}", headers),
+        "PUT /progress/<date>": request_case(client, "PUT", f"/api/progress/{date}", headers, json={"tasks": tasks}),
+        "POST /progress/<date>/water": request_case(client, "POST", f"/api/progress/{date}/water", headers, json={"amount": 250}),
+        "POST /progress/pic/<date>": request_case(client, "POST", f"/api/progress/pic/{date}", headers, data=upload),
+        "GET /progress/pic/uploads/<job_id>": request_case(client, "GET", "/api/progress/pic/uploads/unknown", headers, expected_status=404),
+        "GET /progress/pic/<date>": request_case(client, "GET", f"/api/progress/pic/{date}", headers),
+        "GET /progress/pic/<date>?size=thumb": request_case(client, "GET", f"/api/progress/pic/{date}?size=thumb", headers),
+        "GET /progress/pics/cache": request_case(client, "GET", "/api/progress/pics/cache", headers),
+        "GET /progress/cache": request_case(client, "GET", "/api/progress/cache", headers),
+        "GET /progress/pics": request_case(client, "GET", "/api/progress/pics", headers),
+    }
+
+def stats_cases(days):
+    """StatsService calculations on one in-memory history of ``days`` days"""
+    from services.stats_service import StatsService
+    history = list(generate_days(days))
+    return {
+        "StatsService.calculate_streaks": lambda: StatsService.calculate_streaks(history),
+        "StatsService.calculate_task_stats": lambda: StatsService.calculate_task_stats(history),
+        "StatsService.get_comprehensive_stats": lambda: StatsService.get_comprehensive_stats(history),
+    }
+
+def storage_cases(file_service, picture):
+    """FileService round trips against the local storage backend"""
+    file_service.upload_file(BytesIO(picture), "benchmark.jpg", "image/jpeg")
+    return {
+        "FileService.upload_file": lambda: file_service.upload_file(BytesIO(picture), "benchmark.jpg", "image/jpeg"),
+        "FileService.get_file": lambda: file_service.get_file("benchmark.jpg"),
+    }
+
+def run_scenario(app, days, users, rounds):
+    """Seed a fresh database for one scenario and time every case"""
+    from routes.progress_routes import db, file_service
+    db.client.drop_database(Config.DATABASE_NAME)
+    db.ensure_indexes()
+    user_ids = seed_users(db.collection, users, days, user_prefix="bench")
+    user_id = user_ids[0]
+    db.rebuild_stats(user_id)
+    date = datetime.now().date().isoformat()
+    picture = picture_bytes()
+
+    client = app.test_client()
+    client.post(f"/api/progress/pic/{date}", headers={"X-User-Id": user_id},
+                data={"file": (BytesIO(picture), "progress.jpg", "image/jpeg")})
+    cases = {
+        **endpoint_cases(client, user_id, date, picture),
+        **stats_cases(days),
+        **storage_cases(file_service, picture),
+    }
+    results = {}
+    for name, function in cases.items():
+        results[name] = time_case(function, rounds)
+        row = results[name]
+        print(f"  {name:<40} " + (row["error"] if "error" in row else f"{row['median_ms']:>10.3f} ms"), flush=True)
+    db.client.drop_database(Config.DATABASE_NAME)
+    return results
+
+def compare(baseline, current, threshold):
+    """Print median ratios against a baseline; return the cases slower than ``threshold``"""
+    regressions = []
+    print(f"{'scenario':>10} {'case':<40} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for scenario, cases in current["results"].items():
+        for name, row in cases.items():
+            before = baseline["results"].get(scenario, {}).get(name)
+            if not before or "median_ms" not in before or "median_ms" not in row:
+                continue
+            ratio = row["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+            marker = " !" if ratio > threshold else ""
+            print(f"{scenario:>10} {name:<40} {before['median_ms']:>10.3f} {row['median_ms']:>10.3f} {ratio:>7.2f}{marker}")
+            if ratio > threshold:
+                regressions.append((scenario, name, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=Config.MONGO_URI)
+    parser.add_argument("--database", default=f"{Config.DATABASE_NAME}_bench")
+    parser.add_argument("--mongomock", action="store_true", help="Use the in-memory mongomock stand-in")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="Default: every scenario")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--stats-backend", default=Config.STATS_BACKEND, choices=["materialized", "pipeline", "python"])
+    parser.add_argument("--response-cache", action="store_true", help="Keep the response cache enabled")
+    parser.add_argument("--save", help="Write the results to this JSON baseline")
+    parser.add_argument("--compare", help="Compare with this JSON baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Median ratio counted as a regression")
+    parser.add_argument("--log-level", default="WARNING", help="Application log level while timing")
+    args = parser.parse_args()
+
+    storage_dir = tempfile.mkdtemp(prefix="75-hard-bench-")
+    configure(args, storage_dir)
+    from app import create_app
+    app = create_app()
+    logging.getLogger().setLevel(args.log_level)
+
+    results = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "store": "mongomock" if args.mongomock else "mongod",
+            "stats_backend": args.stats_backend,
+            "response_cache": args.response_cache,
+            "rounds": args.rounds,
+        },
+        "results": {},
+    }
+    try:
+        for name in args.scenario or SCENARIOS:
+            days, users = SCENARIOS[name]
+            print(f"{name}: {users} users x {days} days", flush=True)
+            results["results"][name] = run_scenario(app, days, users, args.rounds)
+    finally:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+    failed = [(scenario, name, row["error"]) for scenario, cases in results["results"].items()
+              for name, row in cases.items() if "status" in row]
+    for scenario, name, error in failed:
+        print(f"{scenario} {name}: {error}", file=sys.stderr)
+    if failed:
+        print(f"{len(failed)} case(s) answered with an unexpected status; not saving or comparing", file=sys.stderr)
+        return 1
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(json.load(baseline), results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than {args.threshold}x the baseline", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+from config import Config
+from datetime import datetime, timedelta
+import random
+
+def generate_days(count, user_id=None, seed=0, completion_rate=0.8, end_date=None):
+    """Yield ``count`` consecutive synthetic day documents ending at ``end_date``"""
+    rng = random.Random(seed)
+    end_date = end_date or datetime.now().date()
+    start_date = end_date - timedelta(days=count - 1)
+    for offset in range(count):
+        tasks = {}
+        for task_key in Config.DEFAULT_TASKS:
+            done = rng.random() < completion_rate ** (1 / len(Config.DEFAULT_TASKS))
+            if task_key == "drink_gallon_water":
+                tasks[task_key] = Config.WATER_GOAL_ML if done else rng.randrange(0, Config.WATER_GOAL_ML, 250)
+            else:
+                tasks[task_key] = done
+        day = {"date": (start_date + timedelta(days=offset)).isoformat(), "tasks": tasks}
+        if user_id is not None:
+            day["user_id"] = user_id
+        yield day
+
+def seed_collection(collection, count, batch_size=10000, **kwargs):
+    """Replace the contents of ``collection`` with ``count`` synthetic days"""
+    collection.delete_many({})
+    batch = []
+    for day in generate_days(count, **kwargs):
+        batch.append(day)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+def seed_users(collection, users, days, batch_size=10000, user_prefix="user", **kwargs):
+    """Insert ``days`` synthetic days for each of ``users`` users; returns the user ids"""
+    user_ids = [f"{user_prefix}-{index}" for index in range(users)]
+    batch = []
+    for seed, user_id in enumerate(user_ids):
+        for day in generate_days(days, user_id=user_id, seed=seed, **kwargs):
+            batch.append(day)
+            if len(batch) >= batch_size:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    return user_ids
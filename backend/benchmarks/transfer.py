@@ -0,0 +1,115 @@
+"""Throughput of progress export and import in each transfer format.
+
+Encodes a synthetic history to a file and decodes it back for every format,
+reporting days per second and bytes per day. With --database the file is
+also imported into MongoDB and exported again through Database:
+
+    python -m benchmarks.transfer --users 1000 --days 1000
+    python -m benchmarks.transfer --users 100 --days 1000 --database --mongomock
+
+Days are generated from a block of --block-users users that is repeated under
+new user ids, so a million-day run does not hold a million documents in memory.
+"""
+from benchmarks.synthetic import generate_days
+from config import Config
+from services.transfer_service import TransferService
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+def synthetic_days(users, days, block_users):
+    """Yield ``users`` x ``days`` day documents in (user_id, date) order"""
+    block = [
+        day
+        for seed in range(min(block_users, users))
+        for day in generate_days(days, user_id=f"bench-{seed}", seed=seed)
+    ]
+    for repeat in range(0, users, block_users):
+        for day in block:
+            index = int(day["user_id"].rsplit("-", 1)[1]) + repeat
+            if index < users:
+                yield {**day, "user_id": f"bench-{index}"}
+
+def timed(label, total_days, function):
+    """Run ``function``, print its throughput and return the result with the elapsed seconds"""
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<24} {elapsed:>8.2f} s {total_days / elapsed:>12,.0f} days/s", flush=True)
+    return result, elapsed
+
+def write_export(path, days, format):
+    with open(path, "wb") as output:
+        for chunk in TransferService.encode(days, format):
+            output.write(chunk)
+
+def count_decoded(path, format):
+    with open(path, "rb") as source:
+        return sum(1 for _ in TransferService.decode(TransferService.read_chunks(source), format))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1000, help="Days per user")
+    parser.add_argument("--block-users", type=int, default=10)
+    parser.add_argument("--format", choices=TransferService.FORMATS, action="append", help="Default: every format")
+    parser.add_argument("--database", action="store_true", help="Also import and export through MongoDB")
+    parser.add_argument("--mongomock", action="store_true", help="Use the in-memory mongomock stand-in")
+    parser.add_argument("--uri", default=Config.MONGO_URI)
+    parser.add_argument("--database-name", default=f"{Config.DATABASE_NAME}_bench")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    total = args.users * args.days
+    print(f"{args.users} users x {args.days} days = {total:,} days")
+    workdir = tempfile.mkdtemp(prefix="75-hard-transfer-")
+    results = {}
+    _, generate_seconds = timed("generate only", total, lambda: sum(1 for _ in synthetic_days(args.users, args.days, args.block_users)))
+    results["generate_s"] = round(generate_seconds, 3)
+
+    db = None
+    if args.database:
+        if args.mongomock:
+            import mongomock
+            import pymongo
+            pymongo.MongoClient = mongomock.MongoClient
+        Config.MONGO_URI = args.uri
+        from database import Database
+        db = Database(database_name=args.database_name)
+
+    for format in args.format or TransferService.FORMATS:
+        print(f"{format}:")
+        path = os.path.join(workdir, f"export.{TransferService.FORMATS[format][0].extension}")
+        row = {}
+        _, row["encode_s"] = timed("encode (incl. generate)", total, lambda: write_export(path, synthetic_days(args.users, args.days, args.block_users), format))
+        row["bytes"] = os.path.getsize(path)
+        row["bytes_per_day"] = round(row["bytes"] / total, 2)
+        print(f"  {'size':<24} {row['bytes'] / 1e6:>8.1f} MB {row['bytes_per_day']:>12.2f} bytes/day")
+        decoded, row["decode_s"] = timed("decode", total, lambda: count_decoded(path, format))
+        if decoded != total:
+            raise SystemExit(f"{format}: decoded {decoded} of {total} days")
+        if db is not None:
+            db.client.drop_database(args.database_name)
+            db.ensure_indexes()
+            def import_file():
+                with open(path, "rb") as source:
+                    return db.import_progress(TransferService.decode(TransferService.read_chunks(source), format))
+            report, row["import_s"] = timed("import", total, import_file)
+            row["imported"] = report["imported"]
+            _, row["export_s"] = timed("export", total, lambda: write_export(path, db.export_progress(), format))
+            db.client.drop_database(args.database_name)
+        results[format] = row
+
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"users": args.users, "days": args.days, "results": results}, output, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
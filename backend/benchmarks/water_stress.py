@@ -0,0 +1,53 @@
+"""Concurrency stress test for the atomic water increment and get-or-create.
+
+Fires many parallel requests at one day against a real MongoDB and checks
+that no increment was lost and that exactly one day document exists.
+
+    python -m benchmarks.water_stress --uri mongodb://localhost:27017/ --workers 50
+
+tests/test_water.py runs the same check, with fewer workers, under pytest.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from database import Database
+from pymongo import MongoClient
+import argparse
+import sys
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=Config.MONGO_URI)
+    parser.add_argument("--database", default=f"{Config.DATABASE_NAME}_stress")
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--increments", type=int, default=3, help="Increments per worker")
+    parser.add_argument("--amount", type=int, default=25)
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri, maxPoolSize=args.workers)
+    client.drop_database(args.database)
+    database = Database(client, database_name=args.database)
+    database.ensure_indexes()
+    user_id = Config.DEFAULT_USER_ID
+    date = "2000-01-01"
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(lambda _: database.get_or_create_progress(user_id, date), range(args.workers)))
+        list(pool.map(
+            lambda _: database.increment_water(user_id, date, args.amount),
+            range(args.workers * args.increments)
+        ))
+
+    documents = database.collection.count_documents({"user_id": user_id, "date": date})
+    expected = min(args.workers * args.increments * args.amount, Config.WATER_GOAL_ML)
+    actual = database.get_progress_by_date(user_id, date)["tasks"]["drink_gallon_water"]
+    client.drop_database(args.database)
+
+    print(f"documents={documents} water={actual} expected={expected}")
+    if documents != 1 or actual != expected:
+        print("FAILED", file=sys.stderr)
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 import os
-from datetime import timedelta
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +8,7 @@ class Config:
     """Application configuration class"""
     
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    LOG_LEVEL = os.getenv('LOG_LEVEL', "INFO").upper()
     PORT = int(os.getenv('FLASK_PORT', 8917))
     
     CORS_ORIGINS = [
@@ -15,17 +16,81 @@ class Config:
         "http://127.0.0.1:6896",
         "https://hard-tracker-frontend-75-424176252593.us-west1.run.app"
     ]
-    CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
-    CORS_HEADERS = ["Content-Type", "Authorization"]
+    CORS_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+    CORS_HEADERS = ["Content-Type", "Authorization", "X-User-Id", "X-Admin-Token"]
+    CORS_EXPOSE_HEADERS = ["X-Next-After", "ETag", "X-Cache"]
     CORS_SUPPORTS_CREDENTIALS = True
     
     MONGO_URI = os.getenv('MONGO_URI', "mongodb://localhost:27017/")
     DATABASE_NAME = "seventy_five_hard"
     COLLECTION_NAME = "progress"
+    STATS_COLLECTION_NAME = "stats"
+    LEADERBOARD_COLLECTION_NAME = "leaderboard"
+    ROLLUPS_COLLECTION_NAME = "rollups"
+    VERSIONS_COLLECTION_NAME = "versions"
+    ENSURE_INDEXES = os.getenv('ENSURE_INDEXES', 'True').lower() == 'true'
+    # MongoClient pool and timeouts; short timeouts make a cold start fail fast
+    MONGO_CLIENT_OPTIONS = {
+        "maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', 20)),
+        "minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        "maxIdleTimeMS": int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000)),
+        "serverSelectionTimeoutMS": int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        "connectTimeoutMS": int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        "socketTimeoutMS": int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+    }
+    # Connect to MongoDB and storage in the background when the app starts
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'False').lower() == 'true'
     BUCKET_NAME = os.getenv('BUCKET_NAME', "75-hard-progress-pics")
+    # Where pictures are stored: "gcs" or "local"
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', "gcs")
+    LOCAL_STORAGE_DIR = os.getenv('LOCAL_STORAGE_DIR', os.path.join(tempfile.gettempdir(), "75-hard-storage"))
+    # Stage uploads and answer 202 before they are stored. Only safe where the
+    # process keeps CPU after responding and UPLOAD_STAGING_DIR survives restarts
+    ASYNC_UPLOADS = os.getenv('ASYNC_UPLOADS', 'False').lower() == 'true'
+    UPLOAD_STAGING_DIR = os.getenv('UPLOAD_STAGING_DIR', os.path.join(tempfile.gettempdir(), "75-hard-upload-staging"))
+    UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 2))
+    UPLOAD_MAX_ATTEMPTS = int(os.getenv('UPLOAD_MAX_ATTEMPTS', 3))
+    # How /progress/stats is computed: "materialized", "pipeline" or "python"
+    STATS_BACKEND = os.getenv('STATS_BACKEND', "materialized")
+    # How new writes store a day's tasks: "tasks" (a subdocument) or "compact" (a bitmask and water)
+    DOCUMENT_SCHEMA = os.getenv('DOCUMENT_SCHEMA', "tasks")
+    
+    IMAGE_DERIVATIVE_SIZES = {"thumb": 256, "medium": 1024}  # longest side in px
+    IMAGE_DERIVATIVE_FORMAT = "WEBP"
+    IMAGE_DERIVATIVE_QUALITY = 80
+    IMAGE_CACHE_MAX_AGE = 31536000  # uuid-named blobs never change
+    STREAM_CHUNK_SIZE = 256 * 1024
+    BLOB_CACHE_DIR = os.getenv('BLOB_CACHE_DIR', os.path.join(tempfile.gettempdir(), "75-hard-blob-cache"))
+    BLOB_CACHE_MAX_BYTES = int(os.getenv('BLOB_CACHE_MAX_BYTES', 128 * 1024 * 1024))  # 0 disables the cache
+    # Cache of history/stats/gallery responses: "local", "redis" (shared, needs the redis package) or "none"
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', "local")
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 4096))
+    REDIS_URL = os.getenv('REDIS_URL', "redis://localhost:6379/0")
+    # Bodies smaller than this are sent uncompressed
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 5
+    # Requests sent with an "X-Profile: 1" header are run under cProfile and
+    # dumped to PROFILE_DIR; off unless explicitly enabled
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), "75-hard-profiles"))
+    # Sent as X-Admin-Token to use endpoints that read every user's data; unset disables them
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', "")
     
     WATER_GOAL_ML = 3785  # 1 gallon in ml
     HISTORY_DAYS = 75
+    MAX_BATCH_OPERATIONS = 100
+    MAX_PAGE_SIZE = 1000
+    BULK_STATS_BATCH_DAYS = 100000  # days held in memory at a time by the bulk stats endpoint
+    IMPORT_BATCH_SIZE = 1000  # days per unordered bulk write
+    MAX_IMPORT_ERRORS = 20  # rejected days described in an import report
+    CHALLENGE_DAYS = 75  # days of challenge tracked by the cohort rollups
+    MAX_LEADERBOARD_SIZE = 100
+    # A write holding a sync version longer than this is assumed to have died
+    SYNC_PENDING_TIMEOUT = 30  # seconds
+    SYNC_APPLIED_IDS = 1000  # ids of pushed operations remembered per user, so resent batches are skipped
+    DEFAULT_USER_ID = "demo_user"
     
     TASK_NAMES = {
         "drink_gallon_water": "Drink 1 Gallon Water",
@@ -1,91 +1,800 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, PyMongoError, DuplicateKeyError
 from bson.objectid import ObjectId
 from config import Config
+from services.stats_service import StatsService
+from services.rollup_service import RollupService
+from services.transfer_service import TransferService
+from services.day_schema import COMPACT_FIELDS, SCHEMAS, TASKS_PROJECTION, current_schema, day_tasks, to_external
+from services.metrics import STATS_DURATION, mongo_command_metrics
 from datetime import datetime, timedelta
+from functools import wraps
+from itertools import groupby, islice
+from operator import itemgetter
+import bisect
 import pytz
 import logging
+import threading
+import time
+
+def planned(method):
+    """Write a Database method once for both PyMongo drivers.
+
+    The method is a generator that yields the result of every driver call
+    (or call of another planned method) and is sent back its value: the
+    call's return value with PyMongo, the awaited one with the asyncio driver.
+    ``self._run`` drives it, so the method returns its result on Database and
+    a coroutine on AsyncDatabase.
+    """
+    @wraps(method)
+    def run(self, *args, **kwargs):
+        return self._run(method(self, *args, **kwargs))
+    return run
 
 class Database:
-    """Database connection and operations manager"""
+    """Database connection and operations manager.
+
+    Every progress document is keyed by ``(user_id, date)`` and every query
+    filters on ``user_id`` first, so the compound index doubles as a shard key.
+
+    Writes stamp the days they change with a per-user ``version`` from the
+    versions collection, which is what clients sync from (see get_changes).
+
+    Days are stored in the schema of Config.DOCUMENT_SCHEMA (see
+    services.day_schema) and read in either, so the collection can be
+    migrated while serving: writes convert the days they touch and reads
+    always return the ``tasks`` shape.
+
+    The client and collections are created on first use, so importing the
+    module (and the routes) does not open connections or create indexes.
+
+    Methods are written once for the synchronous and the asyncio driver (see
+    planned); AsyncDatabase only swaps the driver and the streaming methods.
+    """
+    INDEXES = [
+        # Serves day lookups, history ranges and the stats scans in either direction
+        ([("user_id", ASCENDING), ("date", ASCENDING)], {"name": "user_date_unique", "unique": True}),
+        ([("user_id", ASCENDING), ("date", DESCENDING)], {
+            "name": "user_progress_pic_date",
+            "partialFilterExpression": {"progress_pic": {"$exists": True}}
+        }),
+        # Serves the sync delta query
+        ([("user_id", ASCENDING), ("version", ASCENDING)], {"name": "user_version"}),
+    ]
+    # Date-only indexes from before progress was partitioned by user
+    LEGACY_INDEXES = ("date", "progress_pic_date")
+    # Leaderboard orderings; each has a descending index so top-K reads stop after K entries
+    LEADERBOARD_FIELDS = RollupService.RANKED_FIELDS
+    LEADERBOARD_INDEXES = [
+        ([(field, DESCENDING), ("_id", ASCENDING)], {"name": f"{field}_rank"}) for field in LEADERBOARD_FIELDS
+    ]
+    ROLLUP_INDEXES = [
+        ([("cohort", ASCENDING), ("day", ASCENDING)], {"name": "cohort_day_unique", "unique": True}),
+    ]
+    # Fields of a day that exports carry
+    EXPORT_PROJECTION = {"_id": 0, "user_id": 1, "date": 1, "progress_pic": 1, **TASKS_PROJECTION}
+    # Attributes set by connect()
+    CONNECTION_ATTRIBUTES = (
+        "client", "db", "collection", "stats_collection", "leaderboard_collection", "rollups_collection", "versions_collection"
+    )
+    # Whether connect() creates INDEXES (the async driver does it when serving starts)
+    ENSURE_INDEXES_ON_CONNECT = True
+    # Returned by _next_item once an iterable is exhausted
+    _EXHAUSTED = object()
     
-    def __init__(self):
+    def __init__(self, client=None, database_name=None):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.client = MongoClient(Config.MONGO_URI)
-        self.db = self.client[Config.DATABASE_NAME]
-        self.collection = self.db[Config.COLLECTION_NAME]
-        self.logger.info('Database initialized')
+        self._client = client
+        self.database_name = database_name or Config.DATABASE_NAME
+        self._connect_lock = threading.Lock()
+        self.change_listeners = []
+
+    def __getattr__(self, name):
+        # Only reached for attributes that are not set yet, i.e. before connect()
+        if name in Database.CONNECTION_ATTRIBUTES:
+            self.connect()
+            return self.__dict__[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def connect(self):
+        """Create the client and collections if they do not exist yet; safe to call from any thread"""
+        if "client" in self.__dict__:
+            return
+        with self._connect_lock:
+            if "client" in self.__dict__:
+                return
+            client = self._client or self._create_client()
+            self.db = client[self.database_name]
+            self.collection = self.db[Config.COLLECTION_NAME]
+            self.stats_collection = self.db[Config.STATS_COLLECTION_NAME]
+            self.leaderboard_collection = self.db[Config.LEADERBOARD_COLLECTION_NAME]
+            self.rollups_collection = self.db[Config.ROLLUPS_COLLECTION_NAME]
+            self.versions_collection = self.db[Config.VERSIONS_COLLECTION_NAME]
+            if self.ENSURE_INDEXES_ON_CONNECT and Config.ENSURE_INDEXES:
+                self.ensure_indexes()
+            # Set last: other threads treat the client as the sign that connect() finished
+            self.client = client
+            self.logger.info('Database initialized')
+
+    def _create_client(self):
+        return MongoClient(Config.MONGO_URI, event_listeners=[mongo_command_metrics], **Config.MONGO_CLIENT_OPTIONS)
+
+    @planned
+    def warmup(self):
+        """Connect and run a round trip so the pool holds an open connection"""
+        self.connect()
+        yield self.client.admin.command("ping")
+
+    @staticmethod
+    def _run(plan):
+        """Drive a planned method; PyMongo calls have already run, so their results are sent straight back"""
+        result = None
+        while True:
+            try:
+                result = plan.send(result)
+            except StopIteration as stop:
+                return stop.value
+
+    @staticmethod
+    def _to_list(cursor):
+        """The documents of a find, aggregate or list_indexes cursor"""
+        return list(cursor)
+
+    @staticmethod
+    def _next_batch(cursor, size):
+        """The next ``size`` documents of a cursor, empty once it is exhausted"""
+        return list(islice(cursor, size))
+
+    @staticmethod
+    def _iterate(items):
+        return iter(items)
+
+    @staticmethod
+    def _next_item(iterator):
+        """The next item of an _iterate iterator, or _EXHAUSTED"""
+        return next(iterator, Database._EXHAUSTED)
+
+    def add_change_listener(self, listener):
+        """Call ``listener(user_id, kind)`` after every committed write.
+
+        ``kind`` is "progress" when a user's days or tasks changed and "pics"
+        when a progress picture was saved.
+        """
+        self.change_listeners.append(listener)
+
+    def _notify_change(self, user_id, kind):
+        for listener in self.change_listeners:
+            try:
+                listener(user_id, kind)
+            except Exception as e:
+                self.logger.error(f'Change listener failed for user {user_id}: {str(e)}')
+
+    def _versioned(self, user_id, write):
+        """Plan step running ``write(version)`` with the user's next version and releasing the version once it is done.
+
+        Returns ``(version, result of the write)``.
+        """
+        version = yield from self._begin_version(user_id)
+        try:
+            result = yield write(version)
+        finally:
+            yield self.versions_collection.update_one({"_id": user_id}, {"$pull": {"pending": {"v": version}}})
+        return version, result
+
+    def _begin_version(self, user_id):
+        """Increment the user's version and record it as pending until _versioned releases it.
+
+        One atomic update, so the new version and its pending entry appear
+        together; pending entries older than SYNC_PENDING_TIMEOUT are dropped
+        on the way.
+        """
+        now = time.time()
+        next_version = {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+        state = yield self.versions_collection.find_one_and_update(
+            {"_id": user_id},
+            [{"$set": {
+                "version": next_version,
+                "pending": {"$concatArrays": [
+                    {"$filter": {
+                        "input": {"$ifNull": ["$pending", []]},
+                        "cond": {"$gte": ["$$this.at", now - Config.SYNC_PENDING_TIMEOUT]}
+                    }},
+                    [{"v": next_version, "at": now}]
+                ]}
+            }}],
+            projection={"version": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return state["version"]
+
+    @staticmethod
+    def _stale_pending(state, now):
+        return [entry for entry in state.get("pending", ()) if entry["at"] < now - Config.SYNC_PENDING_TIMEOUT]
+
+    @staticmethod
+    def _sync_version(state, now):
+        """The highest version all of whose writes are done: every day stamped at or below it is visible"""
+        if not state:
+            return 0
+        stale = Database._stale_pending(state, now)
+        pending = [entry["v"] for entry in state.get("pending", ()) if entry not in stale]
+        return min(pending) - 1 if pending else state.get("version", 0)
+
+    @planned
+    def ensure_indexes(self):
+        """Create the indexes used by the progress and rollup queries if they do not exist"""
+        self.logger.info('Ensuring progress collection indexes')
+        for collection, indexes in self._indexed_collections():
+            for keys, options in indexes:
+                try:
+                    yield collection.create_index(keys, **options)
+                except PyMongoError as e:
+                    self.logger.error(f'Failed to create index {options["name"]}: {str(e)}')
+
+    def _indexed_collections(self):
+        return (
+            (self.collection, self.INDEXES),
+            (self.leaderboard_collection, self.LEADERBOARD_INDEXES),
+            (self.rollups_collection, self.ROLLUP_INDEXES),
+        )
+
+    @planned
+    def migrate_user_ids(self, user_id=Config.DEFAULT_USER_ID, batch_size=1000):
+        """Backfill ``user_id`` on documents written before progress was per user.
+
+        Legacy documents whose date ``user_id`` already has are left untouched
+        and counted as conflicts. Afterwards the date-only indexes are replaced
+        by the per-user ones and the user's stats are rebuilt.
+        """
+        self.logger.info('Backfilling user_id=%s on legacy progress documents', user_id)
+        migrated = conflicts = 0
+        ids = [doc["_id"] for doc in (yield self._to_list(self.collection.find({"user_id": None}, {"_id": 1})))]
+        for start in range(0, len(ids), batch_size):
+            requests = [
+                UpdateOne({"_id": doc_id, "user_id": None}, {"$set": {"user_id": user_id}})
+                for doc_id in ids[start:start + batch_size]
+            ]
+            try:
+                result = yield self.collection.bulk_write(requests, ordered=False)
+                migrated += result.modified_count
+            except BulkWriteError as e:
+                migrated += e.details["nModified"]
+                conflicts += len(e.details["writeErrors"])
+                self.logger.warning(f'{len(e.details["writeErrors"])} legacy documents conflict with existing days')
+
+        indexes = yield self._to_list(self.collection.list_indexes())
+        dropped = [index["name"] for index in indexes if index["name"] in self.LEGACY_INDEXES]
+        for name in dropped:
+            yield self.collection.drop_index(name)
+        yield self.ensure_indexes()
+        yield self.rebuild_stats(user_id)
+        return {"migrated": migrated, "conflicts": conflicts, "dropped_indexes": dropped}
+
+    @planned
+    def migrate_schema(self, schema_name=None, batch_size=1000):
+        """Convert days stored in the other schema to ``schema_name`` (default Config.DOCUMENT_SCHEMA).
+
+        Batches are ``_id`` ranges converted by one pipeline update each, so
+        a day is never seen half converted. The API shape and versions do not
+        change; the stats of every user with converted days are rebuilt.
+        """
+        schema = SCHEMAS[schema_name or Config.DOCUMENT_SCHEMA]
+        self.logger.info('Converting progress documents to the %s schema', schema.name)
+        converted = 0
+        users = set()
+        while True:
+            batch = yield self._to_list(
+                self.collection.find(schema.stale, {"_id": 1, "user_id": 1}).sort("_id", ASCENDING).limit(batch_size)
+            )
+            if not batch:
+                break
+            result = yield self.collection.update_many({"_id": {"$lte": batch[-1]["_id"]}, **schema.stale}, schema.normalize())
+            converted += result.modified_count
+            users.update(doc.get("user_id") or Config.DEFAULT_USER_ID for doc in batch)
+        for user_id in sorted(users):
+            yield self.rebuild_stats(user_id)
+        return {"schema": schema.name, "converted": converted, "users": len(users)}
+
+    @planned
+    def explain_queries(self, user_id=Config.DEFAULT_USER_ID, date=None):
+        """Return a summary of the winning query plan for each hot-path query"""
+        date = date or datetime.now().date().isoformat()
+        start_date = (datetime.fromisoformat(date) - timedelta(days=Config.HISTORY_DAYS)).date().isoformat()
+        queries = {
+            # update_progress and increment_water filter on the same key
+            "get_progress_by_date": self.collection.find({"user_id": user_id, "date": date}).limit(1),
+            "get_history": self.collection.find(
+                {"user_id": user_id, "date": {"$gte": start_date, "$lte": date}}
+            ).sort("date", -1),
+            "get_all_progress_pics": self.collection.find(
+                {"user_id": user_id, "progress_pic": {"$exists": True, "$ne": None}},
+                {"date": 1, "progress_pic": 1, "_id": 0}
+            ).sort("date", -1),
+        }
+        report = {}
+        for name, cursor in queries.items():
+            explain = yield cursor.explain()
+            winning_plan = explain["queryPlanner"]["winningPlan"]
+            stages, index_names = self._plan_stages(winning_plan.get("queryPlan", winning_plan))
+            stats = explain.get("executionStats", {})
+            report[name] = {
+                "stages": stages,
+                "indexes": index_names,
+                "collscan": "COLLSCAN" in stages,
+                "docs_examined": stats.get("totalDocsExamined"),
+                "keys_examined": stats.get("totalKeysExamined"),
+                "returned": stats.get("nReturned"),
+            }
+        return report
+
+    @staticmethod
+    def _plan_stages(plan):
+        """Flatten a query plan tree into its stage names and index names"""
+        stages = [plan.get("stage")]
+        index_names = [plan["indexName"]] if "indexName" in plan else []
+        children = plan.get("inputStages", [])
+        if "inputStage" in plan:
+            children = [plan["inputStage"]] + children
+        for child in children:
+            child_stages, child_indexes = Database._plan_stages(child)
+            stages += child_stages
+            index_names += child_indexes
+        return stages, index_names
     
-    def get_all_progress(self):
-        """Get all progress data from the database"""
-        self.logger.debug('Fetching all progress data')
-        progress = list(self.collection.find())
+    @planned
+    def get_all_progress(self, user_id):
+        """Get all progress data of a user"""
+        self.logger.debug('Fetching all progress data for user: %s', user_id)
+        progress = yield self._to_list(self.collection.find({"user_id": user_id}))
         for item in progress:
             item["_id"] = str(item["_id"])
             if "progress_pic" in item:
                 item["progress_pic"] = None
+            to_external(item)
         return progress
+
+    @planned
+    def _stats_days(self, user_id):
+        """The date and stored tasks of every day of a user, which StatsService reads in either schema"""
+        return (yield self._to_list(self.collection.find({"user_id": user_id}, {"_id": 0, "date": 1, **TASKS_PROJECTION})))
     
-    def get_progress_by_date(self, date):
+    def get_all_progress_by_user(self, batch_days=Config.BULK_STATS_BATCH_DAYS):
+        """Yield the date and tasks of every progress document grouped by user, in batches of whole users.
+
+        A batch is closed at the first user boundary after ``batch_days``
+        days, so memory holds one batch rather than the collection.
+        """
+        self.logger.debug('Fetching all progress data grouped by user')
+        progress_by_user, size = {}, 0
+        for item in self._all_progress_cursor():
+            user_id = item.pop("user_id", None) or Config.DEFAULT_USER_ID
+            if size >= batch_days and user_id not in progress_by_user:
+                yield progress_by_user
+                progress_by_user, size = {}, 0
+            progress_by_user.setdefault(user_id, []).append(to_external(item))
+            size += 1
+        if progress_by_user:
+            yield progress_by_user
+
+    def _all_progress_cursor(self):
+        """Date and tasks of every day, sorted by user and date"""
+        return self.collection.find({}, {"date": 1, "user_id": 1, "_id": 0, **TASKS_PROJECTION}).sort(
+            [("user_id", ASCENDING), ("date", ASCENDING)]
+        )
+
+    @planned
+    def get_progress_by_date(self, user_id, date):
         """Get progress data for a specific date"""
-        self.logger.debug(f'Fetching progress for date: {date}')
-        progress = self.collection.find_one({"date": date})
+        self.logger.debug('Fetching progress for user %s on date: %s', user_id, date)
+        progress = yield self.collection.find_one({"user_id": user_id, "date": date})
         if progress:
             progress["_id"] = str(progress["_id"])
+            to_external(progress)
         return progress
     
-    def create_progress_for_date(self, date):
+    @planned
+    def get_or_create_progress(self, user_id, date):
+        """Get progress for a date, atomically creating the default entry if missing"""
+        self.logger.debug('Fetching or creating progress for user %s on date: %s', user_id, date)
+        new_id = ObjectId()
+        tasks = Config.DEFAULT_TASKS.copy()
+        try:
+            existing = yield self.collection.find_one_and_update(
+                {"user_id": user_id, "date": date},
+                {"$setOnInsert": {"_id": new_id, **current_schema().fields(tasks)}},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # A concurrent upsert for the same date won the race
+            existing = yield self.collection.find_one({"user_id": user_id, "date": date})
+        if existing:
+            existing["_id"] = str(existing["_id"])
+            return to_external(existing)
+
+        self.logger.info('Created progress entry for user %s on date: %s', user_id, date)
+        # Versioned only when created, so reading an existing day stays a single round trip
+        version, _ = yield from self._versioned(
+            user_id, lambda version: self.collection.update_one({"_id": new_id}, {"$max": {"version": version}})
+        )
+        yield from self._apply_stats_change(user_id, date, None, tasks, version)
+        self._notify_change(user_id, "progress")
+        return {"_id": str(new_id), "user_id": user_id, "date": date, "tasks": tasks}
+
+    @planned
+    def create_progress_for_date(self, user_id, date):
         """Create a new progress entry for a specific date"""
-        self.logger.info(f'Creating progress entry for date: {date}')
+        self.logger.info('Creating progress entry for user %s on date: %s', user_id, date)
+        tasks = Config.DEFAULT_TASKS.copy()
         new_progress = {
+            "user_id": user_id,
             "date": date,
-            "tasks": Config.DEFAULT_TASKS.copy(),
+            **current_schema().fields(tasks),
         }
-        result = self.collection.insert_one(new_progress)
+        version, result = yield from self._versioned(
+            user_id, lambda version: self.collection.insert_one({**new_progress, "version": version})
+        )
         new_progress["_id"] = str(result.inserted_id)
+        to_external(new_progress)
+        yield from self._apply_stats_change(user_id, date, None, new_progress["tasks"], version)
+        self._notify_change(user_id, "progress")
         return new_progress
     
-    def update_progress(self, date, tasks):
+    @planned
+    def update_progress(self, user_id, date, tasks):
         """Update progress for a specific date"""
-        self.logger.info(f'Updating progress for date: {date}')
+        self.logger.info('Updating progress for user %s on date: %s', user_id, date)
         if "drink_gallon_water" in tasks:
             val = tasks["drink_gallon_water"]
             if isinstance(val, int):
                 tasks["drink_gallon_water"] = min(val, Config.WATER_GOAL_ML)
         
-        self.collection.update_one(
-            {"date": date}, 
-            {"$set": {"tasks": tasks}}
-        )
+        changed_at = self._timestamp_ms()
+        update = current_schema().replace(tasks)
+        update["$set"].update({f"task_times.{task}": changed_at for task in tasks})
+        version, previous = yield from self._versioned(user_id, lambda version: self.collection.find_one_and_update(
+            {"user_id": user_id, "date": date},
+            self._stamp_version(update, version),
+            projection=TASKS_PROJECTION,
+            return_document=ReturnDocument.BEFORE
+        ))
+        if previous:
+            yield from self._apply_stats_change(user_id, date, day_tasks(previous), tasks, version)
+            self._notify_change(user_id, "progress")
         return {"message": "Progress updated successfully"}
     
-    def increment_water(self, date, amount):
+    @planned
+    def increment_water(self, user_id, date, amount):
         """Increment water intake for a specific date"""
-        self.logger.info(f'Incrementing water for {date} by {amount}ml')
-        progress = self.collection.find_one({"date": date})
-        if not progress:
-            self.logger.warning(f'No progress found for date: {date}')
+        self.logger.info('Incrementing water for user %s on %s by %sml', user_id, date, amount)
+        version, previous = yield from self._versioned(user_id, lambda version: self.collection.find_one_and_update(
+            {"user_id": user_id, "date": date},
+            self._stamp_version(self._water_increment_update(amount), version),
+            projection=TASKS_PROJECTION,
+            return_document=ReturnDocument.BEFORE
+        ))
+        if not previous:
+            self.logger.warning(f'No progress found for user {user_id} on date: {date}')
             return None
         
-        current = progress["tasks"].get("drink_gallon_water", 0)
+        # The update is atomic, so applying it to the prior value yields the stored result
+        previous_tasks = day_tasks(previous)
+        current = previous_tasks.get("drink_gallon_water") or 0
         new_value = min(current + amount, Config.WATER_GOAL_ML)
-        
-        self.collection.update_one(
-            {"date": date}, 
-            {"$set": {"tasks.drink_gallon_water": new_value}}
+        yield from self._apply_stats_change(
+            user_id, date, previous_tasks, {**previous_tasks, "drink_gallon_water": new_value}, version
         )
+        self._notify_change(user_id, "progress")
         return new_value
     
-    def get_history(self, days=Config.HISTORY_DAYS):
-        """Get progress history for the specified number of days using local time"""
-        self.logger.debug(f'Fetching history for last {days} days')
+    @planned
+    def apply_operations(self, user_id, operations):
+        """Apply a batch of task operations across one or more dates in one bulk write.
+
+        Each operation is a dict with ``date`` and ``op`` ("toggle", "set" or
+        "add_water") plus ``task``/``value`` or ``amount``. Missing days are
+        created with the default tasks. Returns the new state of every touched day.
+
+        Tasks resolve conflicts per field by last writer wins: a ``set`` made
+        at ``at`` (ms since the epoch, default now) is dropped if the stored
+        value was set later. Water additions always apply.
+
+        The days are read before and after the bulk write, which is not one
+        atomic step, so stats are only updated from the difference when no
+        other write of the user overlapped the batch; otherwise they are
+        rebuilt from the stored days.
+        """
+        operations = self._timed_operations(operations)
+        dates = sorted({operation["date"] for operation in operations})
+        self.logger.info('Applying %s operations across %s dates for user %s', len(operations), len(dates), user_id)
+        day_filter = {"user_id": user_id, "date": {"$in": dates}}
+        state = (yield self.versions_collection.find_one({"_id": user_id}, {"version": 1, "pending": 1})) or {}
+        previous = {
+            doc["date"]: day_tasks(doc)
+            for doc in (yield self._to_list(self.collection.find(day_filter, {"date": 1, "_id": 0, **TASKS_PROJECTION})))
+        }
+        missing = [date for date in dates if date not in previous]
+
+        version, result = yield from self._versioned(user_id, lambda version: self.collection.bulk_write(
+            self._operation_requests(user_id, missing, dates, operations, version), ordered=True
+        ))
+        # The creating requests come first; a missing day another write created meanwhile was not upserted here
+        created = {missing[index] for index in result.upserted_ids}
+
+        days = {}
+        for doc in (yield self._to_list(self.collection.find(day_filter).sort("date", ASCENDING))):
+            doc["_id"] = str(doc["_id"])
+            days[doc["date"]] = to_external(doc)
+        if len(created) < len(missing) or not (yield from self._written_alone(user_id, state, version)):
+            self.logger.debug('Another write overlapped the operations of user %s, rebuilding stats', user_id)
+            yield self.rebuild_stats(user_id)
+        else:
+            for date, doc in days.items():
+                # A rebuild reads every stored day, including the rest of this batch
+                if (yield from self._apply_stats_change(user_id, date, previous.get(date), doc["tasks"], version)):
+                    break
+        self._notify_change(user_id, "progress")
+        return days
+
+    def _written_alone(self, user_id, state, version):
+        """Plan step telling whether the write at ``version`` was the only write of the user since ``state`` was read.
+
+        ``state`` is the versions document read before the write. No write may
+        have been pending then (stale entries aside) and no version but
+        ``version`` may have been issued since.
+        """
+        now = time.time()
+        stale = self._stale_pending(state, now)
+        if any(entry not in stale for entry in state.get("pending", ())):
+            return False
+        latest = yield self.versions_collection.find_one({"_id": user_id}, {"version": 1})
+        return version == state.get("version", 0) + 1 == latest["version"]
+
+    @staticmethod
+    def _timed_operations(operations):
+        """Give every task operation its ``at`` time, defaulting to now; client clocks cannot be ahead of ours"""
+        now = Database._timestamp_ms()
+        return [
+            operation if operation["op"] == "add_water" else {**operation, "at": min(operation.get("at", now), now)}
+            for operation in operations
+        ]
+
+    @staticmethod
+    def _operation_requests(user_id, missing, dates, operations, version):
+        """Bulk write requests creating the ``missing`` days, applying each operation in order, then stamping ``version``"""
+        requests = [
+            UpdateOne({"user_id": user_id, "date": date}, {"$setOnInsert": current_schema().fields(Config.DEFAULT_TASKS.copy())}, upsert=True)
+            for date in missing
+        ]
+        requests += [
+            UpdateOne({"user_id": user_id, "date": operation["date"]}, Database._operation_update(operation))
+            for operation in operations
+        ]
+        requests.append(UpdateMany({"user_id": user_id, "date": {"$in": dates}}, {"$max": {"version": version}}))
+        return requests
+
+    @staticmethod
+    def _operation_update(operation):
+        """Translate one task operation into a pipeline update, converting the day to the current schema first"""
+        op = operation["op"]
+        if op == "add_water":
+            return Database._water_increment_update(operation["amount"])
+        schema = current_schema()
+        changed_at_field = f"task_times.{operation['task']}"
+        changed_at = {"$max": [f"${changed_at_field}", operation["at"]]}
+        if op == "toggle":
+            return schema.normalize() + [{"$set": {**schema.toggle(operation["task"]), changed_at_field: changed_at}}]
+        value = operation["value"]
+        if operation["task"] == "drink_gallon_water":
+            value = min(value, Config.WATER_GOAL_ML)
+        newer = {"$gte": [operation["at"], {"$ifNull": [f"${changed_at_field}", 0]}]}
+        return schema.normalize() + [{"$set": {**schema.set_value(operation["task"], value, newer), changed_at_field: changed_at}}]
+
+    @staticmethod
+    def _water_increment_update(amount):
+        """Pipeline update adding ``amount`` ml of water, capped at the daily goal"""
+        schema = current_schema()
+        return schema.normalize() + [{"$set": schema.add_water(amount)}]
+
+    @planned
+    def get_changes(self, user_id, since=0):
+        """Return the days changed after version ``since`` and the version to sync from next.
+
+        ``since`` 0, or a version the server never issued (e.g. after a
+        restore), returns every day of the user with ``full`` set, after which
+        the client replaces its copy instead of merging into it.
+        """
+        self.logger.debug('Fetching changes for user %s since version %s', user_id, since)
+        # Read before the days: every write at or below this version is already visible to the query
+        version = self._sync_version((yield self.versions_collection.find_one({"_id": user_id})), time.time())
+        full = not 0 < since <= version
+        query = {"user_id": user_id} if full else {"user_id": user_id, "version": {"$gt": since}}
+        days = yield self._to_list(self.collection.find(query, {"user_id": 0}).sort("date", ASCENDING))
+        for doc in days:
+            doc["_id"] = str(doc["_id"])
+            to_external(doc)
+        return {"version": version, "full": full, "days": days}
+
+    @planned
+    def push_operations(self, user_id, operations, since=0):
+        """Apply operations queued by an offline client, then return the changes since ``since``.
+
+        Operations carrying an ``id`` that was already pushed are skipped, so a
+        client can resend a batch whose response it never received.
+        """
+        new_operations = yield from self._claim_pushed(user_id, operations)
+        self.logger.info('Pushing %s queued operations for user %s (%s already applied)',
+                         len(new_operations), user_id, len(operations) - len(new_operations))
+        if new_operations:
+            yield self.apply_operations(user_id, new_operations)
+        changes = yield self.get_changes(user_id, since)
+        changes["applied"] = len(new_operations)
+        changes["skipped"] = len(operations) - len(new_operations)
+        return changes
+
+    def _claim_pushed(self, user_id, operations):
+        """Plan step recording the ids of the operations not pushed before; returns the operations to apply.
+
+        The ids are claimed before the operations are applied, by an update
+        that only matches while none of them is recorded. Of two concurrent
+        pushes of one batch only one applies it, and a push that dies after
+        claiming loses its operations rather than applying them twice.
+        """
+        while True:
+            state = (yield self.versions_collection.find_one({"_id": user_id}, {"applied": 1})) or {}
+            pushed = set(state.get("applied", ()))
+            new_operations = [operation for operation in operations if operation.get("id") not in pushed]
+            ids = [operation["id"] for operation in new_operations if operation.get("id")]
+            if not ids:
+                return new_operations
+            try:
+                yield self.versions_collection.update_one(
+                    {"_id": user_id, "applied": {"$nin": ids}},
+                    {"$push": {"applied": {"$each": ids, "$slice": -Config.SYNC_APPLIED_IDS}}},
+                    upsert=True
+                )
+                return new_operations
+            except DuplicateKeyError:
+                # Another push recorded some of the ids first: skip those and claim the rest
+                continue
+
+    @staticmethod
+    def _stamp_version(update, version):
+        """Add raising the day's ``version`` to ``version`` to an update document or pipeline"""
+        if isinstance(update, list):
+            return update + [{"$set": {"version": {"$max": ["$version", version]}}}]
+        return {**update, "$max": {"version": version}}
+
+    @staticmethod
+    def _timestamp_ms():
+        return int(time.time() * 1000)
+
+    @staticmethod
+    def history_range(days=Config.HISTORY_DAYS):
+        """Return the (start, end) ISO dates of the history window using local time"""
         local_tz = datetime.now().astimezone().tzinfo
         end_date = datetime.now(local_tz).date()
         start_date = end_date - timedelta(days=days)
+        return start_date.isoformat(), end_date.isoformat()
+
+    def find_progress(self, user_id, start_date=None, end_date=None, after=None, limit=None, fields=None, descending=False):
+        """Yield progress documents in date order straight from the cursor.
+
+        ``after`` is an exclusive date cursor in the sort direction, so the last
+        date of one page fetches the next. ``fields`` restricts the projection
+        to the given paths; picture and user fields are never fetched.
+        """
+        self.logger.debug('Finding progress for user %s after=%s limit=%s fields=%s', user_id, after, limit, fields)
+        for doc in self._progress_cursor(user_id, start_date, end_date, after, limit, fields, descending):
+            yield self._listed_day(doc, fields)
+
+    def _progress_cursor(self, user_id, start_date, end_date, after, limit, fields, descending):
+        query, projection, direction = self._progress_query(user_id, start_date, end_date, after, fields, descending)
+        cursor = self.collection.find(query, projection).sort("date", direction)
+        return cursor.limit(limit) if limit else cursor
+
+    @staticmethod
+    def _listed_day(doc, fields):
+        if "_id" in doc:
+            doc["_id"] = str(doc["_id"])
+        return to_external(doc, fields)
+
+    @staticmethod
+    def _progress_query(user_id, start_date, end_date, after, fields, descending):
+        """Return the ``(query, projection, sort direction)`` of a find_progress call"""
+        date_filter = {}
+        if start_date:
+            date_filter["$gte"] = start_date
+        if end_date:
+            date_filter["$lte"] = end_date
+        if after:
+            date_filter["$lt" if descending else "$gt"] = after
+        if fields:
+            projection = {"_id": 0, "date": 1, **{field: 1 for field in fields}}
+            if any(field.startswith("tasks") for field in fields):
+                projection.update(dict.fromkeys(COMPACT_FIELDS, 1))
+        else:
+            projection = {"progress_pic": 0, "user_id": 0}
+
+        query = {"user_id": user_id, "date": date_filter} if date_filter else {"user_id": user_id}
+        return query, projection, DESCENDING if descending else ASCENDING
+
+    @planned
+    def get_dashboard(self, user_id, date, days=Config.HISTORY_DAYS):
+        """Return the day, the history window and the stats a dashboard load needs.
+
+        Everything is derived from one query. With materialized stats it only
+        reads the history window and ``date``, and the stats are a point read;
+        otherwise it reads all of the user's days and the stats are computed
+        from the same result set. A missing day is created like
+        get_or_create_progress does.
+        """
+        self.logger.debug('Building dashboard for user %s on date: %s', user_id, date)
+        start_date, end_date = self.history_range(days)
+        derive_stats = Config.STATS_BACKEND != "materialized"
+        query = self._dashboard_query(user_id, date, start_date, end_date, derive_stats)
+        day_docs = yield self._to_list(self.collection.find(query).sort("date", ASCENDING))
+        dashboard = self._dashboard_from_days(day_docs, date, start_date, end_date, derive_stats)
+        if dashboard["progress"] is None:
+            # First load of the day: create it, then derive everything again with it included
+            bisect.insort(day_docs, (yield self.get_or_create_progress(user_id, date)), key=itemgetter("date"))
+            dashboard = self._dashboard_from_days(day_docs, date, start_date, end_date, derive_stats)
+        if not derive_stats:
+            dashboard["stats"] = yield self.get_materialized_stats(user_id)
+        return dashboard
+
+    @staticmethod
+    def _dashboard_query(user_id, date, start_date, end_date, all_days):
+        """Filter of a dashboard load: every day of the user, or the history window plus ``date``"""
+        if all_days:
+            return {"user_id": user_id}
+        window = {"user_id": user_id, "date": {"$gte": start_date, "$lte": end_date}}
+        if start_date <= date <= end_date:
+            return window
+        # A date outside the window is a second point lookup, not a range stretched to reach it
+        return {"$or": [window, {"user_id": user_id, "date": date}]}
+
+    @staticmethod
+    def _dashboard_from_days(day_docs, date, start_date, end_date, derive_stats):
+        """Derive the day, the newest-first history and optionally the stats in one pass over date-ordered days"""
+        progress = None
+        history = []
+        flags = []
+        completed_days = 0
+        task_counts = dict.fromkeys(Config.TASK_NAMES, 0)
+        for doc in day_docs:
+            doc["_id"] = str(doc["_id"])
+            if derive_stats:
+                complete = StatsService.is_day_complete(doc)
+                completed_days += complete
+                flags.append((doc["date"], complete))
+                for task_key, done in StatsService.day_task_completion(doc).items():
+                    task_counts[task_key] += done
+            to_external(doc)
+            if doc["date"] == date:
+                progress = doc
+            if start_date <= doc["date"] <= end_date:
+                history.append({"date": doc["date"], "tasks": doc["tasks"]})
+
+        stats = None
+        if derive_stats:
+            current_streak, longest_streak = StatsService.calculate_streaks_from_flags(flags)
+            stats = StatsService.stats_from_totals(len(flags), completed_days, current_streak, longest_streak, task_counts)
+        history.reverse()
+        return {"date": date, "progress": progress, "history": history, "stats": stats}
+
+    @planned
+    def get_history(self, user_id, days=Config.HISTORY_DAYS):
+        """Get progress history for the specified number of days using local time"""
+        self.logger.debug('Fetching history for user %s for last %s days', user_id, days)
+        start_date, end_date = self.history_range(days)
         
-        history = list(self.collection.find({
+        history = yield self._to_list(self.collection.find({
+            "user_id": user_id,
             "date": {
-                "$gte": start_date.isoformat(),
-                "$lte": end_date.isoformat()
+                "$gte": start_date,
+                "$lte": end_date
             }
         }).sort("date", -1))
         
@@ -93,33 +802,408 @@ class Database:
             item["_id"] = str(item["_id"])
             if "progress_pic" in item:
                 item["progress_pic"] = None  # or base64.b64encode(item["progress_pic"]).decode('utf-8')
+            to_external(item)
         
         return history
 
+    @planned
     def save_progress_pic(self, user_id, file_name, date):
         """Save or update the progress picture for a specific date."""
-        self.logger.info(f'Saving progress picture for user: {user_id}')
+        self.logger.info('Saving progress picture for user: %s', user_id)
         
-        result = self.collection.update_one(
-            {"date": date},
-            {"$set": {"progress_pic": file_name, "user_id": user_id}},
+        version, result = yield from self._versioned(user_id, lambda version: self.collection.update_one(
+            {"user_id": user_id, "date": date},
+            self._stamp_version({
+                "$set": {"progress_pic": file_name},
+                "$setOnInsert": current_schema().fields(Config.DEFAULT_TASKS.copy())
+            }, version),
             upsert=True
-        )
-        self.logger.info(f'Matched: {result.matched_count}, Modified: {result.modified_count}, Upserted: {result.upserted_id}')
+        ))
+        self.logger.info('Matched: %s, Modified: %s, Upserted: %s', result.matched_count, result.modified_count, result.upserted_id)
+        self._notify_change(user_id, "pics")
+        if result.upserted_id is not None:
+            yield from self._apply_stats_change(user_id, date, None, Config.DEFAULT_TASKS.copy(), version)
+            self._notify_change(user_id, "progress")
         return {"message": "Progress picture saved successfully"}
 
-    def get_progress_pic(self, date):
+    @planned
+    def get_progress_pic(self, user_id, date):
         """Retrieve the progress picture for a specific date."""
-        self.logger.debug(f'Getting progress picture for date: {date}')
-        doc = self.collection.find_one({"date": date})
+        self.logger.debug('Getting progress picture for user %s on date: %s', user_id, date)
+        doc = yield self.collection.find_one({"user_id": user_id, "date": date}, {"progress_pic": 1})
         if doc and "progress_pic" in doc:
             return doc["progress_pic"]
         return None
 
-    def get_all_progress_pics(self):
-        """Return a list of all dates and their progress pictures (if present), sorted by date descending."""
-        self.logger.debug('Getting all progress pictures')
-        pics = self.collection.find({"progress_pic": {"$exists": True, "$ne": None}}, {"date": 1, "progress_pic": 1, "user_id": 1, "_id": 0}).sort("date", -1)
-        return list(pics)
+    @planned
+    def get_all_progress_pics(self, user_id):
+        """Return a list of a user's dates and their progress pictures (if present), sorted by date descending."""
+        self.logger.debug('Getting all progress pictures for user: %s', user_id)
+        pics = self.collection.find(
+            {"user_id": user_id, "progress_pic": {"$exists": True, "$ne": None}},
+            {"date": 1, "progress_pic": 1, "user_id": 1, "_id": 0}
+        ).sort("date", -1)
+        return (yield self._to_list(pics))
+
+    @planned
+    def get_stats(self, user_id):
+        """Return comprehensive stats using the backend selected by Config.STATS_BACKEND"""
+        with STATS_DURATION.labels(Config.STATS_BACKEND).time():
+            if Config.STATS_BACKEND == "pipeline":
+                return (yield self.get_stats_pipeline(user_id))
+            if Config.STATS_BACKEND == "python":
+                return StatsService.get_comprehensive_stats((yield self._stats_days(user_id)))
+            return (yield self.get_materialized_stats(user_id))
+
+    @planned
+    def get_stats_pipeline(self, user_id):
+        """Compute comprehensive stats inside MongoDB with an aggregation pipeline.
+
+        Totals and per-task counts come back as a single grouped document; only
+        the streak scan runs client-side, over a projected date/complete stream.
+        """
+        self.logger.debug('Computing stats with aggregation pipeline for user: %s', user_id)
+        totals_pipeline, flags_pipeline = self._stats_pipelines(user_id)
+        totals = yield self._to_list(self.collection.aggregate(totals_pipeline))
+        if not totals:
+            return StatsService.get_comprehensive_stats([])
+        flags = yield self._to_list(self.collection.aggregate(flags_pipeline))
+        return self._stats_from_aggregates(totals[0], flags)
+
+    @staticmethod
+    def _stats_pipelines(user_id):
+        """Return the totals and the date/complete flags aggregation pipelines of a user"""
+        completion = StatsService.completion_expression()
+        group = {"_id": None, "total_days": {"$sum": 1}, "completed_days": {"$sum": {"$cond": [completion, 1, 0]}}}
+        for task_key, expression in StatsService.task_completion_expressions().items():
+            group[task_key] = {"$sum": expression}
+        match = {"$match": {"user_id": user_id}}
+        flags = [match, {"$sort": {"date": 1}}, {"$project": {"_id": 0, "date": 1, "complete": completion}}]
+        return [match, {"$group": group}], flags
+
+    @staticmethod
+    def _stats_from_aggregates(totals, flags):
+        """Combine the grouped totals with a streak scan over the date-ordered flags"""
+        current_streak, longest_streak = StatsService.calculate_streaks_from_flags(
+            (flag["date"], flag["complete"]) for flag in flags
+        )
+        return StatsService.stats_from_totals(
+            totals["total_days"],
+            totals["completed_days"],
+            current_streak,
+            longest_streak,
+            {task_key: totals[task_key] for task_key in Config.TASK_NAMES}
+        )
+
+    @planned
+    def get_materialized_stats(self, user_id):
+        """Return comprehensive stats from the materialized stats document"""
+        self.logger.debug('Fetching materialized stats for user: %s', user_id)
+        stats_doc = yield self.stats_collection.find_one({"_id": user_id})
+        if not stats_doc or stats_doc.get("dirty"):
+            stats_doc = yield self.rebuild_stats(user_id)
+        stats = StatsService.render_stats_document(stats_doc)
+        if stats is None:
+            # Days after today make the current streak depend on the full history
+            stats = StatsService.get_comprehensive_stats((yield self._stats_days(user_id)))
+        return stats
+
+    @planned
+    def rebuild_stats(self, user_id):
+        """Recompute the materialized stats document from scratch and store it.
+
+        The document is only replaced while its ``generation``, which every
+        _apply_stats_change bumps, is still the one read before the days, so
+        a change folded in meanwhile starts the rebuild over instead of being
+        overwritten. ``rebuilt_version`` is the user's version once the days
+        are read; writes at or below it may already be counted.
+        """
+        self.logger.info('Rebuilding materialized stats for user: %s', user_id)
+        while True:
+            current = yield self.stats_collection.find_one({"_id": user_id}, {"generation": 1})
+            stats_doc = StatsService.build_stats_document((yield self._stats_days(user_id)))
+            state = (yield self.versions_collection.find_one({"_id": user_id}, {"version": 1})) or {}
+            stats_doc["rebuilt_version"] = state.get("version", 0)
+            try:
+                if current is None:
+                    yield self.stats_collection.insert_one({"_id": user_id, **stats_doc, "generation": 0})
+                    break
+                stats_doc["generation"] = current.get("generation", 0)
+                result = yield self.stats_collection.replace_one({"_id": user_id, "generation": current.get("generation")}, stats_doc)
+                if result.matched_count:
+                    break
+            except DuplicateKeyError:
+                pass
+            self.logger.debug('Materialized stats of user %s changed during the rebuild, starting over', user_id)
+        stats_doc["_id"] = user_id
+        return stats_doc
+
+    @planned
+    def check_stats_consistency(self, user_id):
+        """Compare the materialized stats document against a full rebuild"""
+        self.logger.info('Checking materialized stats consistency for user: %s', user_id)
+        all_progress = yield self._stats_days(user_id)
+        stored = (yield self.stats_collection.find_one({"_id": user_id}, {"_id": 0})) or {}
+        return self._consistency_report(all_progress, stored)
+
+    @planned
+    def repair_stats(self, user_id):
+        """check_stats_consistency, rebuilding the stats document when it is inconsistent"""
+        report = yield self.check_stats_consistency(user_id)
+        if not report["consistent"]:
+            self.logger.warning('Materialized stats inconsistent for user %s, rebuilding', user_id)
+            yield self.rebuild_stats(user_id)
+            report["repaired"] = True
+        return report
+
+    @staticmethod
+    def _consistency_report(all_progress, stored):
+        """Diff a stored stats document against one rebuilt from ``all_progress``"""
+        rebuilt = StatsService.build_stats_document(all_progress)
+        differences = {
+            field: {"materialized": stored.get(field), "rebuilt": value}
+            for field, value in rebuilt.items()
+            if stored.get(field) != value
+        }
+        expected = StatsService.get_comprehensive_stats(all_progress)
+        rendered = StatsService.render_stats_document(stored) if stored else None
+        return {
+            "consistent": not differences and rendered in (None, expected),
+            "differences": differences,
+            "materialized": rendered,
+            "rebuilt": expected
+        }
+
+    @planned
+    def run_rollup(self, batch_size=1000):
+        """Rebuild the leaderboard and the cohort rollups in one pass over all progress.
+
+        Days are streamed in (user_id, date) index order and grouped per user.
+        Each entry stores its rank by every leaderboard field in ``ranks``,
+        written once all users are counted; until then an entry keeps the
+        ranks of the previous run. Documents left over from earlier runs (users
+        or cohort days that no longer exist) are deleted once the new ones are
+        written, so readers never see an empty leaderboard. Everything is as of
+        the last run: writes do not update the rollups until the next one.
+        """
+        self.logger.info('Rebuilding leaderboard and cohort rollups')
+        run_id = ObjectId()
+        updated_at = datetime.now(pytz.utc).isoformat()
+        rollup = RollupService()
+        days = self.collection.find(
+            {"user_id": {"$type": "string"}},
+            {"_id": 0, "user_id": 1, "date": 1, **TASKS_PROJECTION}
+        ).sort([("user_id", ASCENDING), ("date", ASCENDING)])
+        users = 0
+        requests = []
+        held = []
+        while True:
+            batch = yield self._next_batch(days, batch_size)
+            finished = []
+            for user_id, user_days in groupby(batch, key=itemgetter("user_id")):
+                if held and held[0]["user_id"] != user_id:
+                    finished.append(held)
+                    held = []
+                held.extend(user_days)
+            if not batch and held:
+                # A user's days can continue in the next batch, so the last one is only complete at the end
+                finished.append(held)
+            for user_days in finished:
+                entry = rollup.add_user(user_days[0]["user_id"], user_days)
+                # $set, not a replacement, so the entry keeps its ranks until the new ones are written
+                requests.append(UpdateOne(
+                    {"_id": entry.pop("_id")}, {"$set": {**entry, "run_id": run_id, "updated_at": updated_at}}, upsert=True
+                ))
+            users += len(finished)
+            if requests and (len(requests) >= batch_size or not batch):
+                yield self.leaderboard_collection.bulk_write(requests, ordered=False)
+                requests = []
+            if not batch:
+                break
+
+        # One update per distinct value, served by the <field>_rank indexes
+        ranks = [
+            UpdateMany({field: value, "run_id": run_id}, {"$set": {f"ranks.{field}": rank}})
+            for field, value, rank in rollup.ranks()
+        ]
+        rollups = [
+            ReplaceOne({"_id": document["_id"]}, {**document, "run_id": run_id, "updated_at": updated_at}, upsert=True)
+            for document in rollup.rollup_documents()
+        ]
+        for collection, writes in ((self.leaderboard_collection, ranks), (self.rollups_collection, rollups)):
+            for start in range(0, len(writes), batch_size):
+                yield collection.bulk_write(writes[start:start + batch_size], ordered=False)
+        yield self.leaderboard_collection.delete_many({"run_id": {"$ne": run_id}})
+        yield self.rollups_collection.delete_many({"run_id": {"$ne": run_id}})
+        return {"users": users, "rollups": len(rollups), "updated_at": updated_at}
+
+    def export_progress(self, user_id=None):
+        """Iterate the days of one user, or of every user, in (user_id, date) index order"""
+        return map(to_external, self._export_cursor(user_id))
+
+    def _export_cursor(self, user_id):
+        query = {"user_id": user_id} if user_id else {"user_id": {"$type": "string"}}
+        return self.collection.find(query, self.EXPORT_PROJECTION).sort([("user_id", ASCENDING), ("date", ASCENDING)])
+
+    @planned
+    def import_progress(self, days, user_id=None, replace=True, batch_size=Config.IMPORT_BATCH_SIZE):
+        """Write imported days in unordered batches and return a report of what was written.
+
+        Days are validated with TransferService.normalize_day; invalid ones are
+        rejected and counted. With ``replace`` an existing day gets the
+        imported tasks, otherwise it is kept and counted as a conflict. Only a
+        batch is held in memory. Afterwards every imported user's stats are
+        rebuilt and their days get a new sync version. AsyncDatabase reads
+        ``days`` from an async iterable.
+
+        A ValueError raised by ``days`` (a file that stops decoding) ends the
+        import: the days read before it are written and finalized like a
+        complete import, and the error carries the report as ``report``.
+        """
+        report = {"imported": 0, "rejected": 0, "conflicts": 0, "errors": [], "users": 0}
+        users = set()
+        batch = []
+        days = self._iterate(days)
+        number = 0
+        try:
+            while True:
+                day = yield self._next_item(days)
+                if day is self._EXHAUSTED:
+                    break
+                number += 1
+                try:
+                    batch.append(TransferService.normalize_day(day, user_id))
+                except ValueError as e:
+                    self._reject_import(report, number, e)
+                    continue
+                if len(batch) >= batch_size:
+                    yield from self._write_import_batch(batch, replace, report, users)
+                    batch = []
+            yield from self._write_import_batch(batch, replace, report, users)
+        except ValueError as e:
+            yield from self._write_import_batch(batch, replace, report, users)
+            e.report = report
+            raise
+        finally:
+            yield from self._finish_import(users, report)
+        return report
+
+    def _finish_import(self, users, report):
+        """Plan step giving the days of every imported user a new sync version and rebuilding their stats"""
+        self.logger.info('Imported %s days for %s users (%s rejected, %s conflicts)',
+                         report["imported"], len(users), report["rejected"], report["conflicts"])
+        for imported_user in users:
+            yield from self._versioned(
+                imported_user, lambda version: self.collection.update_many({"user_id": imported_user}, {"$max": {"version": version}})
+            )
+            yield self.rebuild_stats(imported_user)
+            self._notify_change(imported_user, "progress")
+        report["users"] = len(users)
+
+    def _write_import_batch(self, batch, replace, report, users):
+        if not batch:
+            return
+        users.update(document["user_id"] for document in batch)
+        try:
+            if replace:
+                result = yield self.collection.bulk_write(self._import_requests(batch), ordered=False)
+                report["imported"] += result.upserted_count + result.matched_count
+            else:
+                result = yield self.collection.insert_many([self._stored_day(document) for document in batch], ordered=False)
+                report["imported"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            self._count_import_errors(report, e.details)
+
+    @staticmethod
+    def _import_requests(batch):
+        """Upserts setting the imported tasks (and picture, if any) of each day"""
+        requests = []
+        for document in batch:
+            update = current_schema().replace(document["tasks"])
+            if "progress_pic" in document:
+                update["$set"]["progress_pic"] = document["progress_pic"]
+            requests.append(UpdateOne({"user_id": document["user_id"], "date": document["date"]}, update, upsert=True))
+        return requests
+
+    @staticmethod
+    def _stored_day(document):
+        """An imported day with its tasks in the current schema"""
+        stored = {field: value for field, value in document.items() if field != "tasks"}
+        return {**stored, **current_schema().fields(document["tasks"])}
+
+    @staticmethod
+    def _count_import_errors(report, details):
+        """Count the writes of a failed unordered batch; duplicate days are conflicts, anything else is fatal"""
+        errors = details["writeErrors"]
+        conflicts = [error for error in errors if error["code"] == 11000]
+        if len(conflicts) < len(errors):
+            raise BulkWriteError(details)
+        report["imported"] += sum(details.get(count, 0) for count in ("nInserted", "nUpserted", "nMatched"))
+        report["conflicts"] += len(conflicts)
+
+    @staticmethod
+    def _reject_import(report, number, error):
+        report["rejected"] += 1
+        if len(report["errors"]) < Config.MAX_IMPORT_ERRORS:
+            report["errors"].append(f"Day {number}: {error}")
+
+    @planned
+    def get_leaderboard(self, by="current_streak", limit=10):
+        """Top ``limit`` ranked leaderboard entries by ``by``, read in index order"""
+        entries = self.leaderboard_collection.find({}, {"run_id": 0}).sort([(by, DESCENDING), ("_id", ASCENDING)]).limit(limit)
+        return RollupService.ranked((yield self._to_list(entries)), by)
+
+    @planned
+    def get_leaderboard_entry(self, user_id, by="current_streak"):
+        """A user's leaderboard entry with the rank stored by the last rollup, or None if it did not include them"""
+        entry = yield self.leaderboard_collection.find_one({"_id": user_id}, {"run_id": 0})
+        if entry is None:
+            return None
+        # None only while the first rollup that includes the user is writing its ranks
+        return RollupService.leaderboard_row(entry, entry.get("ranks", {}).get(by))
+
+    @planned
+    def get_cohorts(self):
+        """Every cohort with its size, i.e. the users counted on day 1"""
+        firsts = self.rollups_collection.find({"day": 1}, {"_id": 0, "cohort": 1, "users": 1, "updated_at": 1}).sort("cohort", ASCENDING)
+        return [{"cohort": first["cohort"], "size": first["users"], "updated_at": first["updated_at"]} for first in (yield self._to_list(firsts))]
+
+    @planned
+    def get_cohort(self, cohort, start_day=1, end_day=Config.CHALLENGE_DAYS):
+        """Retention and completion curves of a cohort for a range of challenge days, or None if it does not exist"""
+        first = yield self.rollups_collection.find_one({"cohort": cohort, "day": 1}, {"users": 1, "updated_at": 1})
+        if first is None:
+            return None
+        rollups = self.rollups_collection.find(
+            {"cohort": cohort, "day": {"$gte": start_day, "$lte": end_day}}
+        ).sort("day", ASCENDING)
+        return {
+            "cohort": cohort,
+            "size": first["users"],
+            "updated_at": first["updated_at"],
+            "days": RollupService.cohort_days((yield self._to_list(rollups)), first["users"]),
+        }
+
+    def _apply_stats_change(self, user_id, date, old_tasks, new_tasks, version):
+        """Plan step folding a single day change, written at ``version``, into the user's materialized stats document.
+
+        Returns True when the document had to be rebuilt from the stored days
+        instead. That includes a rebuild at or after ``version`` having read
+        the changed day already (get_or_create_progress versions a day after
+        creating it, so it cannot tell a rebuild that raced the creation).
+        """
+        update = StatsService.stats_document_update(date, old_tasks, new_tasks)
+        if update is None:
+            return False
+        stats_doc = yield self.stats_collection.find_one_and_update(
+            {"_id": user_id},
+            update + [{"$set": {"generation": {"$add": [{"$ifNull": ["$generation", 0]}, 1]}}}],
+            projection={"dirty": 1, "rebuilt_version": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if stats_doc is None or stats_doc.get("dirty") or stats_doc.get("rebuilt_version", 0) >= version:
+            yield self.rebuild_stats(user_id)
+            return True
+        return False
 
 db = Database() 
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""Maintenance commands for the 75 Hard tracker backend.
+
+Run from the backend directory, e.g. ``python manage.py explain``.
+"""
+from config import Config
+import argparse
+import json
+import logging
+import sys
+import time
+
+def ensure_indexes(args):
+    from database import db
+    db.ensure_indexes()
+    for index in db.collection.list_indexes():
+        print(json.dumps(index.to_dict(), default=str))
+
+def explain(args):
+    from database import db
+    report = db.explain_queries(args.user_id, args.date)
+    print(json.dumps(report, indent=2, default=str))
+    collscans = [name for name, plan in report.items() if plan["collscan"]]
+    if collscans:
+        print(f"COLLSCAN in: {', '.join(collscans)}", file=sys.stderr)
+        return 1
+    return 0
+
+def migrate_user_ids(args):
+    from database import db
+    result = db.migrate_user_ids(args.user_id, args.batch_size)
+    print(json.dumps(result, indent=2))
+    return 1 if result["conflicts"] else 0
+
+def migrate_schema(args):
+    from database import db
+    print(json.dumps(db.migrate_schema(args.to, args.batch_size), indent=2))
+    return 0
+
+def rollup(args):
+    from database import db
+    while True:
+        print(json.dumps(db.run_rollup(args.batch_size), indent=2), flush=True)
+        if not args.every:
+            return 0
+        time.sleep(args.every)
+
+def bulk_stats(args):
+    from database import db
+    from services.bulk_stats_service import BulkStatsService
+    for progress_by_user in db.get_all_progress_by_user(args.batch_days):
+        for user_id, stats in BulkStatsService.get_stats_by_user(progress_by_user).items():
+            print(json.dumps({"user_id": user_id, **stats}))
+    return 0
+
+def export_progress(args):
+    from database import db
+    from services.transfer_service import TransferService
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    skipped = []
+    try:
+        for chunk in TransferService.encode(db.export_progress(args.user_id), args.format, skipped):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+    for day in skipped:
+        print(f"Left out {day['user_id']} {day['date']}: the {args.format} format cannot store its date", file=sys.stderr)
+    return 1 if skipped else 0
+
+def import_progress(args):
+    from database import db
+    from services.transfer_service import TransferService
+    format = args.format or ("packed" if args.path.endswith(".75hp") else "ndjson")
+    with open(args.path, "rb") as source:
+        days = TransferService.decode(TransferService.read_chunks(source), format)
+        try:
+            report = db.import_progress(days, args.user_id, replace=not args.skip_existing, batch_size=args.batch_size)
+        except ValueError as e:
+            print(f"Import stopped: {e}", file=sys.stderr)
+            print(json.dumps(e.report, indent=2))
+            return 1
+    print(json.dumps(report, indent=2))
+    return 1 if report["rejected"] else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="75 Hard tracker maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("ensure-indexes", help="Create the progress collection indexes").set_defaults(func=ensure_indexes)
+
+    explain_parser = subparsers.add_parser("explain", help="Print query plans for the hot-path queries")
+    explain_parser.add_argument("--date", help="Sample date to plan queries for (default: today)")
+    explain_parser.add_argument("--user-id", default=Config.DEFAULT_USER_ID, help="Sample user to plan queries for")
+    explain_parser.set_defaults(func=explain)
+
+    migrate_parser = subparsers.add_parser("migrate-user-ids", help="Backfill user_id on legacy progress documents")
+    migrate_parser.add_argument("--user-id", default=Config.DEFAULT_USER_ID, help="Owner of the legacy documents")
+    migrate_parser.add_argument("--batch-size", type=int, default=1000)
+    migrate_parser.set_defaults(func=migrate_user_ids)
+
+    schema_parser = subparsers.add_parser("migrate-schema", help="Convert progress documents to another document schema")
+    schema_parser.add_argument("--to", choices=["tasks", "compact"], help="Default: DOCUMENT_SCHEMA")
+    schema_parser.add_argument("--batch-size", type=int, default=1000)
+    schema_parser.set_defaults(func=migrate_schema)
+
+    rollup_parser = subparsers.add_parser("rollup", help="Rebuild the leaderboard and cohort rollups")
+    rollup_parser.add_argument("--batch-size", type=int, default=1000)
+    rollup_parser.add_argument("--every", type=int, metavar="SECONDS", help="Keep running and rebuild at this interval")
+    rollup_parser.set_defaults(func=rollup)
+
+    bulk_parser = subparsers.add_parser("bulk-stats", help="Print every user's stats as NDJSON")
+    bulk_parser.add_argument("--batch-days", type=int, default=Config.BULK_STATS_BATCH_DAYS)
+    bulk_parser.set_defaults(func=bulk_stats)
+
+    export_parser = subparsers.add_parser("export", help="Stream progress history as NDJSON or the packed format")
+    export_parser.add_argument("--user-id", help="Only export this user (default: every user)")
+    export_parser.add_argument("--format", choices=["ndjson", "packed"], default="ndjson")
+    export_parser.add_argument("--output", help="File to write (default: stdout)")
+    export_parser.set_defaults(func=export_progress)
+
+    import_parser = subparsers.add_parser("import", help="Import progress history from an export")
+    import_parser.add_argument("path", help="NDJSON or packed (.75hp) export")
+    import_parser.add_argument("--format", choices=["ndjson", "packed"], help="Default: from the file extension")
+    import_parser.add_argument("--user-id", help="Import every day for this user instead of the ones in the file")
+    import_parser.add_argument("--skip-existing", action="store_true", help="Keep days that already exist instead of replacing them")
+    import_parser.add_argument("--batch-size", type=int, default=Config.IMPORT_BATCH_SIZE)
+    import_parser.set_defaults(func=import_progress)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    return args.func(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
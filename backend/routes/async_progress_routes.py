@@ -0,0 +1,515 @@
+from quart import Blueprint, Response, jsonify, json, make_response, request
+from async_database import async_db
+from io import BytesIO
+import asyncio
+import logging
+import time
+from services.async_file_service import AsyncFileService
+from services.image_service import ImageService
+from services.upload_queue import UploadQueue
+from services.response_cache import create_response_cache
+from services.transfer_service import TransferService
+from routes.responses import (
+    cache_headers, cache_variant, cached_response, compress, export_headers, gallery, operations_result, pic_cache_control,
+    pic_file_name, pic_not_modified, pic_response, set_next_after, upload_accepted, user_id_from, wants_ndjson
+)
+from routes.validation import (
+    date_error, is_admin, parse_day_range, parse_leaderboard_args, parse_listing_args, parse_operations, parse_since, parse_sync_push,
+    parse_transfer_args
+)
+from config import Config
+from functools import wraps
+
+async_progress_bp = Blueprint('async_progress', __name__)
+logger = logging.getLogger('async_progress_routes')
+file_service = AsyncFileService()
+response_cache = create_response_cache()
+if response_cache:
+    async_db.add_change_listener(response_cache.invalidate)
+upload_queue = None
+serving_loop = None
+
+@async_progress_bp.before_request
+async def reject_invalid_date():
+    """Answer 400 for a <date> segment that is not a date days can have"""
+    error = date_error(request.view_args)
+    if error:
+        return jsonify({"error": error, "type": "BadRequest"}), 400
+
+async def current_user_id():
+    """User a request acts for: the X-User-Id header, then a user_id query or form field"""
+    return user_id_from(request, await request.values)
+
+async def store_progress_pic(file_name, data, content_type, user_id, date):
+    """Upload a picture and its derivatives concurrently, then record it on the day"""
+    derivatives = await asyncio.to_thread(ImageService.make_derivatives, data, file_name)
+    uploads = {file_name: (data, content_type), **derivatives}
+    results = await asyncio.gather(*(
+        file_service.upload_file(BytesIO(payload), blob_name, payload_type)
+        for blob_name, (payload, payload_type) in uploads.items()
+    ))
+    for result in results:
+        if not result.get("success"):
+            raise IOError(result.get("message", "Failed to save progress picture."))
+    await async_db.save_progress_pic(user_id, file_name, date)
+
+def process_staged_pic(paths, metadata):
+    """Upload queue worker: commit a staged picture through the serving event loop"""
+    with open(paths[metadata["file_name"]], "rb") as staged:
+        data = staged.read()
+    store = store_progress_pic(metadata["file_name"], data, metadata["content_type"], metadata["user_id"], metadata["date"])
+    asyncio.run_coroutine_threadsafe(store, serving_loop).result()
+
+@async_progress_bp.before_app_serving
+async def start_serving():
+    """Create the indexes and start the upload queue once the event loop is running"""
+    global upload_queue, serving_loop
+    serving_loop = asyncio.get_running_loop()
+    if Config.ENSURE_INDEXES:
+        await async_db.ensure_indexes()
+    if Config.WARMUP_ON_START:
+        try:
+            timings = await warmup()
+            logger.info('Warmed up in %s', timings)
+        except Exception as e:
+            logger.warning(f'Warmup failed, connecting on first request: {str(e)}')
+    if Config.ASYNC_UPLOADS:
+        upload_queue = UploadQueue(
+            Config.UPLOAD_STAGING_DIR,
+            process_staged_pic,
+            max_workers=Config.UPLOAD_WORKERS,
+            max_attempts=Config.UPLOAD_MAX_ATTEMPTS
+        )
+
+@async_progress_bp.route("/health", methods=["GET"])
+async def get_root():
+    logger.info('Health check endpoint called')
+    return jsonify({"message": "Welcome to the 75 Hard tracker API"}), 200
+
+async def warmup():
+    """Open the database pool and the storage client ahead of real traffic; returns timings in ms"""
+    start = time.perf_counter()
+    await async_db.warmup()
+    connected = time.perf_counter()
+    await asyncio.to_thread(lambda: file_service.file_service.backend)
+    ready = time.perf_counter()
+    return {"database_ms": round((connected - start) * 1000, 1), "storage_ms": round((ready - connected) * 1000, 1)}
+
+@async_progress_bp.route("/warmup", methods=["GET"])
+async def get_warmup():
+    """Target for startup probes and platform warmup requests"""
+    logger.info('Warmup endpoint called')
+    try:
+        return jsonify({"status": "ready", **(await warmup())})
+    except Exception as e:
+        logger.error(f'Warmup failed: {str(e)}')
+        return jsonify({"error": "Warmup failed.", "type": type(e).__name__, "details": str(e)}), 503
+
+async def listing_response(documents, limit, description):
+    """Return documents as an NDJSON stream or a JSON array with a next-page cursor"""
+    if wants_ndjson(request):
+        async def generate():
+            try:
+                async for document in documents:
+                    yield (json.dumps(document) + "\n").encode()
+            except Exception as e:
+                logger.error(f'Error streaming {description}: {str(e)}')
+                raise
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    items = [document async for document in documents]
+    return set_next_after(jsonify(items), items, limit)
+
+def cached(endpoint):
+    """Serve a GET view per user from the response cache, see progress_routes.cached"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            if response_cache is None or wants_ndjson(request):
+                return await view(*args, **kwargs)
+            key, entry = response_cache.lookup(await current_user_id(), endpoint, cache_variant(request))
+            if entry is not None:
+                return cached_response(Response, request, response_cache, endpoint, entry, "HIT")
+            response = await make_response(await view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = response_cache.store(key, await response.get_data(), cache_headers(response))
+            return cached_response(Response, request, response_cache, endpoint, entry, "MISS")
+        return wrapper
+    return decorator
+
+def compressed(view):
+    """Compress a view's response with the best encoding the client accepts"""
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        response = await make_response(await view(*args, **kwargs))
+        response.vary.add("Accept-Encoding")
+        if response.status_code != 200 or "Content-Encoding" in response.headers:
+            return response
+        return compress(response, await response.get_data(), request.accept_encodings)
+    return wrapper
+
+@async_progress_bp.route("/progress", methods=["GET"])
+async def get_progress():
+    logger.info('Fetching all progress')
+    try:
+        listing = parse_listing_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_progress: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        progress = async_db.find_progress(await current_user_id(), **listing)
+        return await listing_response(progress, listing["limit"], "progress")
+    except Exception as e:
+        logger.error(f'Error fetching all progress: {str(e)}')
+        return jsonify({"error": "Failed to fetch progress.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/history", methods=["GET"])
+@cached("history")
+async def get_history():
+    logger.info('Fetching progress history')
+    try:
+        listing = parse_listing_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_history: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        start_date, end_date = async_db.history_range()
+        history = async_db.find_progress(await current_user_id(), start_date=start_date, end_date=end_date, descending=True, **listing)
+        return await listing_response(history, listing["limit"], "history")
+    except Exception as e:
+        logger.error(f'Error fetching history: {str(e)}')
+        return jsonify({"error": "Failed to fetch history.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress", methods=["PATCH"])
+async def apply_operations():
+    logger.info('Applying batched progress operations')
+    try:
+        operations = parse_operations(await request.get_json(silent=True))
+    except (ValueError, TypeError) as e:
+        logger.warning(f'Invalid operations for apply_operations: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        user_id = await current_user_id()
+        stats_before = await async_db.get_stats(user_id)
+        days = await async_db.apply_operations(user_id, operations)
+        stats = await async_db.get_stats(user_id)
+        return jsonify(operations_result(days, stats_before, stats))
+    except Exception as e:
+        logger.error(f'Error applying progress operations: {str(e)}')
+        return jsonify({"error": "Failed to apply progress operations.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/sync", methods=["GET"])
+@compressed
+async def get_changes():
+    logger.info('Fetching progress changes')
+    try:
+        since = parse_since(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid sync version: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        return jsonify(await async_db.get_changes(await current_user_id(), since))
+    except Exception as e:
+        logger.error(f'Error fetching progress changes: {str(e)}')
+        return jsonify({"error": "Failed to fetch progress changes.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/sync", methods=["POST"])
+async def push_operations():
+    logger.info('Pushing queued progress operations')
+    try:
+        since, operations = parse_sync_push(await request.get_json(silent=True))
+    except (ValueError, TypeError) as e:
+        logger.warning(f'Invalid operations for push_operations: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        user_id = await current_user_id()
+        changes = await async_db.push_operations(user_id, operations, since)
+        changes["stats"] = await async_db.get_stats(user_id)
+        return jsonify(changes)
+    except Exception as e:
+        logger.error(f'Error pushing queued operations: {str(e)}')
+        return jsonify({"error": "Failed to push queued operations.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/export", methods=["GET"])
+async def export_progress():
+    logger.info('Exporting progress')
+    try:
+        transfer = parse_transfer_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for export_progress: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    days = async_db.export_progress(await current_user_id())
+    async def generate():
+        try:
+            async for chunk in TransferService.encode_async(days, transfer["format"]):
+                yield chunk
+        except Exception as e:
+            logger.error(f'Error streaming export: {str(e)}')
+            raise
+    mimetype, headers = export_headers(transfer["format"])
+    return Response(generate(), mimetype=mimetype, headers=headers)
+
+@async_progress_bp.route("/progress/import", methods=["POST"])
+async def import_progress():
+    logger.info('Importing progress')
+    try:
+        transfer = parse_transfer_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for import_progress: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        days = TransferService.decode_async(request.body, transfer["format"])
+        return jsonify(await async_db.import_progress(days, await current_user_id(), transfer["replace"]))
+    except ValueError as e:
+        logger.warning(f'Invalid import file: {str(e)}')
+        # The days before the invalid part are imported; the report says how many
+        return jsonify({"error": str(e), "type": "BadRequest", **getattr(e, "report", {})}), 400
+    except Exception as e:
+        logger.error(f'Error importing progress: {str(e)}')
+        return jsonify({"error": "Failed to import progress.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/stats", methods=["GET"])
+@cached("stats")
+async def get_stats():
+    logger.info('Fetching stats')
+    try:
+        stats = await async_db.get_stats(await current_user_id())
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f'Error fetching stats: {str(e)}')
+        return jsonify({"error": "Failed to fetch stats.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/stats/bulk", methods=["GET"])
+async def get_bulk_stats():
+    if not is_admin(request.headers):
+        logger.warning('Rejected bulk stats request without a valid admin token')
+        return jsonify({"error": "Admin token required", "type": "Forbidden"}), 403
+    logger.info('Fetching bulk stats for all users')
+    try:
+        # numpy is only needed here, so it is not loaded at startup
+        from services.bulk_stats_service import BulkStatsService
+        stats = {}
+        async for progress_by_user in async_db.get_all_progress_by_user():
+            stats.update(await asyncio.to_thread(BulkStatsService.get_stats_by_user, progress_by_user))
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f'Error fetching bulk stats: {str(e)}')
+        return jsonify({"error": "Failed to fetch bulk stats.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/stats/verify", methods=["GET"])
+async def verify_stats():
+    logger.info('Verifying materialized stats')
+    try:
+        report = await async_db.check_stats_consistency(await current_user_id())
+        return jsonify(report)
+    except Exception as e:
+        logger.error(f'Error verifying stats: {str(e)}')
+        return jsonify({"error": "Failed to verify stats.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/stats/verify", methods=["POST"])
+async def repair_stats():
+    logger.info('Verifying and repairing materialized stats')
+    try:
+        report = await async_db.repair_stats(await current_user_id())
+        return jsonify(report)
+    except Exception as e:
+        logger.error(f'Error repairing stats: {str(e)}')
+        return jsonify({"error": "Failed to repair stats.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/leaderboard", methods=["GET"])
+async def get_leaderboard():
+    logger.info('Fetching leaderboard')
+    try:
+        query = parse_leaderboard_args(request.args, async_db.LEADERBOARD_FIELDS)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_leaderboard: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        entries = await async_db.get_leaderboard(**query)
+        me = await async_db.get_leaderboard_entry(await current_user_id(), query["by"])
+        return jsonify({"by": query["by"], "entries": entries, "me": me})
+    except Exception as e:
+        logger.error(f'Error fetching leaderboard: {str(e)}')
+        return jsonify({"error": "Failed to fetch leaderboard.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/cohorts", methods=["GET"])
+async def get_cohorts():
+    logger.info('Fetching cohorts')
+    try:
+        return jsonify(await async_db.get_cohorts())
+    except Exception as e:
+        logger.error(f'Error fetching cohorts: {str(e)}')
+        return jsonify({"error": "Failed to fetch cohorts.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/cohorts/<cohort>", methods=["GET"])
+async def get_cohort(cohort):
+    logger.info('Fetching cohort: %s', cohort)
+    try:
+        start_day, end_day = parse_day_range(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_cohort: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        curves = await async_db.get_cohort(cohort, start_day, end_day)
+        if curves is None:
+            return jsonify({"error": f"Unknown cohort {cohort}", "type": "NotFound"}), 404
+        return jsonify(curves)
+    except Exception as e:
+        logger.error(f'Error fetching cohort {cohort}: {str(e)}')
+        return jsonify({"error": f"Failed to fetch cohort {cohort}.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/dashboard/<date>", methods=["GET"])
+@compressed
+@cached("dashboard")
+async def get_dashboard(date):
+    logger.info('Fetching dashboard for date: %s', date)
+    try:
+        dashboard = await async_db.get_dashboard(await current_user_id(), date)
+        return jsonify(dashboard)
+    except Exception as e:
+        logger.error(f'Error fetching dashboard for {date}: {str(e)}')
+        return jsonify({"error": f"Failed to fetch dashboard for {date}.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/<date>", methods=["GET"])
+async def get_progress_by_date(date):
+    logger.info('Fetching progress for date: %s', date)
+    try:
+        progress = await async_db.get_or_create_progress(await current_user_id(), date)
+        return jsonify(progress)
+    except Exception as e:
+        logger.error(f'Error fetching/creating progress for {date}: {str(e)}')
+        return jsonify({"error": f"Failed to fetch or create progress for {date}.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/<date>", methods=["PUT"])
+async def update_progress(date):
+    logger.info('Updating progress for date: %s', date)
+    try:
+        data = await request.get_json()
+        if not data or "tasks" not in data:
+            logger.warning('Invalid request data for update_progress')
+            return jsonify({"error": "Invalid request data", "type": "BadRequest"}), 400
+        result = await async_db.update_progress(await current_user_id(), date, data["tasks"])
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f'Error updating progress for {date}: {str(e)}')
+        return jsonify({"error": f"Failed to update progress for {date}.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/<date>/water", methods=["POST"])
+async def increment_water(date):
+    logger.info('Incrementing water for date: %s', date)
+    try:
+        data = await request.get_json()
+        amount = int(data.get("amount", 0))
+        if amount <= 0:
+            logger.warning('Amount must be positive for increment_water')
+            return jsonify({"error": "Amount must be positive", "type": "BadRequest"}), 400
+        new_value = await async_db.increment_water(await current_user_id(), date, amount)
+        if new_value is None:
+            logger.warning(f'No progress for date {date} in increment_water')
+            return jsonify({"error": "No progress for this date", "type": "NotFound"}), 404
+        return jsonify({"water": new_value})
+    except ValueError:
+        logger.error('Invalid amount value for increment_water')
+        return jsonify({"error": "Invalid amount value", "type": "BadRequest"}), 400
+    except Exception as e:
+        logger.error(f'Error incrementing water for {date}: {str(e)}')
+        return jsonify({"error": f"Failed to increment water for {date}.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/pic/<date>", methods=["POST"])
+async def progress_pic(date):
+    files = await request.files
+    if "file" not in files:
+        logger.warning('Missing file in progress_pic')
+        return jsonify({"error": "Missing file", "type": "BadRequest"}), 400
+
+    logger.info('Uploading progress picture')
+    try:
+        file = files["file"]
+        user_id = await current_user_id()
+        file_name, content_type = pic_file_name(file)
+        data = file.read()
+        if upload_queue:
+            job_id = await asyncio.to_thread(
+                upload_queue.submit,
+                {file_name: data},
+                {"file_name": file_name, "content_type": content_type, "user_id": user_id, "date": date}
+            )
+            return jsonify(upload_accepted(job_id)), 202
+        try:
+            await store_progress_pic(file_name, data, content_type, user_id, date)
+        except IOError as e:
+            return jsonify({"error": str(e), "type": "DatabaseError"}), 500
+        return jsonify({"message": "Progress picture uploaded successfully"})
+    except Exception as e:
+        logger.error(f'Error uploading progress picture: {str(e)}')
+        return jsonify({"error": "Failed to upload progress picture.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/pic/uploads/<job_id>", methods=["GET"])
+async def get_upload_status(job_id):
+    logger.info('Fetching status of upload job %s', job_id)
+    status = upload_queue.status(job_id) if upload_queue else None
+    if status is None:
+        return jsonify({"error": "Unknown upload job", "type": "NotFound"}), 404
+    return jsonify(status)
+
+@async_progress_bp.route("/progress/pic/<date>", methods=["GET"])
+async def get_progress_pic_by_date(date):
+    user_id = await current_user_id()
+    size = request.args.get("size", "full")
+    if size not in ImageService.SIZES:
+        logger.warning(f'Invalid size {size} in get_progress_pic_by_date')
+        return jsonify({"error": f"size must be one of {', '.join(ImageService.SIZES)}", "type": "BadRequest"}), 400
+
+    file_name = await async_db.get_progress_pic(user_id, date)
+    if not file_name:
+        logger.warning(f'No progress picture found for user {user_id} on {date}')
+        return '', 204
+
+    cache_control = pic_cache_control(request, file_name)
+    blob_name = ImageService.derivative_name(file_name, size)
+    not_modified = pic_not_modified(Response, request, blob_name, file_name, cache_control)
+    if not_modified:
+        return not_modified
+
+    try:
+        opened = await file_service.open_file(blob_name)
+        if opened is None and blob_name != file_name:
+            # Pictures uploaded before derivatives existed only have the original
+            blob_name = file_name
+            opened = await file_service.open_file(blob_name)
+        if opened is None:
+            logger.warning(f'No progress picture found for user {user_id} on {date}')
+            return '', 204
+        chunks, content_type, content_length = opened
+        response = Response(chunks, mimetype=content_type or ImageService.content_type(blob_name))
+        return pic_response(response, blob_name, content_length, cache_control)
+    except Exception as e:
+        logger.error(f'Error fetching progress picture for user {user_id} on {date}: {str(e)}')
+        return jsonify({"error": "Failed to fetch progress picture.", "type": type(e).__name__, "details": str(e)}), 500
+
+@async_progress_bp.route("/progress/pics/cache", methods=["GET"])
+async def get_blob_cache_stats():
+    logger.info('Fetching blob cache stats')
+    stats = file_service.cache_stats()
+    if stats is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **stats})
+
+@async_progress_bp.route("/progress/cache", methods=["GET"])
+async def get_response_cache_stats():
+    logger.info('Fetching response cache stats')
+    if response_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **response_cache.stats()})
+
+@async_progress_bp.route("/progress/pics", methods=["GET"])
+@cached("pics")
+async def get_all_progress_pics():
+    logger.info('Fetching all progress pictures for gallery')
+    try:
+        pics = await async_db.get_all_progress_pics(await current_user_id())
+        return jsonify(gallery(pics))
+    except Exception as e:
+        logger.error(f'Error fetching all progress pictures: {str(e)}')
+        return jsonify({"error": "Failed to fetch progress pictures.", "type": type(e).__name__, "details": str(e)}), 500
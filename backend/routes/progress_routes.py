@@ -1,76 +1,377 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, Response, jsonify, json, make_response, request, send_file, stream_with_context
 from database import db
-from services.stats_service import StatsService
 from io import BytesIO
-import base64
 import logging
+import time
 from services.file_service import FileService
-from datetime import datetime
-from uuid import uuid4
+from services.image_service import ImageService
+from services.upload_queue import UploadQueue
+from services.response_cache import create_response_cache
+from services.transfer_service import TransferService
+from routes.responses import (
+    cache_headers, cache_variant, cached_response, compress, export_headers, gallery, operations_result, pic_cache_control,
+    pic_file_name, pic_not_modified, pic_response, set_next_after, upload_accepted, user_id_from, wants_ndjson
+)
+from routes.validation import (
+    date_error, is_admin, parse_day_range, parse_leaderboard_args, parse_listing_args, parse_operations, parse_since, parse_sync_push,
+    parse_transfer_args
+)
+from config import Config
+from functools import wraps
 
 progress_bp = Blueprint('progress', __name__)
 logger = logging.getLogger('progress_routes')
 file_service = FileService()
+response_cache = create_response_cache()
+if response_cache:
+    db.add_change_listener(response_cache.invalidate)
+
+@progress_bp.before_request
+def reject_invalid_date():
+    """Answer 400 for a <date> segment that is not a date days can have"""
+    error = date_error(request.view_args)
+    if error:
+        return jsonify({"error": error, "type": "BadRequest"}), 400
+
+def current_user_id():
+    """User a request acts for: the X-User-Id header, then a user_id query or form field"""
+    return user_id_from(request, request.values)
+
+def store_progress_pic(file_name, data, content_type, user_id, date):
+    """Upload a picture and its derivatives, then record it on the day"""
+    uploads = {file_name: (data, content_type), **ImageService.make_derivatives(data, file_name)}
+    for blob_name, (payload, payload_type) in uploads.items():
+        result = file_service.upload_file(BytesIO(payload), blob_name, payload_type)
+        if not result.get("success"):
+            raise IOError(result.get("message", "Failed to save progress picture."))
+    db.save_progress_pic(user_id, file_name, date)
+
+def process_staged_pic(paths, metadata):
+    """Upload queue worker: commit a staged picture to storage and the database"""
+    with open(paths[metadata["file_name"]], "rb") as staged:
+        data = staged.read()
+    store_progress_pic(metadata["file_name"], data, metadata["content_type"], metadata["user_id"], metadata["date"])
+
+upload_queue = UploadQueue(
+    Config.UPLOAD_STAGING_DIR,
+    process_staged_pic,
+    max_workers=Config.UPLOAD_WORKERS,
+    max_attempts=Config.UPLOAD_MAX_ATTEMPTS
+) if Config.ASYNC_UPLOADS else None
 
 @progress_bp.route("/health", methods=["GET"])
 def get_root():
     logger.info('Health check endpoint called')
     return jsonify({"message": "Welcome to the 75 Hard tracker API"}), 200
 
+def warmup():
+    """Open the database pool and the storage client ahead of real traffic; returns timings in ms"""
+    start = time.perf_counter()
+    db.warmup()
+    connected = time.perf_counter()
+    file_service.backend
+    ready = time.perf_counter()
+    return {"database_ms": round((connected - start) * 1000, 1), "storage_ms": round((ready - connected) * 1000, 1)}
+
+@progress_bp.route("/warmup", methods=["GET"])
+def get_warmup():
+    """Target for startup probes and platform warmup requests"""
+    logger.info('Warmup endpoint called')
+    try:
+        return jsonify({"status": "ready", **warmup()})
+    except Exception as e:
+        logger.error(f'Warmup failed: {str(e)}')
+        return jsonify({"error": "Warmup failed.", "type": type(e).__name__, "details": str(e)}), 503
+
+def listing_response(documents, limit, description):
+    """Return documents as an NDJSON stream or a JSON array with a next-page cursor"""
+    if wants_ndjson(request):
+        def generate():
+            try:
+                for document in documents:
+                    yield json.dumps(document) + "\n"
+            except Exception as e:
+                logger.error(f'Error streaming {description}: {str(e)}')
+                raise
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    items = list(documents)
+    return set_next_after(jsonify(items), items, limit)
+
+def cached(endpoint):
+    """Serve a GET view per user from the response cache, answering If-None-Match with 304.
+
+    Entries are invalidated by the Database change listener, so the view only
+    runs on the first request after a write (or after the TTL expires).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if response_cache is None or wants_ndjson(request):
+                return view(*args, **kwargs)
+            key, entry = response_cache.lookup(current_user_id(), endpoint, cache_variant(request))
+            if entry is not None:
+                return cached_response(Response, request, response_cache, endpoint, entry, "HIT")
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            entry = response_cache.store(key, response.get_data(), cache_headers(response))
+            return cached_response(Response, request, response_cache, endpoint, entry, "MISS")
+        return wrapper
+    return decorator
+
+def compressed(view):
+    """Compress a view's response with the best encoding the client accepts"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        response.vary.add("Accept-Encoding")
+        if response.status_code != 200 or response.is_streamed or "Content-Encoding" in response.headers:
+            return response
+        return compress(response, response.get_data(), request.accept_encodings)
+    return wrapper
+
 @progress_bp.route("/progress", methods=["GET"])
 def get_progress():
     logger.info('Fetching all progress')
     try:
-        progress = db.get_all_progress()
-        return jsonify(progress)
+        listing = parse_listing_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_progress: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        progress = db.find_progress(current_user_id(), **listing)
+        return listing_response(progress, listing["limit"], "progress")
     except Exception as e:
         logger.error(f'Error fetching all progress: {str(e)}')
         return jsonify({"error": "Failed to fetch progress.", "type": type(e).__name__, "details": str(e)}), 500
 
 @progress_bp.route("/progress/history", methods=["GET"])
+@cached("history")
 def get_history():
     logger.info('Fetching progress history')
     try:
-        history = db.get_history()
-        return jsonify(history)
+        listing = parse_listing_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_history: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        start_date, end_date = db.history_range()
+        history = db.find_progress(current_user_id(), start_date=start_date, end_date=end_date, descending=True, **listing)
+        return listing_response(history, listing["limit"], "history")
     except Exception as e:
         logger.error(f'Error fetching history: {str(e)}')
         return jsonify({"error": "Failed to fetch history.", "type": type(e).__name__, "details": str(e)}), 500
 
+@progress_bp.route("/progress", methods=["PATCH"])
+def apply_operations():
+    logger.info('Applying batched progress operations')
+    try:
+        operations = parse_operations(request.get_json(silent=True))
+    except (ValueError, TypeError) as e:
+        logger.warning(f'Invalid operations for apply_operations: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        user_id = current_user_id()
+        stats_before = db.get_stats(user_id)
+        days = db.apply_operations(user_id, operations)
+        stats = db.get_stats(user_id)
+        return jsonify(operations_result(days, stats_before, stats))
+    except Exception as e:
+        logger.error(f'Error applying progress operations: {str(e)}')
+        return jsonify({"error": "Failed to apply progress operations.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/progress/sync", methods=["GET"])
+@compressed
+def get_changes():
+    logger.info('Fetching progress changes')
+    try:
+        since = parse_since(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid sync version: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        return jsonify(db.get_changes(current_user_id(), since))
+    except Exception as e:
+        logger.error(f'Error fetching progress changes: {str(e)}')
+        return jsonify({"error": "Failed to fetch progress changes.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/progress/sync", methods=["POST"])
+def push_operations():
+    logger.info('Pushing queued progress operations')
+    try:
+        since, operations = parse_sync_push(request.get_json(silent=True))
+    except (ValueError, TypeError) as e:
+        logger.warning(f'Invalid operations for push_operations: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        user_id = current_user_id()
+        changes = db.push_operations(user_id, operations, since)
+        changes["stats"] = db.get_stats(user_id)
+        return jsonify(changes)
+    except Exception as e:
+        logger.error(f'Error pushing queued operations: {str(e)}')
+        return jsonify({"error": "Failed to push queued operations.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/progress/export", methods=["GET"])
+def export_progress():
+    logger.info('Exporting progress')
+    try:
+        transfer = parse_transfer_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for export_progress: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    days = db.export_progress(current_user_id())
+    def generate():
+        try:
+            yield from TransferService.encode(days, transfer["format"])
+        except Exception as e:
+            logger.error(f'Error streaming export: {str(e)}')
+            raise
+    mimetype, headers = export_headers(transfer["format"])
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
+
+@progress_bp.route("/progress/import", methods=["POST"])
+def import_progress():
+    logger.info('Importing progress')
+    try:
+        transfer = parse_transfer_args(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for import_progress: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        # Decoded while it is read, so memory stays at one chunk and one batch
+        days = TransferService.decode(TransferService.read_chunks(request.stream), transfer["format"])
+        return jsonify(db.import_progress(days, current_user_id(), transfer["replace"]))
+    except ValueError as e:
+        logger.warning(f'Invalid import file: {str(e)}')
+        # The days before the invalid part are imported; the report says how many
+        return jsonify({"error": str(e), "type": "BadRequest", **getattr(e, "report", {})}), 400
+    except Exception as e:
+        logger.error(f'Error importing progress: {str(e)}')
+        return jsonify({"error": "Failed to import progress.", "type": type(e).__name__, "details": str(e)}), 500
+
 @progress_bp.route("/progress/stats", methods=["GET"])
+@cached("stats")
 def get_stats():
     logger.info('Fetching stats')
     try:
-        all_progress = db.get_all_progress()
-        stats = StatsService.get_comprehensive_stats(all_progress)
+        stats = db.get_stats(current_user_id())
         return jsonify(stats)
     except Exception as e:
         logger.error(f'Error fetching stats: {str(e)}')
         return jsonify({"error": "Failed to fetch stats.", "type": type(e).__name__, "details": str(e)}), 500
 
+@progress_bp.route("/progress/stats/bulk", methods=["GET"])
+def get_bulk_stats():
+    if not is_admin(request.headers):
+        logger.warning('Rejected bulk stats request without a valid admin token')
+        return jsonify({"error": "Admin token required", "type": "Forbidden"}), 403
+    logger.info('Fetching bulk stats for all users')
+    try:
+        # numpy is only needed here, so it is not loaded at startup
+        from services.bulk_stats_service import BulkStatsService
+        stats = {}
+        for progress_by_user in db.get_all_progress_by_user():
+            stats.update(BulkStatsService.get_stats_by_user(progress_by_user))
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f'Error fetching bulk stats: {str(e)}')
+        return jsonify({"error": "Failed to fetch bulk stats.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/progress/stats/verify", methods=["GET"])
+def verify_stats():
+    logger.info('Verifying materialized stats')
+    try:
+        report = db.check_stats_consistency(current_user_id())
+        return jsonify(report)
+    except Exception as e:
+        logger.error(f'Error verifying stats: {str(e)}')
+        return jsonify({"error": "Failed to verify stats.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/progress/stats/verify", methods=["POST"])
+def repair_stats():
+    logger.info('Verifying and repairing materialized stats')
+    try:
+        report = db.repair_stats(current_user_id())
+        return jsonify(report)
+    except Exception as e:
+        logger.error(f'Error repairing stats: {str(e)}')
+        return jsonify({"error": "Failed to repair stats.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/leaderboard", methods=["GET"])
+def get_leaderboard():
+    logger.info('Fetching leaderboard')
+    try:
+        query = parse_leaderboard_args(request.args, db.LEADERBOARD_FIELDS)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_leaderboard: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        entries = db.get_leaderboard(**query)
+        me = db.get_leaderboard_entry(current_user_id(), query["by"])
+        return jsonify({"by": query["by"], "entries": entries, "me": me})
+    except Exception as e:
+        logger.error(f'Error fetching leaderboard: {str(e)}')
+        return jsonify({"error": "Failed to fetch leaderboard.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/cohorts", methods=["GET"])
+def get_cohorts():
+    logger.info('Fetching cohorts')
+    try:
+        return jsonify(db.get_cohorts())
+    except Exception as e:
+        logger.error(f'Error fetching cohorts: {str(e)}')
+        return jsonify({"error": "Failed to fetch cohorts.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/cohorts/<cohort>", methods=["GET"])
+def get_cohort(cohort):
+    logger.info('Fetching cohort: %s', cohort)
+    try:
+        start_day, end_day = parse_day_range(request.args)
+    except ValueError as e:
+        logger.warning(f'Invalid query for get_cohort: {str(e)}')
+        return jsonify({"error": str(e), "type": "BadRequest"}), 400
+    try:
+        curves = db.get_cohort(cohort, start_day, end_day)
+        if curves is None:
+            return jsonify({"error": f"Unknown cohort {cohort}", "type": "NotFound"}), 404
+        return jsonify(curves)
+    except Exception as e:
+        logger.error(f'Error fetching cohort {cohort}: {str(e)}')
+        return jsonify({"error": f"Failed to fetch cohort {cohort}.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/progress/dashboard/<date>", methods=["GET"])
+@compressed
+@cached("dashboard")
+def get_dashboard(date):
+    logger.info('Fetching dashboard for date: %s', date)
+    try:
+        dashboard = db.get_dashboard(current_user_id(), date)
+        return jsonify(dashboard)
+    except Exception as e:
+        logger.error(f'Error fetching dashboard for {date}: {str(e)}')
+        return jsonify({"error": f"Failed to fetch dashboard for {date}.", "type": type(e).__name__, "details": str(e)}), 500
+
 @progress_bp.route("/progress/<date>", methods=["GET"])
 def get_progress_by_date(date):
-    logger.info(f'Fetching progress for date: {date}')
+    logger.info('Fetching progress for date: %s', date)
     try:
-        progress = db.get_progress_by_date(date)
-        if progress:
-            return jsonify(progress)
-        else:
-            new_progress = db.create_progress_for_date(date)
-            return jsonify(new_progress)
+        progress = db.get_or_create_progress(current_user_id(), date)
+        return jsonify(progress)
     except Exception as e:
         logger.error(f'Error fetching/creating progress for {date}: {str(e)}')
         return jsonify({"error": f"Failed to fetch or create progress for {date}.", "type": type(e).__name__, "details": str(e)}), 500
 
 @progress_bp.route("/progress/<date>", methods=["PUT"])
 def update_progress(date):
-    logger.info(f'Updating progress for date: {date}')
+    logger.info('Updating progress for date: %s', date)
     try:
         data = request.get_json()
         if not data or "tasks" not in data:
             logger.warning('Invalid request data for update_progress')
             return jsonify({"error": "Invalid request data", "type": "BadRequest"}), 400
-        result = db.update_progress(date, data["tasks"])
+        result = db.update_progress(current_user_id(), date, data["tasks"])
         return jsonify(result)
     except Exception as e:
         logger.error(f'Error updating progress for {date}: {str(e)}')
@@ -78,14 +379,14 @@ def update_progress(date):
 
 @progress_bp.route("/progress/<date>/water", methods=["POST"])
 def increment_water(date):
-    logger.info(f'Incrementing water for date: {date}')
+    logger.info('Incrementing water for date: %s', date)
     try:
         data = request.get_json()
         amount = int(data.get("amount", 0))
         if amount <= 0:
             logger.warning('Amount must be positive for increment_water')
             return jsonify({"error": "Amount must be positive", "type": "BadRequest"}), 400
-        new_value = db.increment_water(date, amount)
+        new_value = db.increment_water(current_user_id(), date, amount)
         if new_value is None:
             logger.warning(f'No progress for date {date} in increment_water')
             return jsonify({"error": "No progress for this date", "type": "NotFound"}), 404
@@ -99,66 +400,101 @@ def increment_water(date):
 
 @progress_bp.route("/progress/pic/<date>", methods=["POST"])
 def progress_pic(date):
-    if "file" in request.files and "user_id" in request.form:
-        logger.info('Uploading progress picture')
+    if "file" not in request.files:
+        logger.warning('Missing file in progress_pic')
+        return jsonify({"error": "Missing file", "type": "BadRequest"}), 400
+
+    logger.info('Uploading progress picture')
+    try:
+        file = request.files["file"]
+        user_id = current_user_id()
+        file_name, content_type = pic_file_name(file)
+        data = file.read()
+        if upload_queue:
+            job_id = upload_queue.submit(
+                {file_name: data},
+                {"file_name": file_name, "content_type": content_type, "user_id": user_id, "date": date}
+            )
+            return jsonify(upload_accepted(job_id)), 202
         try:
-            file = request.files["file"]
-            user_id = request.form["user_id"]
-            file_ext = file.filename.split(".")[-1]
-            file_name = f"{uuid4()}.{file_ext}"
-            result = file_service.upload_file(file, file_name)
-            if not result.get("success"):
-                return jsonify({"error": result.get("message", "Failed to save progress picture."), "type": "DatabaseError"}), 500
-            db.save_progress_pic(user_id, file_name, date)
-            return jsonify({"message": "Progress picture uploaded successfully"})
-        except Exception as e:
-            logger.error(f'Error uploading progress picture: {str(e)}')
-            return jsonify({"error": f"Failed to upload progress picture.", "type": type(e).__name__, "details": str(e)}), 500
-        
-    else:
-        logger.warning('Missing user_id in progress_pic')
-        return jsonify({"error": "Missing user_id", "type": "BadRequest"}), 400
+            store_progress_pic(file_name, data, content_type, user_id, date)
+        except IOError as e:
+            return jsonify({"error": str(e), "type": "DatabaseError"}), 500
+        return jsonify({"message": "Progress picture uploaded successfully"})
+    except Exception as e:
+        logger.error(f'Error uploading progress picture: {str(e)}')
+        return jsonify({"error": "Failed to upload progress picture.", "type": type(e).__name__, "details": str(e)}), 500
+
+@progress_bp.route("/progress/pic/uploads/<job_id>", methods=["GET"])
+def get_upload_status(job_id):
+    logger.info('Fetching status of upload job %s', job_id)
+    status = upload_queue.status(job_id) if upload_queue else None
+    if status is None:
+        return jsonify({"error": "Unknown upload job", "type": "NotFound"}), 404
+    return jsonify(status)
 
 @progress_bp.route("/progress/pic/<date>", methods=["GET"])
 def get_progress_pic_by_date(date):
-    user_id = request.args.get("user_id")
-    if not user_id:
-        logger.warning('Missing user_id in get_progress_pic_by_date')
-        return jsonify({"error": "Missing user_id", "type": "BadRequest"}), 400
-    
-    file_name = db.get_progress_pic(date)
+    user_id = current_user_id()
+    size = request.args.get("size", "full")
+    if size not in ImageService.SIZES:
+        logger.warning(f'Invalid size {size} in get_progress_pic_by_date')
+        return jsonify({"error": f"size must be one of {', '.join(ImageService.SIZES)}", "type": "BadRequest"}), 400
+
+    file_name = db.get_progress_pic(user_id, date)
     if not file_name:
         logger.warning(f'No progress picture found for user {user_id} on {date}')
         return '', 204
+
+    cache_control = pic_cache_control(request, file_name)
+    blob_name = ImageService.derivative_name(file_name, size)
+    not_modified = pic_not_modified(Response, request, blob_name, file_name, cache_control)
+    if not_modified:
+        return not_modified
+
     try:
-        image_bytes = file_service.get_file(file_name)
-        if not image_bytes:
+        opened = file_service.open_file(blob_name)
+        if opened is None and blob_name != file_name:
+            # Pictures uploaded before derivatives existed only have the original
+            blob_name = file_name
+            opened = file_service.open_file(blob_name)
+        if opened is None:
             logger.warning(f'No progress picture found for user {user_id} on {date}')
             return '', 204
-        return send_file(BytesIO(image_bytes), mimetype="image/jpeg", download_name=file_name)
+        body, content_type, content_length = opened
+        mimetype = content_type or ImageService.content_type(blob_name)
+        if hasattr(body, "fileno"):
+            # Cached on local disk: let the WSGI server send the file directly
+            response = send_file(body, mimetype=mimetype, conditional=False, etag=False, max_age=None)
+        else:
+            response = Response(stream_with_context(body), mimetype=mimetype)
+        return pic_response(response, blob_name, content_length, cache_control)
     except Exception as e:
         logger.error(f'Error fetching progress picture for user {user_id} on {date}: {str(e)}')
-        return jsonify({"error": f"Failed to fetch progress picture.", "type": type(e).__name__, "details": str(e)}), 500
+        return jsonify({"error": "Failed to fetch progress picture.", "type": type(e).__name__, "details": str(e)}), 500
 
+@progress_bp.route("/progress/pics/cache", methods=["GET"])
+def get_blob_cache_stats():
+    logger.info('Fetching blob cache stats')
+    stats = file_service.cache_stats()
+    if stats is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **stats})
+
+@progress_bp.route("/progress/cache", methods=["GET"])
+def get_response_cache_stats():
+    logger.info('Fetching response cache stats')
+    if response_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **response_cache.stats()})
 
 @progress_bp.route("/progress/pics", methods=["GET"])
+@cached("pics")
 def get_all_progress_pics():
     logger.info('Fetching all progress pictures for gallery')
     try:
-        pics = db.get_all_progress_pics()
-        result = []
-        for item in pics:
-            if item.get("progress_pic"):
-                user_id = item.get("user_id")
-                if user_id:
-                    image_url = f"/api/progress/pic/{item['date']}?user_id={user_id}"
-                else:
-                    image_url = f"/api/progress/pic/{item['date']}"
-                result.append({
-                    "date": item["date"],
-                    "image_url": image_url
-                })
-        return jsonify(result)
+        pics = db.get_all_progress_pics(current_user_id())
+        return jsonify(gallery(pics))
     except Exception as e:
         logger.error(f'Error fetching all progress pictures: {str(e)}')
-        return jsonify({"error": "Failed to fetch progress pictures.", "type": type(e).__name__, "details": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to fetch progress pictures.", "type": type(e).__name__, "details": str(e)}), 500
@@ -0,0 +1,133 @@
+from config import Config
+from datetime import datetime
+from services.compression_service import CompressionService
+from services.image_service import ImageService
+from services.stats_service import StatsService
+from services.transfer_service import TransferService
+from urllib.parse import urlencode
+from uuid import uuid4
+from werkzeug.utils import secure_filename
+
+# Response shaping shared by progress_routes (Flask) and async_progress_routes
+# (Quart). Both request and response objects are werkzeug-compatible, so the
+# blueprints only differ in how they await the database, storage and body.
+
+# Headers replayed from cached responses; ETag and Cache-Control are set per request
+CACHED_HEADERS = ("Content-Type", "X-Next-After")
+
+def user_id_from(request, values):
+    """User a request acts for: the X-User-Id header, then a user_id query or form field"""
+    return request.headers.get("X-User-Id") or values.get("user_id") or Config.DEFAULT_USER_ID
+
+def wants_ndjson(request):
+    """Whether the client asked for a newline-delimited JSON stream"""
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+def set_next_after(response, items, limit):
+    """Send the next ``after`` value in X-Next-After when a listing page is full.
+
+    NDJSON clients use the date of the last line instead.
+    """
+    if limit and len(items) == limit:
+        response.headers["X-Next-After"] = items[-1]["date"]
+    return response
+
+def cache_variant(request):
+    """Part of a cache key that varies within an endpoint: today's date, the path and the query string"""
+    return f"{datetime.now().date().isoformat()}:{request.full_path}"
+
+def cache_headers(response):
+    """Headers of a fresh response to store with its cache entry"""
+    return {name: value for name, value in response.headers.items() if name in CACHED_HEADERS}
+
+def cached_response(response_class, request, response_cache, endpoint, entry, status):
+    """Build the response for a cache entry, or 304 if the client already has it"""
+    if request.if_none_match.contains_weak(entry["etag"]):
+        response_cache.record_not_modified(endpoint)
+        response = response_class("", status=304)
+    else:
+        response = response_class(entry["body"], headers=entry["headers"])
+    response.set_etag(entry["etag"])
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.headers["X-Cache"] = status
+    return response
+
+def compress(response, data, accept_encodings):
+    """Replace a response body with ``data`` compressed in the best encoding the client accepts"""
+    encoding = CompressionService.negotiate(accept_encodings)
+    if encoding is None or len(data) < Config.COMPRESSION_MIN_BYTES:
+        return response
+    response.set_data(CompressionService.compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, _ = response.get_etag()
+    if etag:
+        # The compressed bytes differ from the identity representation
+        response.set_etag(etag, weak=True)
+    return response
+
+def operations_result(days, stats_before, stats):
+    """Body of a PATCH /progress response"""
+    return {"days": days, "stats": stats, "stats_delta": StatsService.stats_delta(stats_before, stats)}
+
+def export_headers(format):
+    """Mimetype and headers of an export download"""
+    encoder = TransferService.FORMATS[format][0]
+    return encoder.content_type, {"Content-Disposition": f'attachment; filename="progress.{encoder.extension}"'}
+
+def pic_file_name(file):
+    """Blob name and content type to store an uploaded picture under"""
+    file_ext = secure_filename(file.filename.split(".")[-1]) or "jpg"
+    file_name = f"{uuid4()}.{file_ext}"
+    content_type = file.mimetype if file.mimetype != "application/octet-stream" else ImageService.content_type(file_name)
+    return file_name, content_type
+
+def upload_accepted(job_id):
+    """Body of a 202 response to a queued picture upload"""
+    return {
+        "message": "Progress picture accepted",
+        "job_id": job_id,
+        "status_url": f"/api/progress/pic/uploads/{job_id}"
+    }
+
+def pic_cache_control(request, file_name):
+    """Cache-Control of a picture response.
+
+    Blobs are uuid-named and never rewritten, but the date URL moves to a new
+    blob on re-upload, so only URLs pinned to the blob name with ?v= are immutable.
+    """
+    if request.args.get("v") == file_name:
+        return f"public, max-age={Config.IMAGE_CACHE_MAX_AGE}, immutable"
+    return "no-cache"
+
+def pic_not_modified(response_class, request, blob_name, file_name, cache_control):
+    """304 response if the client already has the picture, else None"""
+    if not (request.if_none_match.contains(blob_name) or request.if_none_match.contains(file_name)):
+        return None
+    response = response_class("", status=304)
+    response.headers["Cache-Control"] = cache_control
+    response.set_etag(blob_name)
+    return response
+
+def pic_response(response, blob_name, content_length, cache_control):
+    """Add the caching and disposition headers to a picture response"""
+    if content_length is not None:
+        response.content_length = content_length
+    response.set_etag(blob_name)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Content-Disposition"] = f"inline; filename={blob_name}"
+    return response
+
+def gallery(pics):
+    """Gallery items with thumbnail URLs for the days that have a picture"""
+    result = []
+    for item in pics:
+        if item.get("progress_pic"):
+            # Image elements cannot send X-User-Id, so the user goes in the URL
+            query = urlencode({"user_id": item["user_id"], "size": "thumb", "v": item["progress_pic"]})
+            result.append({
+                "date": item["date"],
+                "image_url": f"/api/progress/pic/{item['date']}?{query}"
+            })
+    return result
@@ -0,0 +1,131 @@
+from config import Config
+from services.transfer_service import TransferService
+import hmac
+
+def is_admin(headers):
+    """Whether the request carries Config.ADMIN_TOKEN; always False while no token is configured"""
+    token = headers.get("X-Admin-Token", "")
+    return bool(Config.ADMIN_TOKEN) and hmac.compare_digest(token.encode(), Config.ADMIN_TOKEN.encode())
+
+def date_error(view_args):
+    """Error message for a ``date`` URL segment that is not a date days can have, else None"""
+    if not view_args or "date" not in view_args:
+        return None
+    try:
+        TransferService.parse_date(view_args["date"])
+    except ValueError as e:
+        return str(e)
+    return None
+
+def parse_listing_args(args):
+    """Parse the pagination and projection query parameters, raising ValueError on bad input"""
+    limit = args.get("limit", type=int)
+    if "limit" in args and (limit is None or not 0 < limit <= Config.MAX_PAGE_SIZE):
+        raise ValueError(f"limit must be between 1 and {Config.MAX_PAGE_SIZE}")
+    fields = [field for field in args.get("fields", "").split(",") if field]
+    allowed = {"date", "tasks"} | {f"tasks.{task}" for task in Config.DEFAULT_TASKS}
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {"after": args.get("after"), "limit": limit, "fields": fields}
+
+def parse_operations(data, queued=False):
+    """Validate a batch of task operations, raising ValueError on bad input.
+
+    ``queued`` operations come from an offline client: each may carry an
+    ``id`` and set operations need the client time ``at`` they were made at.
+    Toggles are rejected there because replaying one depends on the state.
+    """
+    operations = data.get("operations") if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+    if len(operations) > Config.MAX_BATCH_OPERATIONS:
+        raise ValueError(f"At most {Config.MAX_BATCH_OPERATIONS} operations are allowed per request")
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or not isinstance(operation.get("date"), str):
+            raise ValueError("Every operation needs a date")
+        TransferService.parse_date(operation["date"])
+        op = operation.get("op")
+        extra = parse_queued_fields(operation, op) if queued else {}
+        if op == "add_water":
+            amount = int(operation.get("amount", 0))
+            if amount <= 0:
+                raise ValueError("Amount must be positive")
+            parsed.append({"date": operation["date"], "op": op, "amount": amount, **extra})
+            continue
+        task = operation.get("task")
+        if op not in ("toggle", "set"):
+            raise ValueError(f"Unknown operation: {op}")
+        if task not in Config.DEFAULT_TASKS:
+            raise ValueError(f"Unknown task: {task}")
+        if op == "toggle":
+            if queued:
+                raise ValueError("Queued operations must set tasks instead of toggling them")
+            if task == "drink_gallon_water":
+                raise ValueError("Water cannot be toggled")
+            parsed.append({"date": operation["date"], "op": op, "task": task})
+            continue
+        if "value" not in operation:
+            raise ValueError("set operations need a value")
+        value = int(operation["value"]) if task == "drink_gallon_water" else bool(operation["value"])
+        if value < 0:
+            raise ValueError("Water cannot be negative")
+        parsed.append({"date": operation["date"], "op": op, "task": task, "value": value, **extra})
+    return parsed
+
+def parse_queued_fields(operation, op):
+    """Validate the ``id`` and ``at`` of a queued operation"""
+    extra = {}
+    if "id" in operation:
+        if not isinstance(operation["id"], str) or not 0 < len(operation["id"]) <= 64:
+            raise ValueError("Operation ids must be strings of 1 to 64 characters")
+        extra["id"] = operation["id"]
+    if op == "set":
+        at = operation.get("at")
+        if not isinstance(at, int) or isinstance(at, bool) or at < 0:
+            raise ValueError("Queued set operations need the time they were made at, in ms since the epoch")
+        extra["at"] = at
+    return extra
+
+def parse_sync_push(data):
+    """Validate a push of queued operations, returning ``(since, operations)``"""
+    since = data.get("since", 0) if isinstance(data, dict) else 0
+    if not isinstance(since, int) or isinstance(since, bool) or since < 0:
+        raise ValueError("since must be a version number")
+    return since, parse_operations(data, queued=True)
+
+def parse_since(args):
+    """Parse the version a sync starts from, raising ValueError on bad input"""
+    since = args.get("since", 0, type=int)
+    if since is None or since < 0:
+        raise ValueError("since must be a version number")
+    return since
+
+def parse_leaderboard_args(args, fields):
+    """Parse the leaderboard ordering and size, raising ValueError on bad input"""
+    by = args.get("by", fields[0])
+    if by not in fields:
+        raise ValueError(f"by must be one of {', '.join(fields)}")
+    limit = args.get("limit", 10, type=int)
+    if limit is None or not 0 < limit <= Config.MAX_LEADERBOARD_SIZE:
+        raise ValueError(f"limit must be between 1 and {Config.MAX_LEADERBOARD_SIZE}")
+    return {"by": by, "limit": limit}
+
+def parse_day_range(args):
+    """Parse the start/end challenge days of a cohort query, raising ValueError on bad input"""
+    start_day = args.get("start", 1, type=int)
+    end_day = args.get("end", Config.CHALLENGE_DAYS, type=int)
+    if start_day is None or end_day is None or not 1 <= start_day <= end_day <= Config.CHALLENGE_DAYS:
+        raise ValueError(f"start and end must satisfy 1 <= start <= end <= {Config.CHALLENGE_DAYS}")
+    return start_day, end_day
+
+def parse_transfer_args(args):
+    """Parse the format of an export or import and the conflict mode of an import, raising ValueError on bad input"""
+    format = args.get("format", "ndjson")
+    if format not in TransferService.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(TransferService.FORMATS)}")
+    on_conflict = args.get("on_conflict", "replace")
+    if on_conflict not in ("replace", "skip"):
+        raise ValueError("on_conflict must be replace or skip")
+    return {"format": format, "replace": on_conflict == "replace"}
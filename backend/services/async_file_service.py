@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from config import Config
+from services.file_service import FileService
+
+class AsyncFileService:
+    """Asyncio front for FileService used by the ASGI app.
+
+    The object store clients are blocking, so every call runs on a worker
+    thread and streamed bodies are read one chunk at a time off the event loop.
+    """
+    logger = logging.getLogger('AsyncFileService')
+
+    def __init__(self, file_service=None):
+        self.file_service = file_service or FileService()
+
+    async def upload_file(self, file, file_name, content_type=None):
+        return await asyncio.to_thread(self.file_service.upload_file, file, file_name, content_type)
+
+    async def get_file(self, file_name) -> bytes:
+        return await asyncio.to_thread(self.file_service.get_file, file_name)
+
+    async def open_file(self, file_name):
+        """Return ``(chunks, content_type, size)`` with an async chunk iterator, or None if the blob is missing"""
+        opened = await asyncio.to_thread(self.file_service.open_file, file_name)
+        if opened is None:
+            return None
+        body, content_type, size = opened
+        return self._iterate(body), content_type, size
+
+    @staticmethod
+    async def _iterate(body):
+        """Read a file or a blocking chunk iterator on worker threads"""
+        if hasattr(body, "read"):
+            with body:
+                while chunk := await asyncio.to_thread(body.read, Config.STREAM_CHUNK_SIZE):
+                    yield chunk
+            return
+        chunks = iter(body)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            yield chunk
+
+    def cache_stats(self):
+        """Counters of the local blob cache, or None when it is disabled"""
+        return self.file_service.cache_stats()
@@ -0,0 +1,183 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+class BlobCache:
+    """Bounded, size-based LRU cache of blobs on local disk.
+
+    Blobs are keyed by name and filled through a callable, so any object store
+    (or a local directory standing in for one) can sit behind it. Concurrent
+    misses for the same blob are coalesced into a single fill. Each blob's
+    metadata is kept in a ``.meta.json`` sidecar, so it survives a restart.
+    """
+    logger = logging.getLogger('BlobCache')
+    TEMP_PREFIX = ".tmp-"
+    META_SUFFIX = ".meta.json"
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # name -> (size, metadata), least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._index_existing()
+
+    def _index_existing(self):
+        """Adopt blobs left on disk by a previous process, oldest access first"""
+        files = []
+        sidecars = set()
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.startswith(self.TEMP_PREFIX):
+                os.remove(entry.path)
+                continue
+            if entry.name.endswith(self.META_SUFFIX):
+                sidecars.add(entry.name[:-len(self.META_SUFFIX)])
+                continue
+            stat = entry.stat()
+            files.append((stat.st_atime, entry.name, stat.st_size))
+        for name in sidecars.difference(name for _, name, _ in files):
+            os.remove(self._meta_path(name))
+        with self._lock:
+            for _, name, size in sorted(files):
+                self._entries[name] = (size, self._read_metadata(name) if name in sidecars else {})
+                self._size += size
+            self._evict()
+        self.logger.info('Indexed %s cached blobs (%s bytes)', len(self._entries), self._size)
+
+    def _path(self, name):
+        """Filesystem path for a blob name; unsafe names, including ones that look like a sidecar, are hashed"""
+        if os.sep in name or name.startswith(".") or name.endswith(self.META_SUFFIX) or (os.altsep and os.altsep in name):
+            name = hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, key + self.META_SUFFIX)
+
+    def _read_metadata(self, key):
+        """Metadata stored next to a blob by a previous process; {} if the sidecar is unreadable"""
+        try:
+            with open(self._meta_path(key)) as meta:
+                return json.load(meta)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Ignoring unreadable metadata of cached blob {key}: {str(e)}')
+            return {}
+
+    def get(self, name, fill):
+        """Return ``(file, size, metadata)`` for a cached blob, filling it on a miss.
+
+        ``fill(file)`` writes the blob into ``file`` and returns its metadata
+        dict, or None if the blob does not exist, in which case get returns None.
+        The returned file is opened before it can be evicted, so callers may
+        stream it even if another request evicts the entry meanwhile.
+        """
+        key = os.path.basename(self._path(name))
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    size, metadata = self._entries[key]
+                    return open(self._path(name), "rb"), size, metadata
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+            if not leader:
+                # Another request is downloading this blob; re-check once it is done
+                event.wait()
+                continue
+            try:
+                return self._fill(name, key, fill)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                event.set()
+
+    def put(self, name, file, metadata=None):
+        """Write a blob through to the cache, e.g. right after uploading it"""
+        key = os.path.basename(self._path(name))
+
+        def fill(target):
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                target.write(chunk)
+            return metadata or {}
+
+        opened = self._fill(name, key, fill)
+        if opened:
+            opened[0].close()
+
+    def _fill(self, name, key, fill):
+        """Download a blob into a temp file, then atomically publish it after its metadata sidecar"""
+        handle, temp_path = tempfile.mkstemp(prefix=self.TEMP_PREFIX, dir=self.directory)
+        temp_paths = [temp_path]
+        try:
+            with os.fdopen(handle, "wb") as target:
+                metadata = fill(target)
+            if metadata is None:
+                os.remove(temp_path)
+                return None
+            handle, meta_temp_path = tempfile.mkstemp(prefix=self.TEMP_PREFIX, dir=self.directory)
+            temp_paths.append(meta_temp_path)
+            with os.fdopen(handle, "w") as meta:
+                json.dump(metadata, meta)
+            os.replace(meta_temp_path, self._meta_path(key))
+            path = self._path(name)
+            os.replace(temp_path, path)
+        except BaseException:
+            for leftover in temp_paths:
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+
+        size = os.path.getsize(path)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._size -= previous[0]
+            self._entries[key] = (size, metadata)
+            self._size += size
+            file = open(path, "rb")
+            self._evict()
+        return file, size, metadata
+
+    def _evict(self):
+        """Drop least recently used blobs until the cache fits; caller holds the lock"""
+        while self._size > self.max_bytes and self._entries:
+            key, (size, _) = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            for path in (os.path.join(self.directory, key), self._meta_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        """Hit, miss and eviction counters plus current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,143 @@
+from config import Config
+from services.stats_service import StatsService
+from datetime import datetime
+import logging
+import numpy as np
+
+_MISSING = object()
+
+class BulkStatsService:
+    """Columnar statistics for many users and long histories.
+
+    Days are loaded once into a (day x task) boolean matrix sorted by user and
+    date, and every statistic is then computed with array reductions. Results
+    match the per-dict functions in StatsService exactly.
+    """
+    logger = logging.getLogger('BulkStatsService')
+    TASK_KEYS = list(Config.TASK_NAMES)
+    WATER_INDEX = TASK_KEYS.index("drink_gallon_water")
+
+    @staticmethod
+    def load_matrix(progress_by_user):
+        """Load days into sorted columnar arrays.
+
+        Returns ``(user_ids, users, dates, task_done, complete)`` where ``users``
+        holds an index into ``user_ids`` for every day, ``task_done`` is the
+        per-task completion matrix and ``complete`` the per-day completion vector.
+        """
+        task_keys = BulkStatsService.TASK_KEYS
+        water_index = BulkStatsService.WATER_INDEX
+        user_ids = list(progress_by_user)
+        users, dates, task_rows, satisfied_rows, extras_ok = [], [], [], [], []
+
+        for user_index, user_id in enumerate(user_ids):
+            for day in progress_by_user[user_id]:
+                tasks = day["tasks"]
+                values = [tasks.get(task_key, _MISSING) for task_key in task_keys]
+                water = values[water_index]
+                row = [value is not _MISSING and bool(value) for value in values]
+                # ``satisfied`` follows is_day_complete: missing keys do not count
+                # against the day and a non-int water value is judged by truthiness.
+                satisfied = [value is _MISSING or bool(value) for value in values]
+                if isinstance(water, int):
+                    row[water_index] = satisfied[water_index] = water >= Config.WATER_GOAL_ML
+                else:
+                    row[water_index] = False
+                users.append(user_index)
+                dates.append(day["date"])
+                task_rows.append(row)
+                satisfied_rows.append(satisfied)
+                extras_ok.append(
+                    len(tasks) == len(task_keys) - values.count(_MISSING)
+                    or all(value for key, value in tasks.items() if key not in Config.TASK_NAMES)
+                )
+
+        users = np.array(users, dtype=np.int64)
+        dates = np.array(dates, dtype=str)
+        task_done = np.array(task_rows, dtype=bool).reshape(len(users), len(task_keys))
+        complete = np.array(satisfied_rows, dtype=bool).reshape(len(users), len(task_keys)).all(axis=1)
+        complete &= np.array(extras_ok, dtype=bool)
+
+        order = np.lexsort((dates, users))
+        return user_ids, users[order], dates[order], task_done[order], complete[order]
+
+    @staticmethod
+    def group_bounds(users):
+        """Return the start index of every user's block in the sorted arrays"""
+        if not users.size:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+
+    @staticmethod
+    def calculate_streaks(dates, complete, bounds, today=None):
+        """Calculate current and longest streaks for every user block"""
+        if today is None:
+            today = datetime.now().strftime("%Y-%m-%d")
+        size = complete.size
+        ends = np.r_[bounds[1:], size] - 1
+        index = np.arange(size)
+
+        # Longest streak: run-length encode the completion vector, never letting
+        # a run cross from one user's block into the next.
+        is_start = np.zeros(size, dtype=bool)
+        is_start[bounds] = True
+        is_end = np.zeros(size, dtype=bool)
+        is_end[ends] = True
+        run_starts = np.flatnonzero(complete & (is_start | ~np.r_[False, complete[:-1]]))
+        run_ends = np.flatnonzero(complete & (is_end | ~np.r_[complete[1:], False]))
+        longest = np.zeros(bounds.size, dtype=np.int64)
+        run_users = np.searchsorted(bounds, run_starts, side="right") - 1
+        np.maximum.at(longest, run_users, run_ends - run_starts + 1)
+
+        # Current streak: completed days after the last incomplete day, where an
+        # incomplete day dated today does not break the streak.
+        breaks = ~complete & (dates != today)
+        last_break = np.maximum.reduceat(np.where(breaks, index, -1), bounds)
+        last_break = np.maximum(last_break, bounds - 1)
+        completed_upto = np.r_[0, np.cumsum(complete)]
+        current = completed_upto[ends + 1] - completed_upto[last_break + 1]
+        return current, longest
+
+    @staticmethod
+    def calculate_task_stats(task_done, bounds):
+        """Calculate per-task completion counts for every user block"""
+        return np.add.reduceat(task_done.astype(np.int64), bounds, axis=0)
+
+    @staticmethod
+    def get_stats_by_user(progress_by_user, today=None):
+        """Get comprehensive statistics for every user in ``progress_by_user``"""
+        BulkStatsService.logger.info('Calculating bulk stats for %s users', len(progress_by_user))
+        empty_stats = {
+            "total_days": 0,
+            "completed_days": 0,
+            "current_streak": 0,
+            "longest_streak": 0,
+            "completion_rate": 0,
+            "task_stats": {}
+        }
+        results = {user_id: dict(empty_stats, task_stats={}) for user_id in progress_by_user}
+
+        user_ids, users, dates, task_done, complete = BulkStatsService.load_matrix(progress_by_user)
+        if not users.size:
+            return results
+
+        bounds = BulkStatsService.group_bounds(users)
+        totals = np.diff(np.r_[bounds, users.size])
+        completed = np.add.reduceat(complete.astype(np.int64), bounds)
+        task_counts = BulkStatsService.calculate_task_stats(task_done, bounds)
+        current, longest = BulkStatsService.calculate_streaks(dates, complete, bounds, today)
+
+        for block, start in enumerate(bounds):
+            results[user_ids[users[start]]] = StatsService.stats_from_totals(
+                int(totals[block]),
+                int(completed[block]),
+                int(current[block]),
+                int(longest[block]),
+                {task_key: int(task_counts[block, task_index]) for task_index, task_key in enumerate(BulkStatsService.TASK_KEYS)}
+            )
+        return results
+
+    @staticmethod
+    def get_comprehensive_stats(all_progress, today=None):
+        """Columnar equivalent of StatsService.get_comprehensive_stats for one user"""
+        return BulkStatsService.get_stats_by_user({None: all_progress}, today)[None]
@@ -0,0 +1,29 @@
+import gzip
+import logging
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+class CompressionService:
+    """Content-Encoding negotiation and compression of response bodies"""
+    logger = logging.getLogger('CompressionService')
+
+    @staticmethod
+    def available_encodings():
+        """Supported encodings, most preferred first"""
+        return ("br", "gzip") if brotli else ("gzip",)
+
+    @staticmethod
+    def negotiate(accept_encodings):
+        """Pick the encoding for a parsed Accept-Encoding header, or None for identity"""
+        return accept_encodings.best_match(CompressionService.available_encodings())
+
+    @staticmethod
+    def compress(data, encoding):
+        """Compress ``data`` with ``encoding`` ("br" or "gzip")"""
+        if encoding == "br":
+            return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+        return gzip.compress(data, compresslevel=Config.GZIP_LEVEL)
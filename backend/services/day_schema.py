@@ -0,0 +1,170 @@
+from config import Config
+
+WATER_TASK = "drink_gallon_water"
+# Boolean tasks in bit order, lowest bit first; the packed export uses the same order
+BOOLEAN_TASKS = [task for task in Config.DEFAULT_TASKS if task != WATER_TASK]
+TASK_BITS = {task: 1 << bit for bit, task in enumerate(BOOLEAN_TASKS)}
+ALL_TASK_BITS = (1 << len(BOOLEAN_TASKS)) - 1
+# Bits of the optional ``absent`` mask of a compact day: tasks missing from
+# the tasks subdocument it was converted from. is_day_complete ignores
+# missing tasks, so they are recorded rather than stored as not done.
+ABSENT_BITS = {**TASK_BITS, WATER_TASK: 1 << len(BOOLEAN_TASKS)}
+COMPACT_SCHEMA = 2
+COMPACT_FIELDS = ("schema", "bits", "water", "absent")
+# Aggregation expression telling compact days from ones with a tasks subdocument
+IS_COMPACT = {"$eq": ["$schema", COMPACT_SCHEMA]}
+# Fields to project so day_tasks and to_external work on days of either schema
+TASKS_PROJECTION = {"tasks": 1, **dict.fromkeys(COMPACT_FIELDS, 1)}
+# Sync bookkeeping stored on a day that API responses leave out
+INTERNAL_FIELDS = ("task_times", "version")
+
+def pack_tasks(tasks):
+    """Return the ``(bits, water)`` of a tasks dict"""
+    bits = 0
+    for task, bit in TASK_BITS.items():
+        if tasks.get(task):
+            bits |= bit
+    return bits, tasks.get(WATER_TASK) or 0
+
+def absent_tasks(tasks):
+    """Return the ``absent`` mask of the tasks missing from a tasks dict"""
+    return sum(bit for task, bit in ABSENT_BITS.items() if task not in tasks)
+
+def unpack_tasks(bits, water, absent=0):
+    """Return the tasks dict of a bitmask and a water amount, leaving out the ``absent`` tasks"""
+    return {
+        task: water if task == WATER_TASK else bool(bits & TASK_BITS[task])
+        for task in Config.DEFAULT_TASKS if not absent & ABSENT_BITS[task]
+    }
+
+def day_tasks(day):
+    """The tasks dict of a day document in either schema"""
+    if "bits" in day:
+        return unpack_tasks(day["bits"], day.get("water", 0), day.get("absent", 0))
+    return day["tasks"]
+
+def to_external(day, fields=None):
+    """Give a day document the API shape in place: INTERNAL_FIELDS are dropped and compact days get their tasks subdocument back.
+
+    ``fields`` are the projected paths of a find_progress call, so a
+    projection of single tasks only returns those tasks.
+    """
+    for field in INTERNAL_FIELDS:
+        day.pop(field, None)
+    if "bits" in day:
+        day["tasks"] = unpack_tasks(day.pop("bits"), day.pop("water", 0), day.pop("absent", 0))
+        day.pop("schema", None)
+        if fields and "tasks" not in fields:
+            day["tasks"] = {task: day["tasks"][task] for task in day["tasks"] if f"tasks.{task}" in fields}
+    return day
+
+def bit_is_set(bits, bit):
+    """Aggregation expression testing one bit, using arithmetic that every server version supports"""
+    return {"$eq": [{"$mod": [{"$floor": {"$divide": [bits, bit]}}, 2]}, 1]}
+
+class TasksSchema:
+    """Day documents with a ``tasks`` subdocument keyed by task name (the default)"""
+    name = "tasks"
+    # Days stored in the other schema, i.e. the ones migrate_schema converts
+    stale = {"tasks": {"$exists": False}}
+
+    def fields(self, tasks):
+        """Fields storing ``tasks`` on a new day"""
+        return {"tasks": tasks}
+
+    def replace(self, tasks):
+        """Update document replacing all tasks of a day"""
+        return {"$set": {"tasks": tasks}, "$unset": {field: "" for field in COMPACT_FIELDS}}
+
+    def normalize(self):
+        """Pipeline stages converting a day of either schema, or a new one, to this schema"""
+        absent = {"$ifNull": ["$absent", 0]}
+        tasks = {
+            task: {"$cond": [
+                bit_is_set(absent, ABSENT_BITS[task]),
+                "$$REMOVE",
+                {"$ifNull": ["$water", 0]} if task == WATER_TASK else bit_is_set({"$ifNull": ["$bits", 0]}, TASK_BITS[task]),
+            ]}
+            for task in Config.DEFAULT_TASKS
+        }
+        return [{"$set": {"tasks": {"$ifNull": ["$tasks", tasks]}}}, {"$project": {field: 0 for field in COMPACT_FIELDS}}]
+
+    def toggle(self, task):
+        field = f"tasks.{task}"
+        return {field: {"$cond": [f"${field}", False, True]}}
+
+    def set_value(self, task, value, newer):
+        field = f"tasks.{task}"
+        return {field: {"$cond": [newer, value, f"${field}"]}}
+
+    def add_water(self, amount):
+        water = {"$ifNull": [f"$tasks.{WATER_TASK}", 0]}
+        return {f"tasks.{WATER_TASK}": {"$min": [{"$add": [water, amount]}, Config.WATER_GOAL_ML]}}
+
+class CompactSchema(TasksSchema):
+    """Day documents storing the boolean tasks as a bitmask and water as an integer.
+
+    ``{"schema": 2, "bits": 0-127, "water": ml}`` replaces a tasks
+    subdocument of eight long keys, shrinking documents and the working set.
+    Days converted from a subdocument missing some tasks also store ``absent``.
+    """
+    name = "compact"
+    stale = {"bits": {"$exists": False}}
+
+    def fields(self, tasks):
+        bits, water = pack_tasks(tasks)
+        fields = {"schema": COMPACT_SCHEMA, "bits": bits, "water": water}
+        absent = absent_tasks(tasks)
+        if absent:
+            fields["absent"] = absent
+        return fields
+
+    def replace(self, tasks):
+        fields = self.fields(tasks)
+        return {"$set": fields, "$unset": {field: "" for field in ("tasks", "absent") if field not in fields}}
+
+    def normalize(self):
+        bits = {"$add": [{"$cond": [f"$tasks.{task}", bit, 0]} for task, bit in TASK_BITS.items()]}
+        missing = {"$add": [
+            {"$cond": [{"$eq": [{"$type": f"$tasks.{task}"}, "missing"]}, bit, 0]} for task, bit in ABSENT_BITS.items()
+        ]}
+        absent = {"$cond": [{"$eq": [{"$type": "$tasks"}, "object"]}, missing, 0]}
+        return [
+            {"$set": {
+                "schema": COMPACT_SCHEMA,
+                "bits": {"$ifNull": ["$bits", bits]},
+                "water": {"$ifNull": ["$water", {"$ifNull": [f"$tasks.{WATER_TASK}", 0]}]},
+                "absent": {"$cond": [IS_COMPACT, "$absent", {"$cond": [{"$eq": [absent, 0]}, "$$REMOVE", absent]}]},
+            }},
+            {"$project": {"tasks": 0}},
+        ]
+
+    @staticmethod
+    def _written(task, condition=True):
+        """Update clearing the ``absent`` bit of ``task`` when ``condition`` holds, as writing it adds the key to a tasks subdocument"""
+        bit = ABSENT_BITS[task]
+        is_absent = bit_is_set({"$ifNull": ["$absent", 0]}, bit)
+        return {"absent": {"$cond": [{"$and": [condition, is_absent]}, {"$subtract": ["$absent", bit]}, "$absent"]}}
+
+    def toggle(self, task):
+        bit = TASK_BITS[task]
+        return {"bits": {"$add": ["$bits", {"$cond": [bit_is_set("$bits", bit), -bit, bit]}]}, **self._written(task)}
+
+    def set_value(self, task, value, newer):
+        if task == WATER_TASK:
+            return {"water": {"$cond": [newer, value, "$water"]}, **self._written(task, newer)}
+        bit = TASK_BITS[task]
+        changes = {"$ne": [bit_is_set("$bits", bit), value]}
+        return {
+            "bits": {"$cond": [{"$and": [newer, changes]}, {"$add": ["$bits", bit if value else -bit]}, "$bits"]},
+            **self._written(task, newer),
+        }
+
+    def add_water(self, amount):
+        return {"water": {"$min": [{"$add": ["$water", amount]}, Config.WATER_GOAL_ML]}, **self._written(WATER_TASK)}
+
+SCHEMAS = {schema.name: schema for schema in (TasksSchema(), CompactSchema())}
+
+def current_schema():
+    """The schema new writes use, selected by Config.DOCUMENT_SCHEMA"""
+    return SCHEMAS[Config.DOCUMENT_SCHEMA]
@@ -1,23 +1,47 @@
-from google.cloud import storage
 import logging
+import threading
 from config import Config
+from services.blob_cache import BlobCache
+from services.image_service import ImageService
+from services.metrics import STORAGE_OPERATION_DURATION
+from services.storage_backends import create_storage_backend
 class FileService:
-    """Service for handling file uploads to Google Cloud Storage"""
+    """Service for handling file uploads to the configured storage backend"""
     logger = logging.getLogger('FileService')
-    
-    def __init__(self):
+
+    def __init__(self, backend=None):
         self.logger.info('Initializing FileService')
-        self.storage_client = storage.Client()
-        self.bucket_name = Config.BUCKET_NAME
+        self._backend = backend
+        self._cache = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        """Storage backend, created on first use: the GCS client discovers credentials over the network"""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_storage_backend()
+        return self._backend
+
+    @property
+    def cache(self):
+        """Local blob cache, indexed on first use, or None when it is disabled"""
+        if self._cache is None and Config.BLOB_CACHE_MAX_BYTES:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = BlobCache(Config.BLOB_CACHE_DIR, Config.BLOB_CACHE_MAX_BYTES)
+        return self._cache
 
-    def upload_file(self, file, file_name):
+    def upload_file(self, file, file_name, content_type=None):
         try:
-            self.logger.info(f'Uploading file: {file_name}')
-            bucket = self.storage_client.bucket(self.bucket_name)
-            blob_name = file_name
-            blob = bucket.blob(blob_name)
-            blob.upload_from_file(file)
-            self.logger.debug(f'Successfully uploaded file {file_name}')
+            self.logger.info('Uploading file: %s', file_name)
+            with STORAGE_OPERATION_DURATION.labels("upload").time():
+                self.backend.upload(file, file_name, content_type)
+            self.logger.debug('Successfully uploaded file %s', file_name)
+            if self.cache and file.seekable():
+                file.seek(0)
+                self.cache.put(file_name, file, {"content_type": content_type})
             return {"success": True, "message": "File uploaded successfully"}
         except Exception as e:
             self.logger.error(f'Error uploading file {file_name}: {str(e)}')
@@ -25,11 +49,46 @@ class FileService:
 
     def get_file(self, file_name) -> bytes:
         try:
-            self.logger.info(f'Getting file: {file_name}')
-            bucket = self.storage_client.bucket(self.bucket_name)
-            blob_name = file_name
-            blob = bucket.get_blob(blob_name)
-            return blob.download_as_bytes()
+            self.logger.info('Getting file: %s', file_name)
+            with STORAGE_OPERATION_DURATION.labels("read").time():
+                return self.backend.read_bytes(file_name)
         except Exception as e:
             self.logger.error(f'Error getting file {file_name}: {str(e)}')
-            raise e
\ No newline at end of file
+            raise e
+
+    def open_file(self, file_name):
+        """Return ``(body, content_type, size)`` for serving a blob, or None if it is missing.
+
+        With the disk cache enabled ``body`` is an open file on local disk that
+        can be sent zero-copy; otherwise it lazily reads the blob in
+        STREAM_CHUNK_SIZE ranges instead of buffering the whole object in memory.
+        """
+        if self.cache:
+            cached = self.cache.get(file_name, lambda target: self._download_to(file_name, target))
+            if cached is None:
+                return None
+            file, size, metadata = cached
+            # Blobs cached before metadata sidecars existed only have their name to go by
+            return file, metadata.get("content_type") or ImageService.content_type(file_name), size
+
+        try:
+            self.logger.info('Opening file: %s', file_name)
+            with STORAGE_OPERATION_DURATION.labels("open").time():
+                return self.backend.open(file_name, Config.STREAM_CHUNK_SIZE)
+        except Exception as e:
+            self.logger.error(f'Error opening file {file_name}: {str(e)}')
+            raise e
+
+    def _download_to(self, file_name, target):
+        """Cache fill: download a blob into ``target`` and return its metadata"""
+        try:
+            self.logger.info('Downloading file into cache: %s', file_name)
+            with STORAGE_OPERATION_DURATION.labels("download").time():
+                return self.backend.download_to(file_name, target)
+        except Exception as e:
+            self.logger.error(f'Error downloading file {file_name}: {str(e)}')
+            raise e
+
+    def cache_stats(self):
+        """Counters of the local blob cache, or None when it is disabled"""
+        return self.cache.stats() if self.cache else None
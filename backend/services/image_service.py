@@ -0,0 +1,50 @@
+from io import BytesIO
+from config import Config
+import logging
+import mimetypes
+import os
+
+class ImageService:
+    """Service for generating and naming resized progress picture derivatives"""
+    logger = logging.getLogger('ImageService')
+    SIZES = ("thumb", "medium", "full")
+
+    @staticmethod
+    def derivative_name(file_name, size):
+        """Blob name of the ``size`` derivative of an uploaded picture"""
+        if size == "full":
+            return file_name
+        stem = os.path.splitext(file_name)[0]
+        return f"{stem}_{size}.{Config.IMAGE_DERIVATIVE_FORMAT.lower()}"
+
+    @staticmethod
+    def content_type(file_name):
+        """Guess the content type of a blob from its name"""
+        return mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+    @staticmethod
+    def make_derivatives(data, file_name):
+        """Return ``{blob_name: (bytes, content_type)}`` for every resized derivative.
+
+        Returns an empty dict when the upload is not a readable image, in which
+        case only the original is stored and served for every size.
+        """
+        # Pillow is only needed for uploads, so it is not loaded at startup
+        from PIL import Image, ImageOps, UnidentifiedImageError
+        try:
+            with Image.open(BytesIO(data)) as original:
+                image = ImageOps.exif_transpose(original)
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGB")
+                derivatives = {}
+                for size, max_side in Config.IMAGE_DERIVATIVE_SIZES.items():
+                    resized = image.copy()
+                    resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+                    buffer = BytesIO()
+                    resized.save(buffer, format=Config.IMAGE_DERIVATIVE_FORMAT, quality=Config.IMAGE_DERIVATIVE_QUALITY)
+                    name = ImageService.derivative_name(file_name, size)
+                    derivatives[name] = (buffer.getvalue(), ImageService.content_type(name))
+                return derivatives
+        except (UnidentifiedImageError, OSError) as e:
+            ImageService.logger.warning(f'Could not generate derivatives for {file_name}: {str(e)}')
+            return {}
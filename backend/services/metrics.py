@@ -0,0 +1,73 @@
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+from config import Config
+from datetime import datetime
+import cProfile
+import logging
+import os
+import uuid
+
+logger = logging.getLogger('Metrics')
+
+# Mongo commands and storage calls are much faster than whole requests
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency per route",
+    ["method", "route", "status"])
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency as reported by the driver",
+    ["command", "outcome"], buckets=FAST_BUCKETS)
+STORAGE_OPERATION_DURATION = Histogram(
+    "storage_operation_duration_seconds", "FileService storage operation latency",
+    ["operation"], buckets=FAST_BUCKETS)
+STATS_DURATION = Histogram(
+    "stats_computation_duration_seconds", "Time to compute a user's comprehensive stats",
+    ["backend"], buckets=FAST_BUCKETS)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Driver event listener recording the duration of every MongoDB command"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "success").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name, "failure").observe(event.duration_micros / 1e6)
+
+mongo_command_metrics = MongoCommandMetrics()
+
+def observe_request(method, route, status, seconds):
+    """Record one request; ``route`` is the URL rule so ids and dates do not become labels"""
+    REQUEST_DURATION.labels(method, route or "unmatched", str(status)).observe(seconds)
+
+def render_metrics():
+    """Return ``(body, content_type)`` in the Prometheus text format.
+
+    With PROMETHEUS_MULTIPROC_DIR set (several gunicorn workers) the samples of
+    every worker are aggregated; otherwise this process's registry is exported.
+    """
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def start_profile(headers):
+    """Start a cProfile session if profiling is enabled and the request asked for one"""
+    if not Config.PROFILING_ENABLED or headers.get("X-Profile") != "1":
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def finish_profile(profiler, endpoint):
+    """Stop a session and dump it to PROFILE_DIR; returns the file name"""
+    profiler.disable()
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    file_name = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{endpoint or 'unmatched'}-{uuid.uuid4().hex[:8]}.prof"
+    profiler.dump_stats(os.path.join(Config.PROFILE_DIR, file_name))
+    logger.info('Wrote request profile %s', file_name)
+    return file_name
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from config import Config
+import hashlib
+import json
+import logging
+import threading
+import time
+
+class LocalCacheBackend:
+    """In-process TTL + LRU store; also the stand-in for a shared backend in development"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generation(self, name):
+        with self._lock:
+            return self._generations.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+            return self._generations[name]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "evictions": self.evictions}
+
+class RedisCacheBackend:
+    """Shared store so every worker and instance sees the same entries and invalidations"""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def generation(self, name):
+        return int(self.client.get(name) or 0)
+
+    def bump(self, name):
+        return self.client.incr(name)
+
+    def stats(self):
+        return {"entries": self.client.dbsize()}
+
+class ResponseCache:
+    """Cache of serialized GET responses, keyed per user and endpoint.
+
+    Every (user, endpoint) pair has a generation counter that is part of the
+    entry keys. Invalidation bumps the counter, so all variants of the
+    endpoint (query strings, days) go stale at once without being enumerated,
+    and a response computed before a write is stored under the old generation
+    where it is never read again.
+    """
+    logger = logging.getLogger('ResponseCache')
+    # Endpoints whose responses depend on each kind of Database change
+    DEPENDENCIES = {"progress": ("history", "stats", "dashboard"), "pics": ("pics", "dashboard")}
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def lookup(self, user_id, endpoint, variant):
+        """Return ``(key, entry)`` for a request; entry is None on a miss and ``key`` is where to store it"""
+        generation = self.backend.generation(f"gen:{user_id}:{endpoint}")
+        key = f"resp:{user_id}:{endpoint}:{generation}:{variant}"
+        entry = self.backend.get(key)
+        self._count(endpoint, "hits" if entry is not None else "misses")
+        return key, entry
+
+    def store(self, key, body, headers):
+        """Store a response body and the headers to replay; returns the entry with its ETag"""
+        entry = {
+            "body": body.decode(),
+            "headers": headers,
+            "etag": hashlib.sha1(body).hexdigest(),
+        }
+        self.backend.set(key, entry, self.ttl)
+        return entry
+
+    def invalidate(self, user_id, kind):
+        """Database change listener: expire every endpoint that depends on ``kind``"""
+        for endpoint in self.DEPENDENCIES.get(kind, ()):
+            self.backend.bump(f"gen:{user_id}:{endpoint}")
+            self._count(endpoint, "invalidations")
+
+    def record_not_modified(self, endpoint):
+        self._count(endpoint, "not_modified")
+
+    def _count(self, endpoint, counter):
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0})
+            counters[counter] += 1
+
+    def stats(self):
+        """Hit rates per endpoint and overall, plus backend occupancy"""
+        with self._lock:
+            endpoints = {endpoint: dict(counters) for endpoint, counters in self._counters.items()}
+        for counters in endpoints.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else 0
+        hits = sum(counters["hits"] for counters in endpoints.values())
+        lookups = hits + sum(counters["misses"] for counters in endpoints.values())
+        return {
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0,
+            "ttl": self.ttl,
+            "endpoints": endpoints,
+            "backend": self.backend.stats(),
+        }
+
+def create_response_cache():
+    """Build the cache selected by Config.RESPONSE_CACHE_BACKEND, or None when it is disabled"""
+    if Config.RESPONSE_CACHE_BACKEND == "none":
+        return None
+    if Config.RESPONSE_CACHE_BACKEND == "local":
+        backend = LocalCacheBackend(Config.RESPONSE_CACHE_MAX_ENTRIES)
+    elif Config.RESPONSE_CACHE_BACKEND == "redis":
+        backend = RedisCacheBackend(Config.REDIS_URL)
+    else:
+        raise ValueError(f"Unknown response cache backend: {Config.RESPONSE_CACHE_BACKEND}")
+    return ResponseCache(backend, Config.RESPONSE_CACHE_TTL)
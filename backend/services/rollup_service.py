@@ -0,0 +1,104 @@
+from config import Config
+from services.stats_service import StatsService
+from collections import Counter
+from datetime import date
+import logging
+
+class RollupService:
+    """One-pass builder of the leaderboard entries and cohort rollups.
+
+    Users are fed one at a time with their days in date order, as the
+    progress collection returns them sorted by the (user_id, date) index, so
+    memory holds one user's history plus the counters. A user's cohort is the
+    month of their first day, and day N of the challenge is the calendar day
+    N - 1 days after it. Every user is also counted in the "all" cohort.
+    Leaderboard ranks are derived from a histogram of each ranked field, so
+    they are known once every user has been added.
+    """
+    logger = logging.getLogger('RollupService')
+    ALL_COHORT = "all"
+    RANKED_FIELDS = ("current_streak", "longest_streak", "completed_days")
+
+    def __init__(self, challenge_days=Config.CHALLENGE_DAYS):
+        self.challenge_days = challenge_days
+        self.counters = {}  # (cohort, day) -> {"users", "completed", "tasks"}
+        self.values = {field: Counter() for field in self.RANKED_FIELDS}  # field -> value -> users
+
+    def add_user(self, user_id, days):
+        """Count a user's date-sorted days into the rollups; returns their leaderboard entry"""
+        first = date.fromisoformat(days[0]["date"])
+        cohort = days[0]["date"][:7]
+        flags = []
+        for day in days:
+            complete = StatsService.is_day_complete(day)
+            flags.append((day["date"], complete))
+            day_number = (date.fromisoformat(day["date"]) - first).days + 1
+            if day_number <= self.challenge_days:
+                tasks_done = StatsService.day_task_completion(day)
+                self._count(cohort, day_number, complete, tasks_done)
+                self._count(self.ALL_COHORT, day_number, complete, tasks_done)
+        current_streak, longest_streak = StatsService.calculate_streaks_from_flags(flags)
+        entry = {
+            "_id": user_id,
+            "cohort": cohort,
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+            "completed_days": sum(complete for _, complete in flags),
+            "total_days": len(flags),
+        }
+        for field, values in self.values.items():
+            values[entry[field]] += 1
+        return entry
+
+    def _count(self, cohort, day_number, complete, tasks_done):
+        counters = self.counters.get((cohort, day_number))
+        if counters is None:
+            counters = {"users": 0, "completed": 0, "tasks": {task_key: 0 for task_key in Config.TASK_NAMES}}
+            self.counters[(cohort, day_number)] = counters
+        counters["users"] += 1
+        counters["completed"] += int(complete)
+        for task_key, done in tasks_done.items():
+            counters["tasks"][task_key] += int(done)
+
+    def rollup_documents(self):
+        """One document per cohort and day of the challenge"""
+        for (cohort, day_number), counters in sorted(self.counters.items()):
+            yield {"_id": f"{cohort}:{day_number}", "cohort": cohort, "day": day_number, **counters}
+
+    def ranks(self):
+        """Yield ``(field, value, rank)`` with the competition rank (ties share a rank) of every value seen"""
+        for field, values in self.values.items():
+            ahead = 0
+            for value in sorted(values, reverse=True):
+                yield field, value, ahead + 1
+                ahead += values[value]
+
+    @staticmethod
+    def cohort_days(rollups, size):
+        """Retention and completion percentages per day of challenge from rollup documents"""
+        def percentage(count, total):
+            return round((count / total) * 100, 1) if total else 0
+        return [
+            {
+                "day": rollup["day"],
+                "users": rollup["users"],
+                "retention": percentage(rollup["users"], size),
+                "completion_rate": percentage(rollup["completed"], rollup["users"]),
+                "task_rates": {task_key: percentage(count, rollup["users"]) for task_key, count in rollup["tasks"].items()},
+            }
+            for rollup in rollups
+        ]
+
+    @staticmethod
+    def ranked(entries, by):
+        """Leaderboard rows with competition ranking (ties share a rank) by ``by``"""
+        rows = []
+        for position, entry in enumerate(entries, start=1):
+            rank = rows[-1]["rank"] if rows and entry[by] == rows[-1][by] else position
+            rows.append(RollupService.leaderboard_row(entry, rank))
+        return rows
+
+    @staticmethod
+    def leaderboard_row(entry, rank):
+        row = {key: value for key, value in entry.items() if key not in ("_id", "run_id", "ranks")}
+        return {"rank": rank, "user_id": entry["_id"], **row}
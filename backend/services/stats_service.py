@@ -1,5 +1,6 @@
 from config import Config
 from datetime import datetime
+from services.day_schema import ABSENT_BITS, ALL_TASK_BITS, IS_COMPACT, TASK_BITS, WATER_TASK, bit_is_set
 import logging
 
 class StatsService:
@@ -9,7 +10,14 @@ class StatsService:
     @staticmethod
     def is_day_complete(day):
         """Check if a day is complete based on all tasks"""
-        StatsService.logger.debug(f'Checking if day is complete: {day.get("date", "unknown")}')
+        # Called once per day per stats request: skip even the argument lookup unless debugging
+        if StatsService.logger.isEnabledFor(logging.DEBUG):
+            StatsService.logger.debug('Checking if day is complete: %s', day.get("date", "unknown"))
+        if "bits" in day:
+            # Absent tasks are ignored like missing keys of a tasks subdocument
+            absent = day.get("absent", 0)
+            water_done = day["water"] >= Config.WATER_GOAL_ML or absent & ABSENT_BITS[WATER_TASK]
+            return (day["bits"] | absent) & ALL_TASK_BITS == ALL_TASK_BITS and bool(water_done)
         tasks = day["tasks"].copy()
         # Water is complete if >= goal
         if isinstance(tasks.get("drink_gallon_water"), int):
@@ -25,22 +33,31 @@ class StatsService:
             return 0, 0
         
         sorted_days = sorted(all_progress, key=lambda x: x["date"])
+        return StatsService.calculate_streaks_from_flags(
+            (day["date"], StatsService.is_day_complete(day)) for day in sorted_days
+        )
+
+    @staticmethod
+    def calculate_streaks_from_flags(sorted_flags):
+        """Calculate current and longest streaks from date-sorted (date, complete) pairs"""
         current_streak = 0
         longest_streak = 0
         temp_streak = 0
+        flags = []
         
-        for day in sorted_days:
-            if StatsService.is_day_complete(day):
+        for date, complete in sorted_flags:
+            flags.append((date, complete))
+            if complete:
                 temp_streak += 1
                 longest_streak = max(longest_streak, temp_streak)
             else:
                 temp_streak = 0
         
-        for day in reversed(sorted_days):
-            today = datetime.now().strftime("%Y-%m-%d")
-            if day['date'] == today and not StatsService.is_day_complete(day):
+        today = datetime.now().strftime("%Y-%m-%d")
+        for date, complete in reversed(flags):
+            if date == today and not complete:
                 continue
-            if StatsService.is_day_complete(day):
+            if complete:
                 current_streak += 1
             else:
                 break
@@ -55,28 +72,25 @@ class StatsService:
             return {}
         
         total_days = len(all_progress)
-        task_stats = {}
+        task_counts = dict.fromkeys(Config.TASK_NAMES, 0)
+        for day in all_progress:
+            for task_key, done in StatsService.day_task_completion(day).items():
+                task_counts[task_key] += done
         
+        return StatsService.task_stats_from_counts(task_counts, total_days)
+
+    @staticmethod
+    def task_stats_from_counts(task_counts, total_days):
+        """Build the task statistics from per-task completion counts"""
+        task_stats = {}
         for task_key, task_name in Config.TASK_NAMES.items():
-            if task_key == "drink_gallon_water":
-                completed_count = sum(
-                    1 for day in all_progress 
-                    if isinstance(day["tasks"].get(task_key), int) 
-                    and day["tasks"][task_key] >= Config.WATER_GOAL_ML
-                )
-            else:
-                completed_count = sum(
-                    1 for day in all_progress 
-                    if day["tasks"].get(task_key, False)
-                )
-            
+            completed_count = task_counts.get(task_key, 0)
             task_stats[task_key] = {
                 "name": task_name,
                 "completed": completed_count,
                 "total": total_days,
                 "percentage": round((completed_count / total_days) * 100, 1) if total_days > 0 else 0
             }
-        
         return task_stats
     
     @staticmethod
@@ -106,4 +120,207 @@ class StatsService:
             "longest_streak": longest_streak,
             "completion_rate": round((completed_days / total_days) * 100, 1) if total_days > 0 else 0,
             "task_stats": task_stats
-        } 
\ No newline at end of file
+        }
+
+    @staticmethod
+    def task_completion(tasks):
+        """Map every tracked task to whether it counts as completed"""
+        completion = {}
+        for task_key in Config.TASK_NAMES:
+            value = tasks.get(task_key, False)
+            if task_key == "drink_gallon_water":
+                completion[task_key] = isinstance(value, int) and value >= Config.WATER_GOAL_ML
+            else:
+                completion[task_key] = bool(value)
+        return completion
+
+    @staticmethod
+    def day_task_completion(day):
+        """task_completion of a day document, read straight from the bitmask of a compact day"""
+        if "bits" in day:
+            completion = {task_key: bool(day["bits"] & bit) for task_key, bit in TASK_BITS.items()}
+            completion[WATER_TASK] = day["water"] >= Config.WATER_GOAL_ML
+            return completion
+        return StatsService.task_completion(day["tasks"])
+
+    @staticmethod
+    def build_stats_document(all_progress):
+        """Build the materialized stats document from the full list of days"""
+        sorted_days = sorted(all_progress, key=lambda x: x["date"])
+        task_completed = {task_key: 0 for task_key in Config.TASK_NAMES}
+        flags = []
+        for day in sorted_days:
+            flags.append(StatsService.is_day_complete(day))
+            for task_key, done in StatsService.day_task_completion(day).items():
+                task_completed[task_key] += int(done)
+
+        # Streak state is kept relative to the last day so appends and edits of
+        # the latest day can be applied without rescanning the history.
+        longest_closed = 0
+        run = 0
+        for complete in flags[:-1]:
+            run = run + 1 if complete else 0
+            longest_closed = max(longest_closed, run)
+
+        return {
+            "total_days": len(sorted_days),
+            "completed_days": sum(flags),
+            "task_completed": task_completed,
+            "last_date": sorted_days[-1]["date"] if sorted_days else None,
+            "last_complete": flags[-1] if flags else False,
+            "run_before_last": run,
+            "longest_closed": longest_closed,
+            "dirty": False,
+        }
+
+    @staticmethod
+    def stats_document_update(date, old_tasks, new_tasks):
+        """Build the pipeline update applying one day change to a stats document.
+
+        ``old_tasks`` is None when the day was just created. Returns None when
+        the change does not affect any statistic.
+        """
+        is_new = old_tasks is None
+        old_complete = False if is_new else StatsService.is_day_complete({"tasks": old_tasks})
+        new_complete = StatsService.is_day_complete({"tasks": new_tasks})
+        old_tasks_done = {} if is_new else StatsService.task_completion(old_tasks)
+        new_tasks_done = StatsService.task_completion(new_tasks)
+
+        fields = {}
+        if is_new:
+            fields["total_days"] = {"$add": ["$total_days", 1]}
+        if old_complete != new_complete:
+            fields["completed_days"] = {"$add": ["$completed_days", int(new_complete) - int(old_complete)]}
+        for task_key, done in new_tasks_done.items():
+            delta = int(done) - int(old_tasks_done.get(task_key, False))
+            if delta:
+                field = f"task_completed.{task_key}"
+                fields[field] = {"$add": [f"${field}", delta]}
+
+        if is_new:
+            trailing = {"$cond": ["$last_complete", {"$add": ["$run_before_last", 1]}, 0]}
+            is_after = {"$gt": [date, "$last_date"]}
+            fields["longest_closed"] = {"$cond": [is_after, {"$max": ["$longest_closed", trailing]}, "$longest_closed"]}
+            fields["run_before_last"] = {"$cond": [is_after, trailing, "$run_before_last"]}
+            fields["last_complete"] = {"$cond": [is_after, new_complete, "$last_complete"]}
+            fields["last_date"] = {"$cond": [is_after, date, "$last_date"]}
+            # A day inserted before the latest one splits or extends runs in the middle
+            fields["dirty"] = {"$or": ["$dirty", {"$lte": [date, "$last_date"]}]}
+        elif old_complete != new_complete:
+            is_last = {"$eq": [date, "$last_date"]}
+            fields["last_complete"] = {"$cond": [is_last, new_complete, "$last_complete"]}
+            fields["dirty"] = {"$or": ["$dirty", {"$ne": [date, "$last_date"]}]}
+
+        if not fields:
+            return None
+        return [{"$set": fields}]
+
+    @staticmethod
+    def render_stats_document(stats_doc, today=None):
+        """Render a materialized stats document in the comprehensive stats format.
+
+        Returns None when the current streak cannot be derived from the document,
+        which happens when days exist after ``today``.
+        """
+        if today is None:
+            today = datetime.now().strftime("%Y-%m-%d")
+        total_days = stats_doc["total_days"]
+        if not total_days:
+            return StatsService.get_comprehensive_stats([])
+
+        last_date = stats_doc["last_date"]
+        if last_date > today:
+            return None
+
+        run_before_last = stats_doc["run_before_last"]
+        trailing = run_before_last + 1 if stats_doc["last_complete"] else 0
+        if last_date == today and not stats_doc["last_complete"]:
+            current_streak = run_before_last
+        else:
+            current_streak = trailing
+        longest_streak = max(stats_doc["longest_closed"], trailing)
+
+        return StatsService.stats_from_totals(
+            total_days,
+            stats_doc["completed_days"],
+            current_streak,
+            longest_streak,
+            stats_doc["task_completed"]
+        )
+
+    @staticmethod
+    def stats_from_totals(total_days, completed_days, current_streak, longest_streak, task_counts):
+        """Assemble the comprehensive stats response from precomputed totals"""
+        if not total_days:
+            return StatsService.get_comprehensive_stats([])
+        return {
+            "total_days": total_days,
+            "completed_days": completed_days,
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+            "completion_rate": round((completed_days / total_days) * 100, 1),
+            "task_stats": StatsService.task_stats_from_counts(task_counts, total_days)
+        }
+
+    @staticmethod
+    def completion_expression(tasks_field="$tasks"):
+        """Aggregation expression mirroring is_day_complete for a tasks subdocument or a compact day"""
+        water_done = {
+            "$switch": {
+                "branches": [
+                    {"case": {"$eq": [{"$type": "$$task.v"}, "bool"]}, "then": False},
+                    {"case": {"$in": [{"$type": "$$task.v"}, ["int", "long"]]},
+                     "then": {"$gte": ["$$task.v", Config.WATER_GOAL_ML]}}
+                ],
+                "default": "$$task.v"
+            }
+        }
+        all_done = {
+            "$allElementsTrue": [{
+                "$map": {
+                    "input": {"$objectToArray": {"$ifNull": [tasks_field, {}]}},
+                    "as": "task",
+                    "in": {"$cond": [{"$ne": ["$$task.k", "drink_gallon_water"]}, "$$task.v", water_done]}
+                }
+            }]
+        }
+        absent = {"$ifNull": ["$absent", 0]}
+        water_bit = ABSENT_BITS[WATER_TASK]
+        # An absent task's bit is never set, so adding the absent boolean tasks completes the mask
+        compact_done = {"$and": [
+            {"$eq": [{"$add": ["$bits", {"$mod": [absent, water_bit]}]}, ALL_TASK_BITS]},
+            {"$or": [{"$gte": ["$water", Config.WATER_GOAL_ML]}, bit_is_set(absent, water_bit)]},
+        ]}
+        return {"$cond": [IS_COMPACT, compact_done, all_done]}
+
+    @staticmethod
+    def task_completion_expressions(tasks_field="$tasks"):
+        """Aggregation expressions mirroring day_task_completion, one 0/1 value per task"""
+        expressions = {}
+        for task_key in Config.TASK_NAMES:
+            value = f"{tasks_field}.{task_key}"
+            if task_key == "drink_gallon_water":
+                done = {"$and": [
+                    {"$in": [{"$type": value}, ["int", "long"]]},
+                    {"$gte": [value, Config.WATER_GOAL_ML]}
+                ]}
+                compact_done = {"$gte": ["$water", Config.WATER_GOAL_ML]}
+            else:
+                done = value
+                compact_done = bit_is_set("$bits", TASK_BITS[task_key])
+            expressions[task_key] = {"$cond": [{"$cond": [IS_COMPACT, compact_done, done]}, 1, 0]}
+        return expressions
+
+    @staticmethod
+    def stats_delta(before, after):
+        """Difference between two comprehensive stats responses"""
+        delta = {
+            key: after[key] - before[key]
+            for key in ("total_days", "completed_days", "current_streak", "longest_streak")
+        }
+        delta["completion_rate"] = round(after["completion_rate"] - before["completion_rate"], 1)
+        delta["task_stats"] = {
+            task_key: {"completed": task["completed"] - before["task_stats"].get(task_key, {}).get("completed", 0)}
+            for task_key, task in after["task_stats"].items()
+        }
+        return delta
@@ -0,0 +1,133 @@
+from config import Config
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+class StorageBackend:
+    """Interface of the blob stores FileService can write to and read from"""
+
+    def upload(self, file, name, content_type=None):
+        """Store the contents of ``file`` under ``name``"""
+        raise NotImplementedError
+
+    def read_bytes(self, name):
+        """Return the whole blob, or None if it does not exist"""
+        raise NotImplementedError
+
+    def download_to(self, name, target):
+        """Write the blob into ``target`` and return its metadata, or None if it does not exist"""
+        raise NotImplementedError
+
+    def open(self, name, chunk_size):
+        """Return ``(chunks, content_type, size)`` for streaming the blob, or None if it does not exist"""
+        raise NotImplementedError
+
+class GCSStorageBackend(StorageBackend):
+    """Blob storage in a Google Cloud Storage bucket"""
+    logger = logging.getLogger('GCSStorageBackend')
+
+    def __init__(self, bucket_name):
+        from google.cloud import storage
+        self.logger.info('Using GCS bucket: %s', bucket_name)
+        self.storage_client = storage.Client()
+        self.bucket = self.storage_client.bucket(bucket_name)
+
+    def upload(self, file, name, content_type=None):
+        self.bucket.blob(name).upload_from_file(file, content_type=content_type)
+
+    def read_bytes(self, name):
+        blob = self.bucket.get_blob(name)
+        return blob.download_as_bytes() if blob else None
+
+    def download_to(self, name, target):
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            return None
+        blob.download_to_file(target)
+        return {"content_type": blob.content_type}
+
+    def open(self, name, chunk_size):
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            return None
+
+        def chunks():
+            with blob.open("rb", chunk_size=chunk_size) as reader:
+                for chunk in iter(lambda: reader.read(chunk_size), b""):
+                    yield chunk
+
+        return chunks(), blob.content_type, blob.size
+
+class LocalStorageBackend(StorageBackend):
+    """Blob storage in a local directory, for development, tests and benchmarks.
+
+    Each blob is a plain file with a ``.meta.json`` sidecar holding its content type.
+    """
+    logger = logging.getLogger('LocalStorageBackend')
+    META_SUFFIX = ".meta.json"
+
+    def __init__(self, root):
+        self.logger.info('Using local storage directory: %s', root)
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        if os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Invalid blob name: {name}")
+        return os.path.join(self.root, name)
+
+    def upload(self, file, name, content_type=None):
+        path = self._path(name)
+        handle, temp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        with os.fdopen(handle, "wb") as target:
+            shutil.copyfileobj(file, target)
+        os.replace(temp_path, path)
+        with open(path + self.META_SUFFIX, "w") as meta:
+            json.dump({"content_type": content_type}, meta)
+
+    def _metadata(self, path):
+        try:
+            with open(path + self.META_SUFFIX) as meta:
+                return json.load(meta)
+        except FileNotFoundError:
+            return {"content_type": None}
+
+    def read_bytes(self, name):
+        try:
+            with open(self._path(name), "rb") as source:
+                return source.read()
+        except FileNotFoundError:
+            return None
+
+    def download_to(self, name, target):
+        path = self._path(name)
+        try:
+            with open(path, "rb") as source:
+                shutil.copyfileobj(source, target)
+        except FileNotFoundError:
+            return None
+        return self._metadata(path)
+
+    def open(self, name, chunk_size):
+        path = self._path(name)
+        try:
+            source = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        def chunks():
+            with source:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    yield chunk
+
+        return chunks(), self._metadata(path)["content_type"], os.fstat(source.fileno()).st_size
+
+def create_storage_backend():
+    """Build the storage backend selected by Config.STORAGE_BACKEND"""
+    if Config.STORAGE_BACKEND == "local":
+        return LocalStorageBackend(Config.LOCAL_STORAGE_DIR)
+    if Config.STORAGE_BACKEND == "gcs":
+        return GCSStorageBackend(Config.BUCKET_NAME)
+    raise ValueError(f"Unknown storage backend: {Config.STORAGE_BACKEND}")
@@ -0,0 +1,293 @@
+from config import Config
+from datetime import date
+from services.day_schema import BOOLEAN_TASKS, WATER_TASK, pack_tasks
+import json
+import logging
+import struct
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Dates a uint16 day count from EPOCH_ORDINAL stores, which are the dates days may have
+MIN_DATE = date.fromordinal(EPOCH_ORDINAL)
+MAX_DATE = date.fromordinal(EPOCH_ORDINAL + 0xFFFF)
+
+class NdjsonEncoder:
+    """One JSON object per day and line"""
+    content_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self):
+        # Days left out of the export; every day can be written as JSON
+        self.skipped = []
+
+    def header(self):
+        return b""
+
+    def feed(self, day):
+        return (json.dumps(day, separators=(",", ":")) + "\n").encode()
+
+    def close(self):
+        return b""
+
+class NdjsonDecoder:
+    """Incremental NDJSON parser: feed it byte chunks and it returns the complete lines as dicts"""
+
+    def __init__(self):
+        self._buffer = b""
+        self.line = 0
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        # Parsed as they are consumed, so the days before an invalid line still come out
+        return (day for day in map(self._parse, lines) if day is not None)
+
+    def close(self):
+        day = self._parse(self._buffer)
+        self._buffer = b""
+        return [day] if day is not None else []
+
+    def _parse(self, line):
+        self.line += 1
+        if not line.strip():
+            return None
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {self.line} is not valid JSON: {e}") from e
+
+class PackedEncoder:
+    """Packed binary export: a bitset of the boolean tasks and a uint16 of water per day.
+
+    The header names the tasks in bit order. Days follow in blocks of one
+    user (a length-prefixed UTF-8 id and a uint16 day count), 5 bytes per day:
+    uint16 days since 1970-01-01, uint8 task bits, uint16 water ml. Picture
+    references are not included, and days whose date cannot be stored that
+    way are left out and listed in ``skipped``.
+    """
+    content_type = "application/octet-stream"
+    extension = "75hp"
+    MAGIC = b"75HP"
+    FORMAT_VERSION = 1
+    HEADER = struct.Struct("<4sBH")
+    LENGTH = struct.Struct("<H")
+    RECORD = struct.Struct("<HBH")
+    MAX_BLOCK_DAYS = 65535
+
+    def __init__(self):
+        self._user_id = None
+        self._records = []
+        self.skipped = []
+
+    def header(self):
+        names = ",".join(BOOLEAN_TASKS).encode()
+        return self.HEADER.pack(self.MAGIC, self.FORMAT_VERSION, len(names)) + names
+
+    def feed(self, day):
+        user_id = day.get("user_id") or Config.DEFAULT_USER_ID
+        try:
+            day_number = date.fromisoformat(TransferService.parse_date(day["date"])).toordinal() - EPOCH_ORDINAL
+        except ValueError:
+            self.skipped.append({"user_id": user_id, "date": day["date"]})
+            return b""
+        output = b""
+        if user_id != self._user_id or len(self._records) >= self.MAX_BLOCK_DAYS:
+            output = self._block()
+            self._user_id = user_id
+        bits, water = pack_tasks(day["tasks"])
+        water = min(max(int(water), 0), 65535)
+        self._records.append(self.RECORD.pack(day_number, bits, water))
+        return output
+
+    def close(self):
+        return self._block()
+
+    def _block(self):
+        if not self._records:
+            return b""
+        user_id = self._user_id.encode()
+        block = self.LENGTH.pack(len(user_id)) + user_id + self.LENGTH.pack(len(self._records)) + b"".join(self._records)
+        self._records = []
+        return block
+
+class PackedDecoder:
+    """Incremental parser of the PackedEncoder format"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._tasks = None
+        self._user_id = None
+        self._remaining = 0
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        days = []
+        while self._step(days):
+            pass
+        return days
+
+    def close(self):
+        if self._tasks is None or self._remaining or self._buffer:
+            raise ValueError("Packed export is truncated")
+        return []
+
+    def _step(self, days):
+        """Consume one header, block header or run of records; False when more bytes are needed"""
+        buffer = self._buffer
+        if self._tasks is None:
+            header_size = PackedEncoder.HEADER.size
+            if len(buffer) < header_size:
+                return False
+            magic, version, names_size = PackedEncoder.HEADER.unpack_from(buffer)
+            if magic != PackedEncoder.MAGIC or version != PackedEncoder.FORMAT_VERSION:
+                raise ValueError("Not a packed progress export")
+            if len(buffer) < header_size + names_size:
+                return False
+            self._tasks = bytes(buffer[header_size:header_size + names_size]).decode().split(",")
+            del buffer[:header_size + names_size]
+            return True
+        if not self._remaining:
+            length = PackedEncoder.LENGTH.size
+            if len(buffer) < length:
+                return False
+            (user_id_size,) = PackedEncoder.LENGTH.unpack_from(buffer)
+            if len(buffer) < 2 * length + user_id_size:
+                return False
+            self._user_id = bytes(buffer[length:length + user_id_size]).decode()
+            (self._remaining,) = PackedEncoder.LENGTH.unpack_from(buffer, length + user_id_size)
+            del buffer[:2 * length + user_id_size]
+            return True
+        count = min(self._remaining, len(buffer) // PackedEncoder.RECORD.size)
+        if not count:
+            return False
+        size = count * PackedEncoder.RECORD.size
+        for day_number, bits, water in PackedEncoder.RECORD.iter_unpack(bytes(buffer[:size])):
+            tasks = {task: bool(bits >> bit & 1) for bit, task in enumerate(self._tasks)}
+            tasks[WATER_TASK] = water
+            days.append({"user_id": self._user_id, "date": date.fromordinal(EPOCH_ORDINAL + day_number).isoformat(), "tasks": tasks})
+        del buffer[:size]
+        self._remaining -= count
+        return True
+
+class TransferService:
+    """Export and import of progress history as NDJSON or the packed binary format"""
+    logger = logging.getLogger('TransferService')
+    FORMATS = {"ndjson": (NdjsonEncoder, NdjsonDecoder), "packed": (PackedEncoder, PackedDecoder)}
+
+    @staticmethod
+    def encoder(format):
+        return TransferService.FORMATS[format][0]()
+
+    @staticmethod
+    def decoder(format):
+        return TransferService.FORMATS[format][1]()
+
+    @staticmethod
+    def encode(days, format, skipped=None):
+        """Yield the export of ``days`` as byte chunks of roughly Config.STREAM_CHUNK_SIZE.
+
+        Days the format cannot store are left out, logged and added to the
+        ``skipped`` list if one is given.
+        """
+        encoder = TransferService.encoder(format)
+        chunk = [encoder.header()]
+        size = len(chunk[0])
+        for day in days:
+            data = encoder.feed(day)
+            chunk.append(data)
+            size += len(data)
+            if size >= Config.STREAM_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        chunk.append(encoder.close())
+        TransferService._report_skipped(encoder, format, skipped)
+        yield b"".join(chunk)
+
+    @staticmethod
+    async def encode_async(days, format, skipped=None):
+        """encode() for an async iterable of days"""
+        encoder = TransferService.encoder(format)
+        chunk = [encoder.header()]
+        size = len(chunk[0])
+        async for day in days:
+            data = encoder.feed(day)
+            chunk.append(data)
+            size += len(data)
+            if size >= Config.STREAM_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        chunk.append(encoder.close())
+        TransferService._report_skipped(encoder, format, skipped)
+        yield b"".join(chunk)
+
+    @staticmethod
+    def _report_skipped(encoder, format, skipped):
+        if not encoder.skipped:
+            return
+        TransferService.logger.warning('Left %s days out of a %s export: %s', len(encoder.skipped), format, encoder.skipped[:10])
+        if skipped is not None:
+            skipped.extend(encoder.skipped)
+
+    @staticmethod
+    def decode(chunks, format):
+        """Yield the days of an export read as an iterable of byte chunks"""
+        decoder = TransferService.decoder(format)
+        for chunk in chunks:
+            yield from decoder.feed(chunk)
+        yield from decoder.close()
+
+    @staticmethod
+    async def decode_async(chunks, format):
+        """decode() for an async iterable of byte chunks, e.g. a request body"""
+        decoder = TransferService.decoder(format)
+        async for chunk in chunks:
+            for day in decoder.feed(chunk):
+                yield day
+        for day in decoder.close():
+            yield day
+
+    @staticmethod
+    def read_chunks(stream, size=Config.STREAM_CHUNK_SIZE):
+        """Iterate a binary file object in chunks"""
+        return iter(lambda: stream.read(size), b"")
+
+    @staticmethod
+    def parse_date(value):
+        """Return ``value`` if it is a YYYY-MM-DD date between MIN_DATE and MAX_DATE, else raise ValueError"""
+        try:
+            parsed = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            parsed = None
+        if parsed is None or parsed.isoformat() != value:
+            raise ValueError(f"Invalid date: {value!r}")
+        if not MIN_DATE <= parsed <= MAX_DATE:
+            raise ValueError(f"Dates must be between {MIN_DATE.isoformat()} and {MAX_DATE.isoformat()}: {value}")
+        return value
+
+    @staticmethod
+    def normalize_day(day, user_id=None):
+        """Validate an imported day against Config.DEFAULT_TASKS and return the document to store.
+
+        ``user_id`` overrides the day's own. Missing tasks get their defaults;
+        unknown tasks or values of the wrong type raise ValueError.
+        """
+        if not isinstance(day, dict) or not isinstance(day.get("tasks"), dict):
+            raise ValueError("Every day needs a tasks object")
+        user_id = user_id or day.get("user_id")
+        if not isinstance(user_id, str) or not user_id:
+            raise ValueError("Every day needs a user_id")
+        day_date = TransferService.parse_date(day.get("date"))
+        unknown = [task for task in day["tasks"] if task not in Config.DEFAULT_TASKS]
+        if unknown:
+            raise ValueError(f"Unknown tasks on {day_date}: {', '.join(unknown)}")
+        tasks = {**Config.DEFAULT_TASKS, **day["tasks"]}
+        for task, value in tasks.items():
+            if task == WATER_TASK:
+                if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                    raise ValueError(f"Water on {day_date} must be a non-negative integer")
+                tasks[task] = min(value, Config.WATER_GOAL_ML)
+            elif not isinstance(value, bool):
+                raise ValueError(f"{task} on {day_date} must be true or false")
+        document = {"user_id": user_id, "date": day_date, "tasks": tasks}
+        if isinstance(day.get("progress_pic"), str):
+            document["progress_pic"] = day["progress_pic"]
+        return document
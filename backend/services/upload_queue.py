@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from uuid import uuid4
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+class UploadQueue:
+    """Background writer that commits locally staged uploads with retries.
+
+    ``submit`` returns once the files are fsynced into a per-job staging
+    directory together with a manifest. A thread pool then runs ``process``
+    for the job, retrying with exponential backoff; the staging directory is
+    removed only after ``process`` succeeds. Jobs still staged when the
+    process restarts are resumed from their manifests, which only protects
+    uploads when ``staging_dir`` is on persistent storage and the process keeps
+    running after it has responded.
+    """
+    logger = logging.getLogger('UploadQueue')
+    MANIFEST = "manifest.json"
+    MAX_TRACKED_JOBS = 1000
+
+    def __init__(self, staging_dir, process, max_workers=2, max_attempts=3, retry_delay=1.0):
+        self.staging_dir = staging_dir
+        self.process = process
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(staging_dir, exist_ok=True)
+        self._resume()
+
+    def submit(self, files, metadata):
+        """Durably stage ``{name: bytes}`` and queue the job; returns its id"""
+        job_id = uuid4().hex
+        job_dir = os.path.join(self.staging_dir, job_id)
+        os.makedirs(job_dir)
+        for name, data in files.items():
+            self._write_durably(os.path.join(job_dir, name), data)
+        manifest = {"files": list(files), "metadata": metadata}
+        self._write_durably(os.path.join(job_dir, self.MANIFEST), json.dumps(manifest).encode())
+        self._fsync_dir(job_dir)
+        self._fsync_dir(self.staging_dir)
+        self.logger.info('Staged upload job %s with %s files', job_id, len(files))
+        self._track(job_id, {"status": "staged", "attempts": 0, "metadata": metadata})
+        self.executor.submit(self._run, job_id, manifest)
+        return job_id
+
+    def status(self, job_id):
+        """Return the status of a job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, job_id=job_id) if job else None
+
+    def _run(self, job_id, manifest):
+        job_dir = os.path.join(self.staging_dir, job_id)
+        paths = {name: os.path.join(job_dir, name) for name in manifest["files"]}
+        for attempt in range(1, self.max_attempts + 1):
+            self._update(job_id, status="uploading", attempts=attempt)
+            try:
+                self.process(paths, manifest["metadata"])
+            except Exception as e:
+                self.logger.warning(f'Upload job {job_id} attempt {attempt} failed: {str(e)}')
+                self._update(job_id, error=str(e))
+                if attempt < self.max_attempts:
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                continue
+            shutil.rmtree(job_dir, ignore_errors=True)
+            self._update(job_id, status="committed", error=None, committed_at=datetime.now(timezone.utc).isoformat())
+            self.logger.info('Upload job %s committed', job_id)
+            return
+        # Staged files are kept so the job is retried on the next restart
+        self.logger.error(f'Upload job {job_id} failed after {self.max_attempts} attempts')
+        self._update(job_id, status="failed")
+
+    def _resume(self):
+        """Re-queue jobs left in the staging directory by a previous process"""
+        for job_id in sorted(os.listdir(self.staging_dir)):
+            manifest_path = os.path.join(self.staging_dir, job_id, self.MANIFEST)
+            if not os.path.exists(manifest_path):
+                # Staging never completed, so submit() did not return for this job
+                shutil.rmtree(os.path.join(self.staging_dir, job_id), ignore_errors=True)
+                continue
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            self.logger.info('Resuming staged upload job %s', job_id)
+            self._track(job_id, {"status": "staged", "attempts": 0, "metadata": manifest["metadata"]})
+            self.executor.submit(self._run, job_id, manifest)
+
+    def _track(self, job_id, job):
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    @staticmethod
+    def _write_durably(path, data):
+        with open(path, "wb") as target:
+            target.write(data)
+            target.flush()
+            os.fsync(target.fileno())
+
+    @staticmethod
+    def _fsync_dir(path):
+        handle = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(handle)
+        finally:
+            os.close(handle)
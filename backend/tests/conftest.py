@@ -0,0 +1,29 @@
+from config import Config
+from database import Database
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+import pytest
+
+# Tests using the ``database`` fixture run against MONGO_URI, in a database
+# of their own that is dropped around every test, and are skipped when no
+# server answers there.
+TEST_DATABASE_NAME = f"{Config.DATABASE_NAME}_test"
+
+@pytest.fixture(scope="session")
+def mongo_client():
+    client = MongoClient(Config.MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"No MongoDB server at {Config.MONGO_URI}: {e}")
+    yield client
+    client.close()
+
+@pytest.fixture
+def database(mongo_client):
+    mongo_client.drop_database(TEST_DATABASE_NAME)
+    database = Database(mongo_client, TEST_DATABASE_NAME)
+    database.connect()
+    yield database
+    mongo_client.drop_database(TEST_DATABASE_NAME)
@@ -0,0 +1,48 @@
+from io import BytesIO
+from services.blob_cache import BlobCache
+import os
+
+def fail_fill(target):
+    raise AssertionError("blob should have been served from the cache")
+
+def read(cached):
+    file, size, metadata = cached
+    with file:
+        return file.read(), size, metadata
+
+def test_metadata_survives_a_restart(tmp_path):
+    BlobCache(str(tmp_path), 1024).put("picture.jpg", BytesIO(b"jpeg"), {"content_type": "image/jpeg"})
+
+    cache = BlobCache(str(tmp_path), 1024)
+
+    assert read(cache.get("picture.jpg", fail_fill)) == (b"jpeg", 4, {"content_type": "image/jpeg"})
+    assert cache.stats()["bytes"] == 4
+
+def test_blob_names_that_look_like_sidecars_keep_their_own_metadata(tmp_path):
+    cache = BlobCache(str(tmp_path), 1024)
+    cache.put("a", BytesIO(b"blob"), {"content_type": "text/plain"})
+    cache.put("a.meta.json", BytesIO(b"{}"), {"content_type": "application/json"})
+
+    cache = BlobCache(str(tmp_path), 1024)
+
+    assert read(cache.get("a", fail_fill))[2] == {"content_type": "text/plain"}
+    assert read(cache.get("a.meta.json", fail_fill))[2] == {"content_type": "application/json"}
+
+def test_eviction_and_restart_remove_sidecars_without_blobs(tmp_path):
+    cache = BlobCache(str(tmp_path), 6)
+    cache.put("first.jpg", BytesIO(b"1234"), {"content_type": "image/jpeg"})
+    cache.put("second.jpg", BytesIO(b"5678"), {"content_type": "image/jpeg"})
+    assert sorted(os.listdir(tmp_path)) == ["second.jpg", "second.jpg.meta.json"]
+
+    os.remove(tmp_path / "second.jpg")
+    BlobCache(str(tmp_path), 6)
+
+    assert os.listdir(tmp_path) == []
+
+def test_unreadable_sidecar_is_ignored(tmp_path):
+    BlobCache(str(tmp_path), 1024).put("picture.jpg", BytesIO(b"jpeg"), {"content_type": "image/jpeg"})
+    (tmp_path / "picture.jpg.meta.json").write_text("{")
+
+    cache = BlobCache(str(tmp_path), 1024)
+
+    assert read(cache.get("picture.jpg", fail_fill)) == (b"jpeg", 4, {})
@@ -0,0 +1,57 @@
+from config import Config
+from datetime import date, timedelta
+from services.bulk_stats_service import BulkStatsService
+from services.day_schema import SCHEMAS, to_external
+from services.stats_service import StatsService
+import random
+
+# Water values a tasks subdocument may hold, judged by type as well as amount
+WATER_VALUES = [0, 1000, Config.WATER_GOAL_ML - 1, Config.WATER_GOAL_ML, 5000, True, False, None, 4000.0, "4000"]
+
+def random_tasks(rng, compact):
+    tasks = {task: rng.random() < 0.85 for task in Config.DEFAULT_TASKS}
+    tasks["drink_gallon_water"] = rng.choice([0, 2000, Config.WATER_GOAL_ML, 5000] if compact else WATER_VALUES)
+    for task in list(tasks):
+        if rng.random() < 0.1:
+            del tasks[task]
+    if not compact and rng.random() < 0.05:
+        tasks["stretch"] = rng.random() < 0.5
+    return tasks
+
+def random_history(rng, end, days):
+    """Days up to ``end`` with gaps, as stored: some compact, some with a tasks subdocument"""
+    history = []
+    for offset in range(days):
+        if rng.random() < 0.1:
+            continue
+        compact = rng.random() < 0.5
+        day = {"date": (end - timedelta(days=offset)).isoformat()}
+        day.update(SCHEMAS["compact" if compact else "tasks"].fields(random_tasks(rng, compact)))
+        history.append(day)
+    rng.shuffle(history)
+    return history
+
+def streak_ending_today(today, days, today_complete):
+    tasks = dict(dict.fromkeys(Config.DEFAULT_TASKS, True), drink_gallon_water=Config.WATER_GOAL_ML)
+    history = [{"date": (today - timedelta(days=offset)).isoformat(), "tasks": dict(tasks)} for offset in range(1, days)]
+    history.append({"date": today.isoformat(), "tasks": dict(tasks, workout_a=today_complete)})
+    return history
+
+def test_bulk_stats_match_comprehensive_stats():
+    rng = random.Random(2)
+    today = date.today()
+    stored = {f"user-{index}": random_history(rng, today - timedelta(days=rng.randrange(3)), rng.randrange(1, 120))
+              for index in range(60)}
+    stored["no-days"] = []
+    stored["streak-through-today"] = streak_ending_today(today, 12, today_complete=True)
+    stored["streak-before-today"] = streak_ending_today(today, 12, today_complete=False)
+    # Days reach BulkStatsService the way get_all_progress_by_user reads them
+    progress_by_user = {user_id: [to_external(dict(day)) for day in days] for user_id, days in stored.items()}
+
+    bulk = BulkStatsService.get_stats_by_user(progress_by_user)
+
+    assert bulk.keys() == stored.keys()
+    for user_id, days in stored.items():
+        assert bulk[user_id] == StatsService.get_comprehensive_stats(days), user_id
+    assert bulk["streak-through-today"]["current_streak"] == 12
+    assert bulk["streak-before-today"]["current_streak"] == 11
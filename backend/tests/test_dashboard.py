@@ -0,0 +1,32 @@
+from config import Config
+from database import Database
+from datetime import date, timedelta
+import pytest
+
+USER = "dashboard_user"
+DAYS = 7
+
+def seed(database, count):
+    today = date.today()
+    database.collection.insert_many([
+        {"user_id": USER, "date": (today - timedelta(days=offset)).isoformat(), "tasks": dict(Config.DEFAULT_TASKS)}
+        for offset in range(count)
+    ])
+    database.rebuild_stats(USER)
+
+@pytest.mark.parametrize("offset", [3, 200], ids=["in-window", "before-window"])
+def test_materialized_dashboard_reads_only_the_window_and_the_date(database, monkeypatch, offset):
+    monkeypatch.setattr(Config, "STATS_BACKEND", "materialized")
+    seed(database, 365)
+    day = (date.today() - timedelta(days=offset)).isoformat()
+    start_date, end_date = Database.history_range(DAYS)
+
+    query = Database._dashboard_query(USER, day, start_date, end_date, False)
+    dashboard = database.get_dashboard(USER, day, DAYS)
+
+    assert database.collection.count_documents(query) == DAYS + 1 + (offset > DAYS)
+    assert dashboard["progress"]["date"] == day
+    assert [entry["date"] for entry in dashboard["history"]] == [
+        (date.today() - timedelta(days=back)).isoformat() for back in range(DAYS + 1)
+    ]
+    assert dashboard["stats"] == database.get_stats(USER)
@@ -0,0 +1,113 @@
+from config import Config
+from datetime import date, timedelta
+from services.day_schema import SCHEMAS, WATER_TASK, day_tasks, to_external
+from services.stats_service import StatsService
+import pytest
+import random
+
+USER = "schema_user"
+
+def random_tasks(rng, water_values=(0, 1000, Config.WATER_GOAL_ML - 1, Config.WATER_GOAL_ML)):
+    """A tasks subdocument as older versions wrote it: mostly done, with some tasks missing"""
+    tasks = {task: rng.random() < 0.8 for task in Config.DEFAULT_TASKS}
+    tasks[WATER_TASK] = rng.choice(water_values)
+    for task in list(tasks):
+        if rng.random() < 0.15:
+            del tasks[task]
+    return tasks
+
+def legacy_days(rng, count):
+    start = date(2024, 1, 1)
+    return [
+        {"user_id": USER, "date": (start + timedelta(days=offset)).isoformat(), "tasks": random_tasks(rng)}
+        for offset in range(count)
+    ]
+
+def test_compact_fields_keep_tasks_and_completion():
+    rng = random.Random(21)
+    for _ in range(500):
+        tasks = random_tasks(rng)
+        compact = {"date": "2024-01-01", **SCHEMAS["compact"].fields(tasks)}
+
+        assert day_tasks(compact) == tasks
+        assert StatsService.is_day_complete(compact) == StatsService.is_day_complete({"tasks": tasks})
+        assert StatsService.day_task_completion(compact) == StatsService.task_completion(tasks)
+        assert to_external(dict(compact))["tasks"] == tasks
+
+def stored_days(database):
+    return list(database.collection.find({"user_id": USER}, {"_id": 0}).sort("date", 1))
+
+def test_migration_round_trip_keeps_tasks_and_completion(database):
+    days = legacy_days(random.Random(22), 120)
+    database.collection.insert_many([dict(day) for day in days])
+    database.rebuild_stats(USER)
+    stats = database.get_stats(USER)
+
+    assert database.migrate_schema("compact")["converted"] == len(days)
+    compact = stored_days(database)
+    assert all("tasks" not in day and "bits" in day for day in compact)
+    assert [day_tasks(day) for day in compact] == [day["tasks"] for day in days]
+    assert [StatsService.is_day_complete(day) for day in compact] == [StatsService.is_day_complete(day) for day in days]
+    assert database.check_stats_consistency(USER)["consistent"]
+    assert database.get_stats(USER) == stats
+
+    assert database.migrate_schema("tasks")["converted"] == len(days)
+    assert stored_days(database) == days
+    assert database.get_stats(USER) == stats
+
+def test_completion_expression_matches_is_day_complete(database):
+    rng = random.Random(23)
+    # Legacy days also hold water values of other types, judged as is_day_complete judges them
+    days = [
+        {"user_id": USER, "date": f"2024-01-{offset:02}", "tasks": random_tasks(rng, [0, Config.WATER_GOAL_ML, True, False, None, 4000.0, "4000"])}
+        for offset in range(1, 29)
+    ]
+    days += [
+        {"user_id": USER, "date": f"2024-02-{offset:02}", **SCHEMAS["compact"].fields(random_tasks(rng))}
+        for offset in range(1, 29)
+    ]
+    database.collection.insert_many(days)
+
+    flags = database.collection.aggregate([
+        {"$match": {"user_id": USER}},
+        {"$project": {"_id": 0, "date": 1, "complete": StatsService.completion_expression()}},
+    ])
+
+    assert {flag["date"]: flag["complete"] for flag in flags} == {day["date"]: StatsService.is_day_complete(day) for day in days}
+
+@pytest.mark.parametrize("schema", ["tasks", "compact"])
+def test_operations_on_days_with_missing_tasks_agree_between_schemas(database, monkeypatch, schema):
+    # The same legacy days, written to in either schema, end up with the same tasks
+    monkeypatch.setattr(Config, "DOCUMENT_SCHEMA", schema)
+    days = legacy_days(random.Random(24), 40)
+    database.collection.insert_many([dict(day) for day in days])
+    database.rebuild_stats(USER)
+    rng = random.Random(25)
+    operations = []
+    for day in days:
+        task = rng.choice(list(Config.DEFAULT_TASKS))
+        if task == WATER_TASK:
+            operations.append(rng.choice([
+                {"date": day["date"], "op": "add_water", "amount": 500},
+                {"date": day["date"], "op": "set", "task": task, "value": Config.WATER_GOAL_ML},
+            ]))
+        else:
+            operations.append(rng.choice([
+                {"date": day["date"], "op": "toggle", "task": task},
+                {"date": day["date"], "op": "set", "task": task, "value": rng.random() < 0.5},
+            ]))
+
+    result = database.apply_operations(USER, operations)
+
+    expected = {day["date"]: dict(day["tasks"]) for day in days}
+    for operation in operations:
+        tasks = expected[operation["date"]]
+        if operation["op"] == "add_water":
+            tasks[WATER_TASK] = min(tasks.get(WATER_TASK, 0) + operation["amount"], Config.WATER_GOAL_ML)
+        elif operation["op"] == "toggle":
+            tasks[operation["task"]] = not tasks.get(operation["task"], False)
+        else:
+            tasks[operation["task"]] = operation["value"]
+    assert {date: day["tasks"] for date, day in result.items()} == expected
+    assert all(("bits" in day) == (schema == "compact") for day in stored_days(database))
+    assert database.check_stats_consistency(USER)["consistent"]
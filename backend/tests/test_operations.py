@@ -0,0 +1,64 @@
+from config import Config
+from database import Database
+
+USER = "operations_user"
+DATE = "2024-03-01"
+
+def finish(plan, result):
+    try:
+        while True:
+            result = plan.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+def test_returned_days_are_sorted_by_date(database):
+    for date in ("2024-03-03", "2024-03-02", "2024-03-01"):
+        database.get_or_create_progress(USER, date)
+
+    days = database.apply_operations(USER, [
+        {"date": date, "op": "toggle", "task": "workout_a"} for date in ("2024-03-02", "2024-03-04", "2024-03-01", "2024-03-03")
+    ])
+
+    assert list(days) == ["2024-03-01", "2024-03-02", "2024-03-03", "2024-03-04"]
+
+def test_batch_without_other_writes_updates_stats_in_place(database, monkeypatch):
+    database.get_or_create_progress(USER, DATE)
+    database.rebuild_stats(USER)
+    rebuilds = []
+    monkeypatch.setattr(database, "rebuild_stats", rebuilds.append)
+
+    database.apply_operations(USER, [{"date": DATE, "op": "toggle", "task": "workout_a"}, {"date": "2024-03-02", "op": "add_water", "amount": 250}])
+
+    assert rebuilds == []
+    assert database.check_stats_consistency(USER)["consistent"]
+
+def test_day_created_by_another_write_during_a_batch_is_counted_once(database):
+    database.get_or_create_progress(USER, "2024-02-29")
+    database.rebuild_stats(USER)
+    plan = Database.apply_operations.__wrapped__(database, USER, [{"date": DATE, "op": "add_water", "amount": 250}])
+    # Run the batch by hand past its read of the existing days, then create its day elsewhere
+    result = plan.send(None)
+    result = plan.send(result)
+    database.apply_operations(USER, [{"date": DATE, "op": "toggle", "task": "workout_a"}])
+    days = finish(plan, result)
+
+    assert days[DATE]["tasks"]["drink_gallon_water"] == 250
+    assert days[DATE]["tasks"]["workout_a"] is True
+    report = database.check_stats_consistency(USER)
+    assert report["consistent"]
+    assert report["rebuilt"]["total_days"] == 2
+
+def test_goal_reached_by_another_write_during_a_batch_is_counted_once(database):
+    database.get_or_create_progress(USER, DATE)
+    database.increment_water(USER, DATE, Config.WATER_GOAL_ML - 100)
+    database.rebuild_stats(USER)
+    plan = Database.apply_operations.__wrapped__(database, USER, [{"date": DATE, "op": "add_water", "amount": 100}])
+    result = plan.send(None)
+    result = plan.send(result)
+    # Both batches read the day below the goal, and either one reaches it
+    database.apply_operations(USER, [{"date": DATE, "op": "add_water", "amount": 100}])
+    finish(plan, result)
+
+    report = database.check_stats_consistency(USER)
+    assert report["consistent"]
+    assert report["rebuilt"]["task_stats"]["drink_gallon_water"]["completed"] == 1
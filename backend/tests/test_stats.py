@@ -0,0 +1,123 @@
+from config import Config
+from database import Database
+from datetime import date, timedelta
+from services.stats_service import StatsService
+import random
+
+# BSON comparison order of the value types a stats document holds
+TYPE_ORDER = {type(None): 0, int: 1, float: 1, str: 2, bool: 3}
+
+def bson_key(value):
+    return TYPE_ORDER[type(value)], value if value is not None else 0
+
+def evaluate(expression, doc):
+    """Evaluate the aggregation expressions stats_document_update uses against ``doc``"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = doc
+        for part in expression[1:].split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+    if not isinstance(expression, dict):
+        return expression
+    (operator, args), = expression.items()
+    values = [evaluate(arg, doc) for arg in args]
+    if operator == "$add":
+        return sum(values)
+    if operator == "$max":
+        return max(values, key=bson_key)
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    if operator == "$or":
+        return any(values)
+    if operator == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    comparisons = {"$eq": "__eq__", "$ne": "__ne__", "$gt": "__gt__", "$lte": "__le__"}
+    return getattr(bson_key(values[0]), comparisons[operator])(bson_key(values[1]))
+
+def apply_update(doc, pipeline):
+    for stage in pipeline:
+        values = {path: evaluate(expression, doc) for path, expression in stage["$set"].items()}
+        for path, value in values.items():
+            *parents, field = path.split(".")
+            target = doc
+            for parent in parents:
+                target = target[parent]
+            target[field] = value
+
+def random_tasks(rng):
+    """Tasks of a day, mostly done so streaks form, sometimes missing keys"""
+    tasks = {task: rng.random() < 0.85 for task in Config.DEFAULT_TASKS}
+    tasks["drink_gallon_water"] = rng.choice([0, 1200, Config.WATER_GOAL_ML, Config.WATER_GOAL_ML])
+    for task in rng.sample(list(tasks), rng.choice([0, 0, 0, 1, 2])):
+        del tasks[task]
+    return tasks
+
+def test_folded_changes_match_a_rebuild():
+    rng = random.Random(75)
+    today = date.today()
+    for _ in range(300):
+        days = {}
+        stats_doc = None
+        for _ in range(25):
+            day = (today - timedelta(days=rng.randrange(15))).isoformat()
+            old_tasks, new_tasks = days.get(day), random_tasks(rng)
+            before = StatsService.get_comprehensive_stats([{"date": d, "tasks": t} for d, t in days.items()])
+            days[day] = new_tasks
+            all_days = [{"date": d, "tasks": t} for d, t in days.items()]
+
+            update = StatsService.stats_document_update(day, old_tasks, new_tasks)
+            folded_before = StatsService.render_stats_document(stats_doc) if stats_doc else before
+            if update is not None and stats_doc is not None:
+                apply_update(stats_doc, update)
+            if stats_doc is None or stats_doc["dirty"]:
+                # What _apply_stats_change does when the change cannot be folded in
+                stats_doc = StatsService.build_stats_document(all_days)
+
+            rebuilt = StatsService.build_stats_document(all_days)
+            assert {field: stats_doc[field] for field in rebuilt} == rebuilt
+            after = StatsService.get_comprehensive_stats(all_days)
+            folded_after = StatsService.render_stats_document(stats_doc)
+            assert folded_after == after
+            assert StatsService.stats_delta(folded_before, folded_after) == StatsService.stats_delta(before, after)
+
+USER = "stats_user"
+
+def finish(plan, result):
+    try:
+        while True:
+            result = plan.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+def seed(database, days=5):
+    today = date.today()
+    for offset in range(days):
+        database.get_or_create_progress(USER, (today - timedelta(days=offset)).isoformat())
+
+def test_change_folded_in_during_a_rebuild_is_kept(database, monkeypatch):
+    seed(database)
+    read_days = database._stats_days
+
+    def read_days_then_write(user_id):
+        days = read_days(user_id)
+        monkeypatch.setattr(database, "_stats_days", read_days)
+        database.increment_water(USER, date.today().isoformat(), Config.WATER_GOAL_ML)
+        return days
+
+    monkeypatch.setattr(database, "_stats_days", read_days_then_write)
+    database.rebuild_stats(USER)
+
+    assert database.check_stats_consistency(USER)["consistent"]
+
+def test_change_written_before_a_rebuild_and_folded_in_after_is_counted_once(database):
+    seed(database)
+    today = date.today().isoformat()
+    write = Database.update_progress.__wrapped__(database, USER, today, {**Config.DEFAULT_TASKS, "workout_a": True})
+    # Run the update by hand until its day is written, so the rebuild sees it
+    result = write.send(None)
+    while not database.get_progress_by_date(USER, today)["tasks"]["workout_a"]:
+        result = write.send(result)
+    database.rebuild_stats(USER)
+    finish(write, result)
+
+    assert database.check_stats_consistency(USER)["consistent"]
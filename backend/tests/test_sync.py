@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from database import Database
+from threading import Barrier
+
+USER = "sync_user"
+DATE = "2024-03-01"
+OPERATIONS = [
+    {"id": "op-1", "date": DATE, "op": "add_water", "amount": 500},
+    {"id": "op-2", "date": DATE, "op": "toggle", "task": "workout_a"},
+]
+
+def tasks(database):
+    return database.get_progress_by_date(USER, DATE)["tasks"]
+
+def test_resent_batch_is_skipped(database):
+    first = database.push_operations(USER, OPERATIONS)
+    again = database.push_operations(USER, OPERATIONS)
+
+    assert (first["applied"], first["skipped"]) == (2, 0)
+    assert (again["applied"], again["skipped"]) == (0, 2)
+    assert tasks(database)["drink_gallon_water"] == 500
+    assert tasks(database)["workout_a"] is True
+
+def test_resent_batch_with_new_operations_applies_only_those(database):
+    database.push_operations(USER, OPERATIONS)
+    result = database.push_operations(USER, OPERATIONS + [{"id": "op-3", "date": DATE, "op": "add_water", "amount": 250}])
+
+    assert (result["applied"], result["skipped"]) == (1, 2)
+    assert tasks(database)["drink_gallon_water"] == 750
+
+def test_push_racing_a_push_of_the_same_batch_skips_it(database):
+    # Pause one push after its first read, then let another push run through
+    plan = Database.push_operations.__wrapped__(database, USER, OPERATIONS)
+    result = plan.send(None)
+    database.push_operations(USER, OPERATIONS)
+    try:
+        while True:
+            result = plan.send(result)
+    except StopIteration as stop:
+        late = stop.value
+
+    assert (late["applied"], late["skipped"]) == (0, 2)
+    assert tasks(database)["drink_gallon_water"] == 500
+
+def test_concurrent_pushes_of_one_batch_apply_it_once(database):
+    pushes = 4
+    barrier = Barrier(pushes)
+
+    def push(_):
+        barrier.wait()
+        return database.push_operations(USER, OPERATIONS)
+
+    with ThreadPoolExecutor(pushes) as executor:
+        results = list(executor.map(push, range(pushes)))
+
+    assert sum(result["applied"] for result in results) == len(OPERATIONS)
+    assert tasks(database)["drink_gallon_water"] == 500
+    assert database.check_stats_consistency(USER)["consistent"]
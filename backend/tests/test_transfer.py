@@ -0,0 +1,55 @@
+from config import Config
+from services.day_schema import BOOLEAN_TASKS, WATER_TASK
+from services.transfer_service import MAX_DATE, MIN_DATE, TransferService
+import pytest
+import random
+
+def random_day(rng, user_id, day_date):
+    tasks = {task: rng.random() < 0.5 for task in BOOLEAN_TASKS}
+    tasks[WATER_TASK] = rng.randrange(0, 65536)
+    return {"user_id": user_id, "date": day_date, "tasks": tasks}
+
+def round_trip(days, format, chunk_size):
+    data = b"".join(TransferService.encode(days, format))
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    return list(TransferService.decode(chunks, format))
+
+@pytest.mark.parametrize("format", ["packed", "ndjson"])
+def test_export_round_trips(format, monkeypatch):
+    # Small stream chunks and decoder reads split records across chunks
+    monkeypatch.setattr(Config, "STREAM_CHUNK_SIZE", 64)
+    rng = random.Random(20)
+    days = [random_day(rng, "first", MIN_DATE.isoformat()), random_day(rng, "first", "2024-02-29")]
+    days += [random_day(rng, "second", f"2025-01-{day:02}") for day in range(1, 32)]
+    days.append(random_day(rng, "third", MAX_DATE.isoformat()))
+
+    assert round_trip(days, format, 7) == days
+
+def test_packed_export_splits_long_histories_into_blocks(monkeypatch):
+    monkeypatch.setattr("services.transfer_service.PackedEncoder.MAX_BLOCK_DAYS", 3)
+    rng = random.Random(21)
+    days = [random_day(rng, "long", f"2024-05-{day:02}") for day in range(1, 11)]
+
+    assert round_trip(days, "packed", 5) == days
+
+def test_packed_export_skips_days_it_cannot_store():
+    rng = random.Random(22)
+    kept = [random_day(rng, "user", "2024-01-01"), random_day(rng, "user", "2024-01-03")]
+    unstorable = [random_day(rng, "user", day_date) for day_date in ("1969-12-31", "2149-06-07", "today")]
+    skipped = []
+
+    data = b"".join(TransferService.encode([kept[0], *unstorable, kept[1]], "packed", skipped))
+
+    assert list(TransferService.decode([data], "packed")) == kept
+    assert skipped == [{"user_id": "user", "date": day["date"]} for day in unstorable]
+
+@pytest.mark.parametrize("day_date", ["1969-12-31", "2149-06-07", "2024-1-5", "20240105", None])
+def test_import_rejects_dates_the_packed_format_cannot_store(day_date):
+    day = {"user_id": "user", "date": day_date, "tasks": {WATER_TASK: 0}}
+
+    with pytest.raises(ValueError):
+        TransferService.normalize_day(day)
+
+def test_import_accepts_the_first_and_last_storable_dates():
+    for day_date in (MIN_DATE.isoformat(), MAX_DATE.isoformat()):
+        assert TransferService.normalize_day({"user_id": "user", "date": day_date, "tasks": {}})["date"] == day_date
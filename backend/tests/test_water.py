@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from services.stats_service import StatsService
+import pytest
+
+USER = "water_user"
+DATE = "2024-03-01"
+WORKERS = 16
+INCREMENTS = 3
+
+def add_water(database, index, amount):
+    # Half through the water route's increment, half as queued operations
+    if index % 2:
+        database.increment_water(USER, DATE, amount)
+    else:
+        database.apply_operations(USER, [{"date": DATE, "op": "add_water", "amount": amount}])
+
+@pytest.mark.parametrize("amount", [25, 100], ids=["below-goal", "capped"])
+def test_concurrent_water_additions_are_all_counted(database, amount):
+    # The unique (user_id, date) index is what makes get_or_create_progress create one day
+    database.ensure_indexes()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        list(pool.map(lambda _: database.get_or_create_progress(USER, DATE), range(WORKERS)))
+        list(pool.map(lambda index: add_water(database, index, amount), range(WORKERS * INCREMENTS)))
+
+    assert database.collection.count_documents({"user_id": USER, "date": DATE}) == 1
+    water = database.get_progress_by_date(USER, DATE)["tasks"]["drink_gallon_water"]
+    assert water == min(WORKERS * INCREMENTS * amount, Config.WATER_GOAL_ML)
+    assert database.check_stats_consistency(USER)["consistent"]
+    assert database.get_stats(USER) == StatsService.get_comprehensive_stats(database.get_all_progress(USER))
@@ -70,7 +70,10 @@ const TodayTab = ({ progress, stats, onTaskChange, onWaterIncrement }) => {
     canvas.toBlob(async (blob) => {
       if (!blob || !progress || !progress.date) return;
       try {
-        await progressPicAPI.upload(progress.date, blob);
+        const res = await progressPicAPI.upload(progress.date, blob);
+        if (res.status === 202) {
+          await progressPicAPI.waitForUpload(res.data.job_id);
+        }
         await progressPicAPI.fetchByDate(progress.date);
       } catch (e) {
         alert('Failed to upload progress pic');
@@ -1,5 +1,23 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { progressAPI } from '../services/api';
+import { WATER_GOAL_ML } from '../constants/tasks';
+
+// Operations made while offline survive reloads until the server acknowledges them
+const QUEUE_KEY = 'progressQueue';
+const VERSION_KEY = 'progressSyncVersion';
+// Days of history the dashboard shows, as on the server
+const HISTORY_DAYS = 75;
+
+const loadQueue = () => JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]');
+const saveQueue = (queue) => localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+const newOperationId = () => `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+const isRejected = (err) => err.response?.status >= 400 && err.response?.status < 500;
+
+const historyStart = () => {
+  const start = new Date();
+  start.setDate(start.getDate() - HISTORY_DAYS);
+  return `${start.getFullYear()}-${String(start.getMonth() + 1).padStart(2, '0')}-${String(start.getDate()).padStart(2, '0')}`;
+};
 
 export const useProgress = (date) => {
   const [progress, setProgress] = useState(null);
@@ -7,73 +25,106 @@ export const useProgress = (date) => {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [pendingCount, setPendingCount] = useState(() => loadQueue().length);
+  const pushing = useRef(false);
+
+  const mergeDays = useCallback((days) => {
+    const byDate = Object.fromEntries(days.map((day) => [day.date, day]));
+    if (byDate[date]) setProgress(byDate[date]);
+    setHistory((current) => current.map((day) => (byDate[day.date] ? { date: day.date, tasks: byDate[day.date].tasks } : day)));
+  }, [date]);
+
+  // A full sync carries every day, so the local copy is rebuilt from it rather than merged into
+  const replaceDays = useCallback((days) => {
+    const start = historyStart();
+    const today = days.find((day) => day.date === date);
+    if (today) setProgress(today);
+    setHistory(days.filter((day) => day.date >= start).map((day) => ({ date: day.date, tasks: day.tasks })).reverse());
+  }, [date]);
+
+  const loadDashboard = useCallback(async () => {
+    const res = await progressAPI.getDashboard(date);
+    setProgress(res.data.progress);
+    setHistory(res.data.history);
+    setStats(res.data.stats);
+  }, [date]);
+
+  const pushQueue = useCallback(async () => {
+    if (pushing.current) return;
+    pushing.current = true;
+    try {
+      // Operations queued while a batch is in flight go out in the next one
+      for (let queue = loadQueue(); queue.length > 0; queue = loadQueue()) {
+        const sent = new Set(queue.map((operation) => operation.id));
+        const since = Number(localStorage.getItem(VERSION_KEY) || 0);
+        try {
+          const res = await progressAPI.pushOperations(since, queue);
+          saveQueue(loadQueue().filter((operation) => !sent.has(operation.id)));
+          localStorage.setItem(VERSION_KEY, res.data.version);
+          (res.data.full ? replaceDays : mergeDays)(res.data.days);
+          setStats(res.data.stats);
+        } catch (err) {
+          // Network errors and 5xx keep the queue, so it is retried on the next change or when back online
+          if (!isRejected(err)) return;
+          // The server rejected the batch; resending it would fail the same way
+          console.error("Error pushing queued operations:", err);
+          saveQueue(loadQueue().filter((operation) => !sent.has(operation.id)));
+          setError(err.message);
+          // Roll back the optimistic changes of the dropped operations
+          await loadDashboard();
+        }
+      }
+    } catch (err) {
+      console.error("Error reloading after rejected operations:", err);
+    } finally {
+      pushing.current = false;
+      setPendingCount(loadQueue().length);
+    }
+  }, [mergeDays, replaceDays, loadDashboard]);
 
   const fetchData = useCallback(async () => {
     setLoading(true);
     setError(null);
     try {
-      const [progressRes, historyRes, statsRes] = await Promise.all([
-        progressAPI.getByDate(date),
-        progressAPI.getHistory(),
-        progressAPI.getStats()
-      ]);
-      
-      setProgress(progressRes.data);
-      setHistory(historyRes.data);
-      setStats(statsRes.data);
+      await loadDashboard();
     } catch (err) {
       console.error("Error fetching data:", err);
       setError(err.message);
     } finally {
       setLoading(false);
     }
-  }, [date]);
+    pushQueue();
+  }, [loadDashboard, pushQueue]);
 
   useEffect(() => {
     fetchData();
   }, [fetchData]);
 
-  const handleTaskChange = async (task) => {
+  useEffect(() => {
+    window.addEventListener('online', pushQueue);
+    return () => window.removeEventListener('online', pushQueue);
+  }, [pushQueue]);
+
+  const enqueue = (operation, tasks) => {
+    saveQueue([...loadQueue(), { id: newOperationId(), date, ...operation }]);
+    setPendingCount(loadQueue().length);
+    setProgress((current) => ({ ...current, tasks }));
+    pushQueue();
+  };
+
+  const handleTaskChange = (task) => {
     if (!progress) return;
-    
-    const newTasks = { ...progress.tasks, [task]: !progress.tasks[task] };
-    try {
-      await progressAPI.update(date, newTasks);
-      setProgress({ ...progress, tasks: newTasks });
-      
-      // Refresh stats after task change
-      const statsRes = await progressAPI.getStats();
-      setStats(statsRes.data);
-    } catch (err) {
-      console.error("Error updating progress:", err);
-      setError(err.message);
-    }
+    const value = !progress.tasks[task];
+    enqueue({ op: 'set', task, value, at: Date.now() }, { ...progress.tasks, [task]: value });
   };
 
-  const handleWaterIncrement = async (amount) => {
+  const handleWaterIncrement = (amount) => {
     if (!progress) return;
     
     const current = progress.tasks.drink_gallon_water || 0;
-    if (current >= 3785) return;
+    if (current >= WATER_GOAL_ML) return;
     
-    try {
-      const res = await progressAPI.incrementWater(date, amount);
-      const newWater = res.data.water;
-      setProgress({
-        ...progress,
-        tasks: {
-          ...progress.tasks,
-          drink_gallon_water: newWater
-        }
-      });
-      
-      // Refresh stats after water increment
-      const statsRes = await progressAPI.getStats();
-      setStats(statsRes.data);
-    } catch (err) {
-      console.error("Error incrementing water:", err);
-      setError(err.message);
-    }
+    enqueue({ op: 'add_water', amount }, { ...progress.tasks, drink_gallon_water: Math.min(current + amount, WATER_GOAL_ML) });
   };
 
   const refreshData = () => {
@@ -86,8 +137,9 @@ export const useProgress = (date) => {
     stats,
     loading,
     error,
+    pendingCount,
     handleTaskChange,
     handleWaterIncrement,
     refreshData
   };
-}; 
\ No newline at end of file
+};
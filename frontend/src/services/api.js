@@ -1,9 +1,12 @@
 import axios from 'axios';
 
+export const USER_ID = 'demo_user';
+
 const api = axios.create({
   baseURL: 'http://localhost:8917',
   headers: {
     'Content-Type': 'application/json',
+    'X-User-Id': USER_ID,
   },
 });
 
@@ -32,27 +35,41 @@ export const progressAPI = {
   
   getByDate: (date) => api.get(`/api/progress/${date}`),
   
-  getHistory: () => api.get('/api/progress/history'),
+  getHistory: () => api.get('/api/progress/history', { params: { fields: 'tasks' } }),
   
   getStats: () => api.get('/api/progress/stats'),
   
+  getDashboard: (date) => api.get(`/api/progress/dashboard/${date}`),
+  
   update: (date, tasks) => api.put(`/api/progress/${date}`, { tasks }),
   
   incrementWater: (date, amount) => api.post(`/api/progress/${date}/water`, { amount }),
+
+  pushOperations: (since, operations) => api.post('/api/progress/sync', { since, operations }),
 };
 
 export const progressPicAPI = {
   upload: (date, file) => {
     const formData = new FormData();
     formData.append('file', file, 'progress.jpg');
-    formData.append('user_id', 'demo_user');
+    formData.append('user_id', USER_ID);
     return api.post(`/api/progress/pic/${date}`, formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     });
   },
   fetchByDate: (date) =>
-    api.get(`/api/progress/pic/${date}`, { params: { user_id: 'demo_user' }, responseType: 'blob' }),
+    api.get(`/api/progress/pic/${date}`, { params: { user_id: USER_ID, size: 'medium' }, responseType: 'blob' }),
   fetchAll: () => api.get('/api/progress/pics'),
+  uploadStatus: (jobId) => api.get(`/api/progress/pic/uploads/${jobId}`),
+  waitForUpload: async (jobId, { intervalMs = 500, attempts = 40 } = {}) => {
+    for (let attempt = 0; attempt < attempts; attempt++) {
+      const res = await progressPicAPI.uploadStatus(jobId);
+      if (res.data.status === 'committed') return res.data;
+      if (res.data.status === 'failed') throw new Error(res.data.error || 'Upload failed');
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+    throw new Error('Upload did not finish in time');
+  },
 };
 
 export default api;
\ No newline at end of file